@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Simulation benchmark for the kitchen-service station scheduler
+Replays a dinner rush on a simulated clock under FIFO and the scheduler's
+shortest-critical-path policy, comparing ticket times and ready-time
+estimate accuracy, then measures raw event throughput
+"""
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+# Make kitchen-service and shared modules importable
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "services", "kitchen-service"))
+
+# Items each station can have on the go at once; the hot line is the bottleneck
+os.environ.setdefault("KITCHEN_STATION_CAPACITY", '{"hot": 11, "cold": 3, "pastry": 2, "bar": 1}')
+
+from app.scheduler import KitchenScheduler, DONE  # noqa: E402
+from app.ticket_engine import Ticket, TicketItem, station_for  # noqa: E402
+
+# Simulation configuration
+RUSH_SECONDS = 2 * 3600
+MEAN_ORDER_GAP_SECONDS = 75
+STEP_SECONDS = 5
+ONLINE_SHARE = 0.3
+# Actual cooking time as a fraction of the menu preparation_time
+DURATION_NOISE = (0.8, 1.3)
+SEED = 7
+
+# Throughput configuration
+THROUGHPUT_EVENTS = 20000
+ACTIVE_TICKETS = 150
+
+MENU = [
+    ("Garlic Bread", "appetizer", 5), ("Soup of the Day", "appetizer", 4),
+    ("Caesar Salad", "appetizer", 6), ("Chicken Wings", "appetizer", 12),
+    ("Ribeye Steak", "main_course", 22), ("Chicken Curry", "main_course", 15),
+    ("Margherita Pizza", "main_course", 12), ("Fish and Chips", "main_course", 14),
+    ("Vegetable Risotto", "main_course", 20), ("Lamb Shank", "main_course", 28),
+    ("Fries", "side_dish", 6), ("Rice", "side_dish", 3),
+    ("Chocolate Cake", "dessert", 4), ("Creme Brulee", "dessert", 6),
+    ("Lemonade", "beverage", 2), ("Espresso", "beverage", 1), ("Milkshake", "beverage", 4),
+]
+
+
+def make_ticket(rng: random.Random, restaurant_id: str, status: str = "confirmed") -> Ticket:
+    items = []
+    for name, category, prep in rng.sample(MENU, rng.randint(1, 5)):
+        items.append(TicketItem(
+            menu_item_id=name, name=name, quantity=rng.choice([1, 1, 1, 2, 3]),
+            station=station_for(category), category=category, preparation_time=prep
+        ))
+    return Ticket(
+        order_id=uuid.uuid4().hex, restaurant_id=restaurant_id, order_number=None,
+        order_type="ONLINE" if rng.random() < ONLINE_SHARE else "TABLE",
+        table_id=None, status=status, created_at="", items=items
+    )
+
+
+def simulate(policy: str) -> dict:
+    rng = random.Random(SEED)
+    clock = [0.0]
+    scheduler = KitchenScheduler(policy, clock=lambda: clock[0])
+    restaurant_id = "sim"
+
+    arrivals = []
+    t = 0.0
+    while t < RUSH_SECONDS:
+        t += rng.expovariate(1 / MEAN_ORDER_GAP_SECONDS)
+        arrivals.append((t, make_ticket(rng, restaurant_id)))
+
+    # Actual finish time of items once a cook picks them up
+    actual_finish = {}
+    first_estimate = {}
+    ticket_times = []
+    estimate_errors = []
+    next_arrival = 0
+
+    schedule = scheduler._schedule(restaurant_id)
+    while next_arrival < len(arrivals) or schedule.orders:
+        clock[0] += STEP_SECONDS
+        now = clock[0]
+
+        while next_arrival < len(arrivals) and arrivals[next_arrival][0] <= now:
+            arrived_at, ticket = arrivals[next_arrival]
+            scheduler.add_order(restaurant_id, ticket, arrival=arrived_at)
+            first_estimate[ticket.order_id] = ticket.estimated_ready_at
+            next_arrival += 1
+
+        for station in list(schedule.stations.values()):
+            for item in list(station.cooking):
+                finish = actual_finish.setdefault(
+                    (item.order.ticket.order_id, item.index), item.start + item.duration * rng.uniform(*DURATION_NOISE)
+                )
+                if finish <= now:
+                    scheduler.complete_item(restaurant_id, item.order.ticket.order_id, item.index)
+
+        for order_id, plan in list(schedule.orders.items()):
+            if all(item.state == DONE for item in plan.items):
+                ticket_times.append(now - plan.arrival)
+                estimate_errors.append(abs(now - first_estimate[order_id]))
+                scheduler.remove_order(restaurant_id, order_id)
+
+        scheduler.tick()
+        scheduler.pop_eta_updates()
+
+    ticket_times.sort()
+    return {
+        "orders": len(ticket_times),
+        "mean_min": statistics.mean(ticket_times) / 60,
+        "p90_min": ticket_times[int(len(ticket_times) * 0.9)] / 60,
+        "max_min": ticket_times[-1] / 60,
+        "eta_error_min": statistics.mean(estimate_errors) / 60,
+    }
+
+
+def throughput() -> float:
+    """Scheduler events per second for one busy restaurant"""
+    rng = random.Random(SEED)
+    clock = [time.time()]
+    scheduler = KitchenScheduler(clock=lambda: clock[0])
+    restaurant_id = "busy"
+    active = []
+    for _ in range(ACTIVE_TICKETS):
+        ticket = make_ticket(rng, restaurant_id)
+        scheduler.add_order(restaurant_id, ticket)
+        active.append(ticket)
+
+    start = time.perf_counter()
+    for i in range(THROUGHPUT_EVENTS):
+        clock[0] += 0.01
+        kind = i % 4
+        if kind == 0:
+            ticket = make_ticket(rng, restaurant_id)
+            scheduler.add_order(restaurant_id, ticket)
+            active.append(ticket)
+        elif kind == 1:
+            ticket = rng.choice(active)
+            ticket.status = "preparing"
+            scheduler.update_order(restaurant_id, ticket)
+        elif kind == 2:
+            ticket = rng.choice(active)
+            scheduler.complete_station(restaurant_id, ticket.order_id, ticket.items[0].station)
+        else:
+            ticket = active.pop(rng.randrange(len(active)))
+            scheduler.remove_order(restaurant_id, ticket.order_id)
+    elapsed = time.perf_counter() - start
+    return THROUGHPUT_EVENTS / elapsed
+
+
+def main():
+    print(f"Dinner rush: {RUSH_SECONDS // 3600}h, one order every ~{MEAN_ORDER_GAP_SECONDS}s\n")
+    print(f"{'policy':<8}{'orders':>8}{'mean min':>10}{'p90 min':>10}{'max min':>10}{'ETA err min':>13}")
+    for policy in ("fifo", "spt"):
+        result = simulate(policy)
+        print(
+            f"{policy:<8}{result['orders']:>8}{result['mean_min']:>10.1f}{result['p90_min']:>10.1f}"
+            f"{result['max_min']:>10.1f}{result['eta_error_min']:>13.1f}"
+        )
+
+    rate = throughput()
+    print(f"\nThroughput with ~{ACTIVE_TICKETS} active tickets: {rate:,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
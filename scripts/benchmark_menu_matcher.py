@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark the integration-service menu matcher
+Builds an index for a synthetic menu with thousands of items and times
+exact, fuzzy (typo) and full-cart matching
+"""
+import os
+import random
+import string
+import sys
+import time
+import uuid
+
+# Make integration-service and shared modules importable
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "services", "integration-service"))
+
+from app.menu_matcher import MenuIndex  # noqa: E402
+
+# Benchmark configuration
+MENU_SIZE = 5000
+QUERIES = 2000
+CART_SIZE = 8
+
+DISHES = [
+    "biriyani", "korma", "tikka masala", "vindaloo", "jalfrezi", "dosa", "samosa",
+    "naan", "paneer", "dal", "pakora", "rogan josh", "saag", "bhaji", "kulfi",
+    "lassi", "chaat", "idli", "pulao", "kebab", "burger", "pizza", "pasta", "salad"
+]
+QUALIFIERS = [
+    "chicken", "lamb", "prawn", "vegetable", "paneer", "mushroom", "spicy", "mild",
+    "house", "special", "garlic", "butter", "tandoori", "hyderabadi", "family"
+]
+SIZES = ["", "small", "regular", "large", "half", "full"]
+
+
+def make_menu():
+    """Unique synthetic item names like 'Large Chicken Tikka Masala 17'"""
+    names = set()
+    while len(names) < MENU_SIZE:
+        parts = [random.choice(SIZES), random.choice(QUALIFIERS), random.choice(DISHES), str(random.randint(1, 60))]
+        names.add(" ".join(p for p in parts if p).title())
+    return [
+        {"id": str(uuid.uuid4()), "name": name, "is_available": True, "updated_at": "2026-01-01T00:00:00"}
+        for name in names
+    ]
+
+
+def add_typo(name: str) -> str:
+    """Drop, swap or replace one letter, as platform titles often do"""
+    letters = list(name)
+    position = random.randrange(1, len(letters) - 1)
+    action = random.choice(("drop", "swap", "replace"))
+    if action == "drop":
+        del letters[position]
+    elif action == "swap":
+        letters[position], letters[position + 1] = letters[position + 1], letters[position]
+    else:
+        letters[position] = random.choice(string.ascii_lowercase)
+    return "".join(letters)
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    random.seed(7)
+    menu = make_menu()
+
+    start = time.perf_counter()
+    index = MenuIndex({"Biryani Special": menu[0]["name"]})
+    for item in menu:
+        index.upsert(item)
+    index.resolve_aliases()
+    build_elapsed = time.perf_counter() - start
+
+    sample = random.sample(menu, QUERIES)
+    exact_queries = [item["name"].upper() for item in sample]
+    typo_queries = [add_typo(item["name"]) for item in sample]
+
+    exact_results, exact_time = timed(index.match, exact_queries)
+    typo_results, typo_time = timed(index.match, typo_queries)
+
+    typo_correct = sum(
+        1 for item, result in zip(sample, typo_results) if result and result.menu_item_id == item["id"]
+    )
+
+    carts = [typo_queries[i:i + CART_SIZE] for i in range(0, QUERIES, CART_SIZE)]
+    _, cart_time = timed(index.match_many, carts)
+
+    # Incremental refresh: rename one item in place
+    start = time.perf_counter()
+    index.upsert({**menu[1], "name": menu[1]["name"] + " Deluxe"})
+    upsert_elapsed = time.perf_counter() - start
+
+    print(f"Menu items: {MENU_SIZE}, queries: {QUERIES}")
+    print(f"Index build:          {build_elapsed * 1000:8.1f} ms")
+    print(f"Exact match:          {exact_time * 1e6:8.1f} us/title ({sum(1 for r in exact_results if r)} matched)")
+    print(f"Fuzzy match (1 typo): {typo_time * 1e6:8.1f} us/title ({typo_correct}/{QUERIES} correct)")
+    print(f"Cart of {CART_SIZE} (typos):   {cart_time * 1e6:8.1f} us/cart")
+    print(f"Single item upsert:   {upsert_elapsed * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
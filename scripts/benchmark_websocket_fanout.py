@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark WebSocket fan-out in order-service
+Compares the old sequential send loop with the queued ConnectionManager
+using 5k in-memory sockets per restaurant, a few of them on "bad Wi-Fi"
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+# Make order-service and shared modules importable
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "services", "order-service"))
+
+from app.websocket import ConnectionManager  # noqa: E402
+
+# Per-connection info logs would dominate the timings
+logging.getLogger("websocket").setLevel(logging.ERROR)
+
+# Benchmark configuration
+SOCKETS_PER_RESTAURANT = 5000
+MESSAGES = 40
+SEQUENTIAL_MESSAGES = 2       # The old loop is too slow to run the full burst
+SLOW_SOCKET_RATIO = 0.01      # 1% of tablets on bad Wi-Fi
+SLOW_SEND_SECONDS = 0.25      # Latency of each send on a slow socket
+RESTAURANT_ID = "6956017d-3aea-4ae2-9709-0ca0ac0a1a09"
+
+SAMPLE_ORDER = {
+    "event": "order.created",
+    "order_id": "b7f1c3a2-6d0e-4f4e-9a51-2f7c1d0e9b11",
+    "order_number": "ORD-20260101120000-ABC123",
+    "restaurant_id": RESTAURANT_ID,
+    "order_type": "TABLE",
+    "customer_name": "Guest",
+    "total": 42.5,
+    "items": [{"name": "biriyani", "quantity": 2}, {"name": "Coke Zero", "quantity": 1}]
+}
+
+
+class DeliveryCounter:
+    """Signals once the fast sockets have received an expected number of messages"""
+
+    def __init__(self):
+        self.count = 0
+        self.target = 0
+        self.done = asyncio.Event()
+
+    def reset(self, target: int):
+        self.count = 0
+        self.target = target
+        self.done.clear()
+
+    def hit(self):
+        self.count += 1
+        if self.count >= self.target:
+            self.done.set()
+
+
+class FakeWebSocket:
+    """In-memory stand-in for a Starlette WebSocket"""
+
+    def __init__(self, counter: DeliveryCounter, delay: float = 0.0):
+        self.counter = counter
+        self.delay = delay
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            self.counter.hit()
+
+    async def send_json(self, data: dict):
+        await self.send_text(json.dumps(data))
+
+
+def make_sockets(counter: DeliveryCounter):
+    """Create fast and slow sockets for one restaurant"""
+    sockets = []
+    for _ in range(SOCKETS_PER_RESTAURANT):
+        slow = random.random() < SLOW_SOCKET_RATIO
+        sockets.append(FakeWebSocket(counter, SLOW_SEND_SECONDS if slow else 0.0))
+    return sockets
+
+
+async def bench_sequential(sockets):
+    """Old behaviour: await send_json on each socket one after another"""
+    start = time.perf_counter()
+    for _ in range(SEQUENTIAL_MESSAGES):
+        for ws in sockets:
+            await ws.send_json(SAMPLE_ORDER)
+    return (time.perf_counter() - start) / SEQUENTIAL_MESSAGES
+
+
+async def bench_queued(sockets, counter: DeliveryCounter):
+    """New behaviour: serialize once, enqueue per connection, dedicated writers"""
+    manager = ConnectionManager(queue_size=16, send_timeout=5.0)
+    for ws in sockets:
+        await manager.connect(ws, RESTAURANT_ID)
+
+    counter.reset(MESSAGES * sum(1 for ws in sockets if not ws.delay))
+
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        await manager.broadcast_to_restaurant(SAMPLE_ORDER, RESTAURANT_ID)
+        # Let writers run between messages, as they would between broker deliveries
+        await asyncio.sleep(0)
+    broadcast_elapsed = time.perf_counter() - start
+
+    # Wait until every fast socket has received every message
+    await counter.done.wait()
+    fast_delivery_elapsed = time.perf_counter() - start
+
+    stats = manager.get_stats()
+    for ws in list(sockets):
+        manager.disconnect(ws, RESTAURANT_ID)
+    await asyncio.sleep(0)
+
+    return broadcast_elapsed / MESSAGES, fast_delivery_elapsed / MESSAGES, stats
+
+
+async def main():
+    random.seed(42)
+    counter = DeliveryCounter()
+    sockets = make_sockets(counter)
+    slow_count = sum(1 for ws in sockets if ws.delay)
+
+    print(f"Sockets: {SOCKETS_PER_RESTAURANT} ({slow_count} slow at {SLOW_SEND_SECONDS * 1000:.0f}ms/send)")
+    print(f"Messages per run: {MESSAGES} (sequential: {SEQUENTIAL_MESSAGES})")
+    print()
+
+    sequential = await bench_sequential(sockets)
+    print(f"Sequential send loop:     {sequential * 1000:9.1f} ms/message until last socket served")
+
+    broadcast, fast_delivery, stats = await bench_queued(sockets, counter)
+    print(f"Queued fan-out broadcast: {broadcast * 1000:9.1f} ms/message to publish")
+    print(f"Queued fan-out delivery:  {fast_delivery * 1000:9.1f} ms/message until every fast socket has it")
+    print(f"Slow consumers downgraded/dropped: {stats['slow_consumers_downgraded']}/{stats['slow_consumers_dropped']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a delivery platform's store API
+Point integration-service at it to exercise menu and order-status sync
+without touching Uber:
+
+    uvicorn scripts.fake_delivery_platform:app --port 8099
+    UBER_API_BASE_URL=http://localhost:8099 ...
+
+Enforces a per-store rate limit (429 + Retry-After) and can inject
+server errors, so retries and rate limiting can be observed.
+"""
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Requests allowed per store per second before answering 429
+RATE_LIMIT_PER_SECOND = int(os.getenv("FAKE_PLATFORM_RATE_LIMIT", "5"))
+# Fraction of requests answered with 503
+ERROR_RATE = float(os.getenv("FAKE_PLATFORM_ERROR_RATE", "0"))
+
+app = FastAPI(title="Fake Delivery Platform")
+
+# store_id -> item_id -> item
+menus: Dict[str, Dict[str, Dict[str, Any]]] = {}
+# platform order id -> list of statuses received, in order
+order_statuses: Dict[str, List[str]] = {}
+# store_id -> request timestamps within the last second
+request_log: Dict[str, List[float]] = {}
+stats = {
+    "requests": 0, "rate_limited": 0, "errors": 0,
+    "items_upserted": 0, "items_deleted": 0, "status_updates": 0
+}
+
+
+def _check_limits(store_id: str):
+    """Return an error response if the request is rate limited or unlucky"""
+    stats["requests"] += 1
+    now = time.monotonic()
+    recent = [t for t in request_log.get(store_id, []) if now - t < 1.0]
+    if len(recent) >= RATE_LIMIT_PER_SECOND:
+        stats["rate_limited"] += 1
+        request_log[store_id] = recent
+        return JSONResponse(status_code=429, content={"error": "rate limited"}, headers={"Retry-After": "1"})
+    recent.append(now)
+    request_log[store_id] = recent
+
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        stats["errors"] += 1
+        return JSONResponse(status_code=503, content={"error": "temporarily unavailable"})
+    return None
+
+
+@app.put("/stores/{store_id}/menu/items")
+async def upsert_items(store_id: str, request: Request):
+    error = _check_limits(store_id)
+    if error:
+        return error
+    body = await request.json()
+    menu = menus.setdefault(store_id, {})
+    for item in body.get("items", []):
+        menu[item["id"]] = item
+    stats["items_upserted"] += len(body.get("items", []))
+    return {"upserted": len(body.get("items", []))}
+
+
+@app.post("/stores/{store_id}/menu/items/delete")
+async def delete_items(store_id: str, request: Request):
+    error = _check_limits(store_id)
+    if error:
+        return error
+    body = await request.json()
+    menu = menus.setdefault(store_id, {})
+    for item_id in body.get("ids", []):
+        menu.pop(item_id, None)
+    stats["items_deleted"] += len(body.get("ids", []))
+    return {"deleted": len(body.get("ids", []))}
+
+
+@app.get("/stores/{store_id}/menu")
+async def get_menu(store_id: str):
+    """Inspect what the platform currently holds"""
+    return {"items": list(menus.get(store_id, {}).values())}
+
+
+@app.post("/orders/status")
+async def update_order_statuses(request: Request):
+    error = _check_limits("orders")
+    if error:
+        return error
+    body = await request.json()
+    for update in body.get("updates", []):
+        order_statuses.setdefault(update["order_id"], []).append(update["status"])
+    stats["status_updates"] += len(body.get("updates", []))
+    return {"updated": len(body.get("updates", []))}
+
+
+@app.get("/orders/{order_id}")
+async def get_order(order_id: str):
+    """Statuses the platform has received for an order"""
+    statuses = order_statuses.get(order_id, [])
+    return {"order_id": order_id, "status": statuses[-1] if statuses else None, "history": statuses}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("FAKE_PLATFORM_PORT", "8099")))
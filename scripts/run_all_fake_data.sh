@@ -146,6 +146,11 @@ exec(open('generate_daily_orders_sql.py').read().replace('target_orders = 250',
         ;;
 esac
 
+# Generated orders are inserted with SQL, bypassing order-service, so the
+# hourly analytics rollups have to be rebuilt for the affected days
+run_step "Rebuild analytics rollups (last 31 days)" \
+         "kubectl exec -n restaurant-system deploy/order-service -- python -m app.services.analytics_rollups backfill --start $(date -u -d '31 days ago' +%F)"
+
 echo ""
 echo "============================================================================="
 echo "📈 VERIFICATION"
@@ -3,7 +3,7 @@ API Gateway for Restaurant Management System
 Handles routing, authentication, and rate limiting for all microservices
 """
 from fastapi import FastAPI, Request, HTTPException, status, Depends
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import httpx
@@ -12,11 +12,13 @@ from typing import Optional
 import time
 from collections import defaultdict
 import asyncio
+from starlette.background import BackgroundTask
 
 # Service URLs from environment variables
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8001")
 RESTAURANT_SERVICE_URL = os.getenv("RESTAURANT_SERVICE_URL", "http://restaurant-service:8003")
 ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://order-service:8004")
+KITCHEN_SERVICE_URL = os.getenv("KITCHEN_SERVICE_URL", "http://kitchen-service:8005")
 POS_SERVICE_URL = os.getenv("POS_SERVICE_URL", "http://pos-service:8005")  # Future POS service
 CUSTOMER_SERVICE_URL = os.getenv("CUSTOMER_SERVICE_URL", "http://customer-service:8007")
 INTEGRATION_SERVICE_URL = os.getenv("INTEGRATION_SERVICE_URL", "http://integration-service:8015")
@@ -25,6 +27,13 @@ INTEGRATION_SERVICE_URL = os.getenv("INTEGRATION_SERVICE_URL", "http://integrati
 RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
 RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
 
+# Upstream timeout (seconds); event streams have no read timeout
+UPSTREAM_TIMEOUT = 30.0
+EVENT_STREAM = "text/event-stream"
+
+# Hop-by-hop and length headers that must not be copied onto a streamed response
+STREAM_EXCLUDED_HEADERS = {"content-length", "transfer-encoding", "connection"}
+
 app = FastAPI(
     title="Restaurant Management API Gateway",
     description="Unified API Gateway for all restaurant management services",
@@ -78,6 +87,73 @@ async def health_check():
     }
 
 
+async def proxy_event_stream(request: Request, target_url: str, headers: dict, body: bytes):
+    """
+    Forward a request for Server-Sent Events (EventSource always sends
+    Accept: text/event-stream) and relay the stream chunk by chunk instead of
+    buffering it; other responses to it are returned as usual
+    """
+    client = httpx.AsyncClient(timeout=httpx.Timeout(UPSTREAM_TIMEOUT, read=None))
+    try:
+        upstream = await client.send(
+            client.build_request(
+                method=request.method,
+                url=target_url,
+                headers=headers,
+                content=body,
+                params=request.query_params
+            ),
+            stream=True
+        )
+    except httpx.ConnectError:
+        await client.aclose()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service temporarily unavailable"
+        )
+    except httpx.TimeoutException:
+        await client.aclose()
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Request timeout"
+        )
+    except Exception as e:
+        await client.aclose()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Gateway error: {str(e)}"
+        )
+
+    async def close():
+        await upstream.aclose()
+        await client.aclose()
+
+    content_type = upstream.headers.get("content-type", "")
+    if not content_type.startswith(EVENT_STREAM):
+        # Errors such as 404 for an unknown order are small plain responses
+        try:
+            content = await upstream.aread()
+        finally:
+            await close()
+        return Response(
+            content=content,
+            status_code=upstream.status_code,
+            headers=dict(upstream.headers),
+            media_type=content_type or None
+        )
+
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        status_code=upstream.status_code,
+        headers={
+            name: value for name, value in upstream.headers.items()
+            if name.lower() not in STREAM_EXCLUDED_HEADERS
+        },
+        media_type=content_type,
+        background=BackgroundTask(close)
+    )
+
+
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 async def gateway(
     request: Request,
@@ -112,6 +188,9 @@ async def gateway(
     elif path.startswith("api/v1/orders") or path.startswith("api/v1/sessions") or path.startswith("api/v1/assistance"):
         target_url = f"{ORDER_SERVICE_URL}/{path}"
         print(f"DEBUG: Routing to ORDER_SERVICE: {target_url}")
+    elif path.startswith("api/v1/kitchen"):
+        target_url = f"{KITCHEN_SERVICE_URL}/{path}"
+        print(f"DEBUG: Routing to KITCHEN_SERVICE: {target_url}")
     elif path.startswith("api/v1/restaurants") and "/analytics/" in path:
         # Route detailed analytics endpoints to order-service (e.g., /analytics/revenue, /analytics/popular-items)
         target_url = f"{ORDER_SERVICE_URL}/{path}"
@@ -156,8 +235,12 @@ async def gateway(
     if "/users" in path:
         print(f"DEBUG: Headers being sent to backend: {headers}")
 
+    # Event streams are relayed as they arrive, without the request timeout
+    if EVENT_STREAM in request.headers.get("accept", ""):
+        return await proxy_event_stream(request, target_url, headers, body)
+
     # Forward request to target service
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    async with httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT) as client:
         try:
             response = await client.request(
                 method=request.method,
@@ -0,0 +1,197 @@
+"""
+Deduplication of delivery-platform webhook events
+Platforms retry webhooks; each event is claimed once and retries get the
+original outcome back
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("webhook-dedup")
+
+# Seconds a claimed or completed event is remembered
+DEDUP_TTL_SECONDS = int(os.getenv("WEBHOOK_DEDUP_TTL_SECONDS", "86400"))
+# Events remembered in process memory
+DEDUP_LRU_SIZE = int(os.getenv("WEBHOOK_DEDUP_LRU_SIZE", "10000"))
+# Seconds an in-flight claim learned from Redis is trusted locally,
+# so the final outcome from another replica is picked up soon after
+IN_FLIGHT_LOCAL_TTL = 5.0
+# Seconds Redis is bypassed after an error, so an outage costs one timeout
+REDIS_RETRY_SECONDS = 30.0
+REDIS_KEY_PREFIX = "webhook:dedup:"
+
+# Claim states
+ACCEPTED = "accepted"
+DONE = "done"
+
+# Redis shares claims between replicas (optional - falls back to memory only)
+try:
+    import redis.asyncio as redis
+
+    redis_client = redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        password=os.getenv("REDIS_PASSWORD") or None,
+        db=int(os.getenv("REDIS_DB", "0")),
+        decode_responses=True,
+        # Keep webhook acknowledgements fast if Redis is unreachable
+        socket_connect_timeout=0.5,
+        socket_timeout=0.5
+    )
+    REDIS_AVAILABLE = True
+except Exception as e:
+    logger.warning(f"Redis not available for webhook dedup: {e}")
+    redis_client = None
+    REDIS_AVAILABLE = False
+
+
+def webhook_dedup_key(platform: str, payload: Dict[str, Any]) -> Optional[str]:
+    """
+    Identify a webhook event across retries
+
+    New-order notifications are keyed by the platform order id, so even a
+    re-sent notification with a new event id cannot create a second order.
+    Other events use the platform event id when there is one.
+    """
+    event_type = payload.get("event_type", "unknown")
+    order = payload.get("order") or payload.get("data") or {}
+    order_id = (
+        order.get("id")
+        or payload.get("order_id")
+        or (payload.get("meta") or {}).get("resource_id")
+    )
+
+    if event_type == "orders.notification" and order_id:
+        return f"{platform}:{event_type}:{order_id}"
+
+    event_id = payload.get("event_id")
+    if event_id:
+        return f"{platform}:event:{event_id}"
+
+    if order_id:
+        status = payload.get("status") or order.get("status") or ""
+        return f"{platform}:{event_type}:{order_id}:{status}"
+
+    return None
+
+
+class WebhookDeduplicator:
+    """
+    Claims webhook events in a bounded local LRU backed by Redis
+
+    claim() is atomic: in memory within the process, and across replicas
+    through Redis SET NX. A duplicate is answered from the LRU without any
+    I/O when this replica has seen the event before.
+    """
+
+    def __init__(self, max_size: int = DEDUP_LRU_SIZE, ttl: int = DEDUP_TTL_SECONDS):
+        self.local: OrderedDict = OrderedDict()
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # Metrics
+        self.claims = 0
+        self.duplicates_local = 0
+        self.duplicates_redis = 0
+        self.redis_errors = 0
+        self._redis_down_until = 0.0
+
+    def _redis_usable(self) -> bool:
+        return REDIS_AVAILABLE and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, action: str, error: Exception):
+        self.redis_errors += 1
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        logger.warning(f"Redis dedup {action} failed, using memory only for {REDIS_RETRY_SECONDS:.0f}s: {error}")
+
+    def _remember(self, key: str, record: Dict[str, Any], ttl: float):
+        self.local[key] = (record, time.monotonic() + ttl)
+        self.local.move_to_end(key)
+        while len(self.local) > self.max_size:
+            self.local.popitem(last=False)
+
+    def _local_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.local.get(key)
+        if entry is None:
+            return None
+        record, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.local[key]
+            return None
+        self.local.move_to_end(key)
+        return record
+
+    async def claim(self, key: str, event_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim an event for processing
+
+        Returns None when the caller now owns the event, or the existing
+        record ({"state", "event_id", "outcome"}) for a duplicate.
+        """
+        existing = self._local_get(key)
+        if existing is not None:
+            self.duplicates_local += 1
+            return existing
+
+        record = {"state": ACCEPTED, "event_id": event_id, "outcome": None}
+
+        if self._redis_usable():
+            try:
+                claimed = await redis_client.set(
+                    REDIS_KEY_PREFIX + key, json.dumps(record), nx=True, ex=self.ttl
+                )
+                if not claimed:
+                    cached = await redis_client.get(REDIS_KEY_PREFIX + key)
+                    if cached:
+                        existing = json.loads(cached)
+                        local_ttl = self.ttl if existing.get("state") == DONE else IN_FLIGHT_LOCAL_TTL
+                        self._remember(key, existing, local_ttl)
+                        self.duplicates_redis += 1
+                        return existing
+            except Exception as e:
+                # Memory-only dedup still stops retries hitting this replica
+                self._redis_failed("claim", e)
+
+        self._remember(key, record, self.ttl)
+        self.claims += 1
+        return None
+
+    async def complete(self, key: str, event_id: str, outcome: Any):
+        """Store the outcome returned to later duplicates"""
+        record = {"state": DONE, "event_id": event_id, "outcome": outcome}
+        self._remember(key, record, self.ttl)
+
+        if self._redis_usable():
+            try:
+                await redis_client.set(
+                    REDIS_KEY_PREFIX + key, json.dumps(record, default=str), ex=self.ttl
+                )
+            except Exception as e:
+                self._redis_failed("update", e)
+
+    async def release(self, key: str):
+        """Forget a claim so the platform's next retry is processed again"""
+        self.local.pop(key, None)
+
+        if self._redis_usable():
+            try:
+                await redis_client.delete(REDIS_KEY_PREFIX + key)
+            except Exception as e:
+                self._redis_failed("release", e)
+
+    def get_stats(self) -> dict:
+        return {
+            "redis": self._redis_usable(),
+            "local_entries": len(self.local),
+            "claims": self.claims,
+            "duplicates_local": self.duplicates_local,
+            "duplicates_redis": self.duplicates_redis,
+            "redis_errors": self.redis_errors
+        }
+
+
+# Global deduplicator instance
+webhook_dedup = WebhookDeduplicator()
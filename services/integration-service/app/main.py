@@ -6,12 +6,24 @@ from fastapi import FastAPI, Request, HTTPException, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from contextlib import asynccontextmanager
 from typing import Optional
 import logging
 import hmac
 import hashlib
 import os
 import secrets
+import json
+import uuid
+import httpx
+from .rabbitmq_publisher import publisher
+from .database import close_db
+from .dedup import webhook_dedup, webhook_dedup_key
+from .webhook_queue import webhook_queue, WebhookWorkerPool
+from .uber_handler import process_uber_event
+from .platform_client import platform_clients, close_platform_clients, PlatformAPIError
+from .menu_sync import menu_sync
+from .status_sync import status_sync, platform_orders
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -25,10 +37,50 @@ WEBHOOK_PASSWORD = os.getenv("WEBHOOK_PASSWORD", "secure-password-123")
 # Basic Auth security
 security = HTTPBasic(auto_error=False)
 
+
+async def _remember_outcome(event: dict, result):
+    """Cache the outcome so platform retries are answered without reprocessing"""
+    if event.get("dedup_key"):
+        await webhook_dedup.complete(event["dedup_key"], event["id"], result)
+
+
+async def _release_claim(event: dict):
+    """Let the platform's next retry of a dead-lettered event be processed"""
+    if event.get("dedup_key"):
+        await webhook_dedup.release(event["dedup_key"])
+
+
+# Workers that process queued webhook events
+webhook_workers = WebhookWorkerPool(
+    webhook_queue,
+    process_uber_event,
+    on_done=_remember_outcome,
+    on_dead=_release_claim
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the RabbitMQ publisher, webhook workers and order status sync"""
+    await publisher.start()
+    await webhook_queue.open()
+    await platform_orders.open()
+    webhook_workers.start()
+    await status_sync.start()
+    yield
+    await status_sync.close()
+    await webhook_workers.stop()
+    await webhook_queue.close()
+    await close_platform_clients()
+    await publisher.close()
+    await close_db()
+
+
 app = FastAPI(
     title="Integration Service",
     description="Third-party delivery platform integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -52,6 +104,11 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "integration-service"}
 
+@app.get("/health/publisher")
+async def publisher_health():
+    """RabbitMQ publisher connection and buffer counters"""
+    return publisher.get_stats()
+
 # Helper functions
 def verify_basic_auth(credentials: Optional[HTTPBasicCredentials]) -> bool:
     """Verify Basic Authentication credentials"""
@@ -63,6 +120,15 @@ def verify_basic_auth(credentials: Optional[HTTPBasicCredentials]) -> bool:
 
     return correct_username and correct_password
 
+def require_basic_auth(credentials: Optional[HTTPBasicCredentials] = Depends(security)):
+    """Dependency for operational endpoints: the webhook Basic Auth credentials are required"""
+    if not verify_basic_auth(credentials):
+        raise HTTPException(
+            status_code=401,
+            detail="Authentication required",
+            headers={"WWW-Authenticate": "Basic"}
+        )
+
 def verify_uber_signature(body: bytes, signature: str) -> bool:
     """Verify X-Uber-Signature header"""
     if not signature:
@@ -95,63 +161,131 @@ async def uber_eats_webhook(
     Authentication:
     - Optional Basic Auth: username/password
     - Uber Signature: X-Uber-Signature header (HMAC-SHA256)
+
+    The raw event is stored in the durable webhook queue and acknowledged
+    with 202; workers process it asynchronously. Poll the returned
+    status_url for the outcome. Retries of an event already accepted are
+    answered with 200 and the original event id and outcome.
     """
+    # Get request body
+    body = await request.body()
+    logger.info(f"Received Uber Eats webhook: {body[:200]}")
+
+    # Verify authentication (if Basic Auth is provided, validate it)
+    if credentials and not verify_basic_auth(credentials):
+        logger.warning("Invalid Basic Auth credentials")
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Verify Uber signature if provided
+    if x_uber_signature:
+        if not verify_uber_signature(body, x_uber_signature):
+            logger.warning("Invalid Uber signature")
+            raise HTTPException(status_code=401, detail="Invalid signature")
+        logger.info("Uber signature verified successfully")
+
     try:
-        # Get request body
-        body = await request.body()
-        logger.info(f"Received Uber Eats webhook: {body[:200]}")
-
-        # Verify authentication (if Basic Auth is provided, validate it)
-        if credentials and not verify_basic_auth(credentials):
-            logger.warning("Invalid Basic Auth credentials")
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-
-        # Verify Uber signature if provided
-        if x_uber_signature:
-            if not verify_uber_signature(body, x_uber_signature):
-                logger.warning("Invalid Uber signature")
-                raise HTTPException(status_code=401, detail="Invalid signature")
-            logger.info("Uber signature verified successfully")
-
-        # Parse JSON
-        import json
         payload = json.loads(body.decode())
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
-        event_type = payload.get("event_type", "unknown")
-        logger.info(f"Event type: {event_type}")
-
-        # Import handler functions
-        from .uber_handler import process_uber_order, handle_order_cancel, handle_status_update
+    event_type = payload.get("event_type", "unknown")
+    event_id = uuid.uuid4().hex
 
-        # Handle different event types
-        if event_type == "orders.notification":
-            # New order received
-            logger.info("New Uber Eats order received")
-            order = await process_uber_order(payload)
+    # Claim the event before queueing it; retries get the original outcome
+    dedup_key = webhook_dedup_key("uber_eats", payload)
+    if dedup_key:
+        existing = await webhook_dedup.claim(dedup_key, event_id)
+        if existing:
+            logger.info(f"Duplicate Uber Eats event {dedup_key}")
             return {
-                "status": "success",
-                "message": "Order created successfully",
-                "order_number": order.get("order_number"),
-                "order_id": order.get("id")
+                "status": "duplicate",
+                "event_id": existing["event_id"],
+                "state": existing["state"],
+                "outcome": existing["outcome"],
+                "status_url": f"/api/v1/webhooks/events/{existing['event_id']}"
             }
 
-        elif event_type == "orders.cancel":
-            # Order cancelled
-            logger.info("Uber Eats order cancelled")
-            result = await handle_order_cancel(payload)
-            return {"status": "success", "message": "Order cancelled", "data": result}
+    try:
+        await webhook_queue.enqueue("uber_eats", event_type, body.decode(), event_id=event_id, dedup_key=dedup_key)
+    except Exception as e:
+        logger.error(f"Failed to queue webhook: {str(e)}")
+        if dedup_key:
+            await webhook_dedup.release(dedup_key)
+        raise HTTPException(status_code=500, detail="Failed to queue webhook")
 
-        elif event_type == "orders.status_update":
-            # Status updated
-            logger.info("Uber Eats order status updated")
-            result = await handle_status_update(payload)
-            return {"status": "success", "message": "Status updated", "data": result}
+    logger.info(f"Queued Uber Eats event {event_type} as {event_id}")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": "accepted",
+            "event_id": event_id,
+            "status_url": f"/api/v1/webhooks/events/{event_id}"
+        }
+    )
 
-        return {"status": "success", "message": "Webhook processed"}
+# Webhook event status
+@app.get("/api/v1/webhooks/events/{event_id}")
+async def get_webhook_event(event_id: str):
+    """Processing status and outcome of a queued webhook event"""
+    event = await webhook_queue.get(event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Webhook event not found")
+    return event
 
-    except Exception as e:
-        logger.error(f"Webhook error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/api/v1/webhooks/dead-letter", dependencies=[Depends(require_basic_auth)])
+async def list_dead_letter_events(limit: int = 100):
+    """Webhook events that failed every retry"""
+    return await webhook_queue.list_dead(limit)
+
+@app.post("/api/v1/webhooks/events/{event_id}/retry", dependencies=[Depends(require_basic_auth)])
+async def retry_webhook_event(event_id: str):
+    """Requeue a dead-lettered webhook event"""
+    if not await webhook_queue.retry(event_id):
+        raise HTTPException(status_code=404, detail="No dead-lettered event with this id")
+    return {"status": "requeued", "event_id": event_id}
+
+@app.get("/health/webhooks")
+async def webhook_health():
+    """Webhook queue depth by status, worker and dedup counters"""
+    return {
+        "queue": await webhook_queue.counts(),
+        "workers": webhook_workers.get_stats(),
+        "dedup": webhook_dedup.get_stats()
+    }
+
+# Menu sync to delivery platforms
+@app.post("/api/v1/integrations/{platform}/menu-sync/{restaurant_id}", dependencies=[Depends(require_basic_auth)])
+async def sync_menu(
+    platform: str,
+    restaurant_id: str,
+    store_id: Optional[str] = None,
+    dry_run: bool = False,
+    full: bool = False
+):
+    """
+    Push menu changes for a restaurant to a delivery platform
+
+    Only items whose content changed since the last successful sync are
+    sent. dry_run reports the diff without sending; full re-sends every item.
+    Requires the webhook Basic Auth credentials.
+    """
+    client = platform_clients.get(platform.replace("-", "_"))
+    if not client:
+        raise HTTPException(status_code=404, detail=f"Unknown platform: {platform}")
+
+    try:
+        return await menu_sync.sync(client, restaurant_id, store_id=store_id, dry_run=dry_run, full=full)
+    except (PlatformAPIError, httpx.HTTPError) as e:
+        logger.error(f"Menu sync failed: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+@app.get("/health/platforms")
+async def platforms_health():
+    """Outbound request, retry and rate-limit counters per platform, and status sync"""
+    return {
+        "clients": {name: client.get_stats() for name, client in platform_clients.items()},
+        "status_sync": status_sync.get_stats()
+    }
 
 # OAuth Callback Endpoint
 @app.get("/api/v1/integrations/uber-eats/callback")
@@ -0,0 +1,342 @@
+"""
+Menu-item matching for delivery-platform orders
+Maps item titles sent by a platform to menu item ids using a per-restaurant
+index of normalized names, aliases and trigrams
+"""
+import asyncio
+import httpx
+import json
+import os
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("menu-matcher")
+
+RESTAURANT_SERVICE_URL = os.getenv("RESTAURANT_SERVICE_URL", "http://restaurant-service:8003")
+# Seconds before a cached index checks restaurant-service for changed items
+MENU_REFRESH_SECONDS = float(os.getenv("MENU_REFRESH_SECONDS", "30"))
+# Seconds before a cached index is rebuilt from scratch (picks up deleted items)
+MENU_FULL_REFRESH_SECONDS = float(os.getenv("MENU_FULL_REFRESH_SECONDS", "600"))
+# Minimum trigram similarity (Dice coefficient) for a fuzzy match
+MENU_MATCH_THRESHOLD = float(os.getenv("MENU_MATCH_THRESHOLD", "0.5"))
+# Optional JSON file: {"<restaurant_id>": {"<platform title>": "<menu item name or id>"}}
+MENU_ALIASES_FILE = os.getenv("MENU_ALIASES_FILE")
+
+MENU_PAGE_SIZE = 500
+
+# Spelling variants seen on platforms, applied per token before indexing and matching
+TOKEN_SYNONYMS = {
+    "biryani": "biriyani",
+    "briyani": "biriyani",
+    "biriani": "biriyani",
+    "coca": "coke",
+    "cola": "coke",
+    "w": "with",
+    "n": "and",
+}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, strip accents and punctuation, and apply token synonyms"""
+    name = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode()
+    name = name.lower().replace("&", " and ")
+    tokens = []
+    for token in _NON_ALNUM.split(name):
+        if not token:
+            continue
+        token = TOKEN_SYNONYMS.get(token, token)
+        # Fold simple plurals so "samosas" matches "samosa"
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """Character trigrams of each token, padded so short words still index"""
+    grams = set()
+    for token in normalized.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass
+class MenuMatch:
+    """Result of matching one platform item title"""
+    menu_item_id: str
+    name: str
+    score: float
+    method: str  # exact, alias or fuzzy
+
+
+class MenuIndex:
+    """
+    In-memory name index for one restaurant's menu
+
+    Exact and alias lookups are dict hits. For anything else each title
+    token is corrected against the menu vocabulary (small, trigram-indexed),
+    candidates are narrowed by intersecting the item sets of the corrected
+    tokens, rarest first, and only those few are scored by trigram
+    similarity. Cost depends on the title, not on the menu size.
+    """
+
+    def __init__(self, aliases: Optional[Dict[str, str]] = None):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.exact: Dict[str, Set[str]] = {}
+        self.item_grams: Dict[str, Set[str]] = {}
+        # token -> item ids, and trigram -> vocabulary tokens
+        self.token_items: Dict[str, Set[str]] = {}
+        self.vocab_grams: Dict[str, Set[str]] = {}
+        self.aliases: Dict[str, str] = {}
+        self._raw_aliases = aliases or {}
+        self.last_updated_at: Optional[datetime] = None
+        self.built_at = time.monotonic()
+        self.refreshed_at = self.built_at
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def upsert(self, item: Dict[str, Any]):
+        """Add or replace one menu item"""
+        item_id = str(item["id"])
+        if item_id in self.items:
+            self.remove(item_id)
+
+        normalized = normalize_name(item.get("name", ""))
+        self.items[item_id] = {
+            "id": item_id,
+            "name": item.get("name", ""),
+            "normalized": normalized,
+            "is_available": item.get("is_available", True)
+        }
+        self.exact.setdefault(normalized, set()).add(item_id)
+        self.item_grams[item_id] = trigrams(normalized)
+        for token in set(normalized.split()):
+            if token not in self.token_items:
+                self.token_items[token] = set()
+                for gram in trigrams(token):
+                    self.vocab_grams.setdefault(gram, set()).add(token)
+            self.token_items[token].add(item_id)
+
+        updated_at = item.get("updated_at")
+        if updated_at:
+            updated_at = datetime.fromisoformat(str(updated_at).replace("Z", ""))
+            if self.last_updated_at is None or updated_at > self.last_updated_at:
+                self.last_updated_at = updated_at
+
+    def remove(self, item_id: str):
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return
+        self.item_grams.pop(item_id, None)
+        ids = self.exact.get(item["normalized"])
+        if ids:
+            ids.discard(item_id)
+            if not ids:
+                del self.exact[item["normalized"]]
+        for token in set(item["normalized"].split()):
+            ids = self.token_items.get(token)
+            if ids is None:
+                continue
+            ids.discard(item_id)
+            if not ids:
+                del self.token_items[token]
+                for gram in trigrams(token):
+                    tokens = self.vocab_grams.get(gram)
+                    if tokens:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self.vocab_grams[gram]
+
+    def resolve_aliases(self):
+        """Map alias titles to item ids; targets may be item ids or item names"""
+        self.aliases = {}
+        for alias, target in self._raw_aliases.items():
+            if target in self.items:
+                self.aliases[normalize_name(alias)] = target
+                continue
+            ids = self.exact.get(normalize_name(target))
+            if ids:
+                self.aliases[normalize_name(alias)] = self._pick(ids)
+
+    def _pick(self, ids: Iterable[str]) -> str:
+        """Prefer an available item when several share a name"""
+        return min(ids, key=lambda item_id: (not self.items[item_id]["is_available"], item_id))
+
+    def _correct_token(self, token: str) -> Optional[str]:
+        """Closest vocabulary token by trigram similarity"""
+        if token in self.token_items:
+            return token
+        grams = trigrams(token)
+        overlap: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self.vocab_grams.get(gram, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+
+        best, best_score = None, 0.0
+        for candidate, shared in overlap.items():
+            score = 2.0 * shared / (len(grams) + len(candidate) + 1)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best if best_score >= MENU_MATCH_THRESHOLD else None
+
+    def match(self, title: str) -> Optional[MenuMatch]:
+        normalized = normalize_name(title)
+        if not normalized:
+            return None
+
+        item_id = self.aliases.get(normalized)
+        if item_id in self.items:
+            return MenuMatch(item_id, self.items[item_id]["name"], 1.0, "alias")
+
+        ids = self.exact.get(normalized)
+        if ids:
+            item_id = self._pick(ids)
+            return MenuMatch(item_id, self.items[item_id]["name"], 1.0, "exact")
+
+        tokens = [t for t in (self._correct_token(t) for t in normalized.split()) if t]
+        if not tokens:
+            return None
+
+        # Narrow to items containing the corrected tokens, rarest token first
+        tokens.sort(key=lambda t: len(self.token_items[t]))
+        candidates = self.token_items[tokens[0]]
+        for token in tokens[1:]:
+            narrowed = candidates & self.token_items[token]
+            if not narrowed:
+                break
+            candidates = narrowed
+
+        grams = trigrams(normalized)
+        best_id, best_score = None, 0.0
+        for candidate in candidates:
+            candidate_grams = self.item_grams[candidate]
+            score = 2.0 * len(grams & candidate_grams) / (len(grams) + len(candidate_grams))
+            if score > best_score or (
+                score == best_score and best_id is not None
+                and self.items[candidate]["is_available"] and not self.items[best_id]["is_available"]
+            ):
+                best_id, best_score = candidate, score
+
+        if best_id is None or best_score < MENU_MATCH_THRESHOLD:
+            return None
+        return MenuMatch(best_id, self.items[best_id]["name"], round(best_score, 3), "fuzzy")
+
+    def match_many(self, titles: List[str]) -> List[Optional[MenuMatch]]:
+        """Match a whole cart; repeated titles are matched once"""
+        seen: Dict[str, Optional[MenuMatch]] = {}
+        results = []
+        for title in titles:
+            if title not in seen:
+                seen[title] = self.match(title)
+            results.append(seen[title])
+        return results
+
+
+async def fetch_menu_items(restaurant_id: str, updated_since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """All menu items of a restaurant (or those changed since a time), page by page"""
+    items: List[Dict[str, Any]] = []
+    params: Dict[str, Any] = {"limit": MENU_PAGE_SIZE, "skip": 0}
+    if updated_since is not None:
+        params["updated_since"] = updated_since.isoformat()
+
+    async with httpx.AsyncClient() as client:
+        while True:
+            response = await client.get(
+                f"{RESTAURANT_SERVICE_URL}/api/v1/restaurants/{restaurant_id}/menu-items",
+                params=params,
+                timeout=10.0
+            )
+            response.raise_for_status()
+            page = response.json()
+            items.extend(page)
+            if len(page) < MENU_PAGE_SIZE:
+                return items
+            params["skip"] += MENU_PAGE_SIZE
+
+
+def load_aliases() -> Dict[str, Dict[str, str]]:
+    """Per-restaurant alias tables from MENU_ALIASES_FILE"""
+    if not MENU_ALIASES_FILE:
+        return {}
+    try:
+        with open(MENU_ALIASES_FILE) as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Failed to load menu aliases from {MENU_ALIASES_FILE}: {e}")
+        return {}
+
+
+class MenuMatcher:
+    """Caches one MenuIndex per restaurant and keeps it in sync with restaurant-service"""
+
+    def __init__(self):
+        self.indexes: Dict[str, MenuIndex] = {}
+        self.aliases = load_aliases()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _build(self, restaurant_id: str) -> MenuIndex:
+        index = MenuIndex(self.aliases.get(restaurant_id))
+        for item in await fetch_menu_items(restaurant_id):
+            index.upsert(item)
+        index.resolve_aliases()
+        logger.info(f"Built menu index for restaurant {restaurant_id}: {len(index)} items")
+        return index
+
+    async def _refresh(self, restaurant_id: str, index: MenuIndex):
+        """Apply items changed since the newest one already indexed"""
+        # Overlap by a second so items saved in the same instant are not missed
+        since = index.last_updated_at - timedelta(seconds=1) if index.last_updated_at else None
+        changed = await fetch_menu_items(restaurant_id, since)
+        for item in changed:
+            index.upsert(item)
+        if changed:
+            index.resolve_aliases()
+            logger.info(f"Refreshed {len(changed)} menu items for restaurant {restaurant_id}")
+        index.refreshed_at = time.monotonic()
+
+    async def get_index(self, restaurant_id: str) -> MenuIndex:
+        """Cached index for a restaurant, built or refreshed as needed"""
+        index = self.indexes.get(restaurant_id)
+        now = time.monotonic()
+        if index and now - index.refreshed_at < MENU_REFRESH_SECONDS:
+            return index
+
+        lock = self._locks.setdefault(restaurant_id, asyncio.Lock())
+        async with lock:
+            index = self.indexes.get(restaurant_id)
+            now = time.monotonic()
+            try:
+                if index is None or now - index.built_at >= MENU_FULL_REFRESH_SECONDS:
+                    index = await self._build(restaurant_id)
+                    self.indexes[restaurant_id] = index
+                elif now - index.refreshed_at >= MENU_REFRESH_SECONDS:
+                    await self._refresh(restaurant_id, index)
+            except Exception as e:
+                if index is None:
+                    raise
+                # Keep matching against the cached menu until restaurant-service is back
+                logger.warning(f"Menu refresh failed for restaurant {restaurant_id}, using cached index: {e}")
+                index.refreshed_at = now
+        return index
+
+    def invalidate(self, restaurant_id: str):
+        """Force a full rebuild on the next match"""
+        self.indexes.pop(restaurant_id, None)
+
+    async def match_cart(self, restaurant_id: str, titles: List[str]) -> List[Optional[MenuMatch]]:
+        """Match every item title of a cart against the restaurant's menu"""
+        index = await self.get_index(restaurant_id)
+        return index.match_many(titles)
+
+
+# Global matcher instance
+menu_matcher = MenuMatcher()
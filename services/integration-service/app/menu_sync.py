@@ -0,0 +1,218 @@
+"""
+Diff-based menu sync to delivery platforms
+Compares content hashes of the current restaurant-service menu with the last
+snapshot published to a platform and sends only what changed, in batches
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from shared.utils.logger import setup_logger
+from .database import async_session_maker, ensure_schema
+from .menu_matcher import fetch_menu_items
+from .platform_client import DeliveryPlatformClient
+
+logger = setup_logger("menu-sync")
+
+MENU_SYNC_BATCH_SIZE = int(os.getenv("MENU_SYNC_BATCH_SIZE", "50"))
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS integration_menu_snapshots (
+        platform TEXT NOT NULL,
+        restaurant_id TEXT NOT NULL,
+        item_id TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        published_at DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (platform, restaurant_id, item_id)
+    )
+    """,
+]
+
+def platform_menu_entity(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields a platform sees for one menu item"""
+    return {
+        "id": str(item["id"]),
+        "title": item.get("name"),
+        "description": item.get("description") or "",
+        "category": item.get("category"),
+        # Platforms take prices in minor units
+        "price": int(round(float(item.get("price") or 0) * 100)),
+        "available": bool(item.get("is_available", True)),
+        "image_url": item.get("image_url"),
+        "vegetarian": bool(item.get("is_vegetarian")),
+        "vegan": bool(item.get("is_vegan")),
+        "gluten_free": bool(item.get("is_gluten_free")),
+        "allergens": sorted(item.get("allergens") or [])
+    }
+
+
+def content_hash(entity: Dict[str, Any]) -> str:
+    """Stable hash of an entity; key order and whitespace do not matter"""
+    canonical = json.dumps(entity, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def diff_menu(
+    current: Dict[str, Dict[str, Any]],
+    published: Dict[str, str],
+    full: bool = False
+) -> Tuple[List[Dict[str, Any]], List[str], int]:
+    """
+    Compare current entities with published hashes
+
+    Returns (entities to upsert, item ids to delete, unchanged count).
+    With full, every current entity is upserted.
+    """
+    upserts = []
+    unchanged = 0
+    for item_id, entity in current.items():
+        if not full and published.get(item_id) == entity["_hash"]:
+            unchanged += 1
+        else:
+            upserts.append(entity)
+    deletes = [item_id for item_id in published if item_id not in current]
+    return upserts, deletes, unchanged
+
+
+class MenuSnapshotStore:
+    """
+    Last published content hash per platform, restaurant and item
+    Kept in Postgres so every replica diffs against the same snapshot
+    """
+
+    def __init__(self, session_factory=async_session_maker):
+        self.session_factory = session_factory
+        self._schema_ready = False
+
+    async def _ensure_schema(self):
+        if not self._schema_ready:
+            await ensure_schema(_SCHEMA)
+            self._schema_ready = True
+
+    async def load(self, platform: str, restaurant_id: str) -> Dict[str, str]:
+        await self._ensure_schema()
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                text(
+                    "SELECT item_id, content_hash FROM integration_menu_snapshots "
+                    "WHERE platform = :platform AND restaurant_id = :restaurant_id"
+                ),
+                {"platform": platform, "restaurant_id": restaurant_id}
+            )).fetchall()
+        return {row.item_id: row.content_hash for row in rows}
+
+    async def save(self, platform: str, restaurant_id: str, hashes: Dict[str, str], deleted: List[str] = ()):
+        await self._ensure_schema()
+        now = time.time()
+        async with self.session_factory() as db:
+            if hashes:
+                await db.execute(
+                    text(
+                        "INSERT INTO integration_menu_snapshots "
+                        "(platform, restaurant_id, item_id, content_hash, published_at) "
+                        "VALUES (:platform, :restaurant_id, :item_id, :content_hash, :now) "
+                        "ON CONFLICT (platform, restaurant_id, item_id) DO UPDATE SET "
+                        "content_hash = EXCLUDED.content_hash, published_at = EXCLUDED.published_at"
+                    ),
+                    [
+                        {
+                            "platform": platform, "restaurant_id": restaurant_id,
+                            "item_id": item_id, "content_hash": h, "now": now
+                        }
+                        for item_id, h in hashes.items()
+                    ]
+                )
+            if deleted:
+                await db.execute(
+                    text(
+                        "DELETE FROM integration_menu_snapshots "
+                        "WHERE platform = :platform AND restaurant_id = :restaurant_id "
+                        "AND item_id = ANY(:item_ids)"
+                    ),
+                    {"platform": platform, "restaurant_id": restaurant_id, "item_ids": list(deleted)}
+                )
+            await db.commit()
+
+
+class MenuSyncService:
+    """Pushes menu changes to a delivery platform"""
+
+    def __init__(self, store: MenuSnapshotStore, batch_size: int = MENU_SYNC_BATCH_SIZE):
+        self.store = store
+        self.batch_size = batch_size
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    async def sync(
+        self,
+        client: DeliveryPlatformClient,
+        restaurant_id: str,
+        store_id: Optional[str] = None,
+        dry_run: bool = False,
+        full: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Sync one restaurant's menu to one platform store
+
+        dry_run only reports the diff; full ignores the snapshot and
+        re-sends every item (e.g. after the platform menu was edited by hand).
+        """
+        store_id = store_id or restaurant_id
+        lock = self._locks.setdefault((client.platform, restaurant_id), asyncio.Lock())
+
+        async with lock:
+            start = time.perf_counter()
+            items = await fetch_menu_items(restaurant_id)
+
+            current = {}
+            for item in items:
+                entity = platform_menu_entity(item)
+                entity["_hash"] = content_hash(entity)
+                current[entity["id"]] = entity
+
+            published = await self.store.load(client.platform, restaurant_id)
+            upserts, deletes, unchanged = diff_menu(current, published, full)
+
+            result = {
+                "platform": client.platform,
+                "restaurant_id": restaurant_id,
+                "store_id": store_id,
+                "total_items": len(current),
+                "upserted": len(upserts),
+                "deleted": len(deletes),
+                "unchanged": unchanged,
+                "batches": 0,
+                "dry_run": dry_run
+            }
+            if dry_run:
+                return result
+
+            # Snapshot is saved after every batch, so a failure mid-way
+            # only re-sends the batches that did not go through
+            for i in range(0, len(upserts), self.batch_size):
+                batch = upserts[i:i + self.batch_size]
+                await client.upsert_menu_items(
+                    store_id, [{k: v for k, v in e.items() if k != "_hash"} for e in batch]
+                )
+                await self.store.save(client.platform, restaurant_id, {e["id"]: e["_hash"] for e in batch})
+                result["batches"] += 1
+
+            for i in range(0, len(deletes), self.batch_size):
+                batch = deletes[i:i + self.batch_size]
+                await client.delete_menu_items(store_id, batch)
+                await self.store.save(client.platform, restaurant_id, {}, batch)
+                result["batches"] += 1
+
+            result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            logger.info(
+                f"Menu sync {client.platform}/{restaurant_id}: {len(upserts)} upserted, "
+                f"{len(deletes)} deleted, {unchanged} unchanged in {result['batches']} batches"
+            )
+            return result
+
+
+# Global sync service instance
+menu_sync = MenuSyncService(MenuSnapshotStore())
@@ -0,0 +1,166 @@
+"""
+Outbound client for delivery-platform APIs (menus and order status)
+One pooled HTTP client per platform, rate limited, retrying 429 and 5xx
+"""
+import asyncio
+import httpx
+import math
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+from shared.utils.logger import setup_logger
+from .rate_limit import RateLimiter
+
+logger = setup_logger("platform-client")
+
+UBER_API_BASE_URL = os.getenv("UBER_API_BASE_URL", "https://api.uber.com/v1/eats")
+UBER_ACCESS_TOKEN = os.getenv("UBER_ACCESS_TOKEN", "")
+UBER_RATE_LIMIT_PER_SECOND = float(os.getenv("UBER_RATE_LIMIT_PER_SECOND", "5"))
+UBER_RATE_LIMIT_BURST = int(os.getenv("UBER_RATE_LIMIT_BURST", "5"))
+
+PLATFORM_MAX_ATTEMPTS = int(os.getenv("PLATFORM_MAX_ATTEMPTS", "4"))
+PLATFORM_TIMEOUT_SECONDS = float(os.getenv("PLATFORM_TIMEOUT_SECONDS", "10"))
+
+# Pause after a 429 without a usable Retry-After, and the longest honoured
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+MAX_RETRY_AFTER_SECONDS = 60.0
+
+
+class PlatformAPIError(Exception):
+    """A platform request failed after all retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """
+    Seconds to wait from a Retry-After header
+    The header is either delay-seconds or an HTTP date; anything else gets the default
+    """
+    if not value:
+        return DEFAULT_RETRY_AFTER_SECONDS
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return DEFAULT_RETRY_AFTER_SECONDS
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    if math.isnan(seconds):
+        return DEFAULT_RETRY_AFTER_SECONDS
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+class DeliveryPlatformClient:
+    """
+    Client for one delivery platform's store API
+
+    Every request waits for a token from the platform's rate limiter.
+    429 responses pause the limiter for Retry-After; 429, 5xx and network
+    errors are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, platform: str, base_url: str, access_token: str, rate: float, burst: int):
+        self.platform = platform
+        self.base_url = base_url.rstrip("/")
+        self.access_token = access_token
+        self.limiter = RateLimiter(rate, burst)
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Metrics
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            headers = {"Authorization": f"Bearer {self.access_token}"} if self.access_token else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=PLATFORM_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, path: str, json: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        last_error = None
+        for attempt in range(1, PLATFORM_MAX_ATTEMPTS + 1):
+            await self.limiter.acquire()
+            self.requests += 1
+            try:
+                response = await self.client.request(method, path, json=json)
+            except httpx.HTTPError as e:
+                last_error = PlatformAPIError(f"{self.platform} {method} {path} failed: {e}")
+            else:
+                if response.status_code < 400:
+                    return response.json() if response.content else {}
+
+                last_error = PlatformAPIError(
+                    f"{self.platform} {method} {path} returned {response.status_code}: {response.text[:200]}",
+                    response.status_code
+                )
+                if response.status_code == 429:
+                    self.rate_limited += 1
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.limiter.pause(retry_after)
+                    logger.warning(f"{self.platform} rate limited, pausing {retry_after}s")
+                elif response.status_code < 500:
+                    # Client errors will not succeed on retry
+                    raise last_error
+
+            if attempt < PLATFORM_MAX_ATTEMPTS:
+                self.retries += 1
+                await asyncio.sleep(min(2 ** (attempt - 1), 10) * random.uniform(0.5, 1.0))
+
+        raise last_error
+
+    async def upsert_menu_items(self, store_id: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create or update a batch of menu items"""
+        return await self.request("PUT", f"/stores/{store_id}/menu/items", {"items": items})
+
+    async def delete_menu_items(self, store_id: str, item_ids: List[str]) -> Dict[str, Any]:
+        """Remove a batch of menu items"""
+        return await self.request("POST", f"/stores/{store_id}/menu/items/delete", {"ids": item_ids})
+
+    async def update_order_statuses(self, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Push the latest fulfilment status of a batch of platform orders"""
+        return await self.request("POST", "/orders/status", {"updates": updates})
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "limiter": self.limiter.get_stats()
+        }
+
+
+# Clients by platform name
+platform_clients: Dict[str, DeliveryPlatformClient] = {
+    "uber_eats": DeliveryPlatformClient(
+        "uber_eats",
+        UBER_API_BASE_URL,
+        UBER_ACCESS_TOKEN,
+        UBER_RATE_LIMIT_PER_SECOND,
+        UBER_RATE_LIMIT_BURST
+    )
+}
+
+
+async def close_platform_clients():
+    for client in platform_clients.values():
+        await client.close()
@@ -0,0 +1,191 @@
+"""
+Long-lived RabbitMQ publisher for the integration service
+One connection per process, a pool of confirm-mode channels and a local
+buffer that absorbs short broker outages
+"""
+import aio_pika
+import asyncio
+import json
+import os
+import random
+from aio_pika.pool import Pool
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("rabbitmq-publisher")
+
+EXCHANGE_NAME = "orders"
+CHANNEL_POOL_SIZE = int(os.getenv("RABBITMQ_CHANNEL_POOL_SIZE", "4"))
+# Seconds to wait for a publisher confirm before buffering the message
+CONFIRM_TIMEOUT = float(os.getenv("RABBITMQ_CONFIRM_TIMEOUT", "2"))
+# Messages kept locally while the broker is unavailable
+PUBLISH_BUFFER_SIZE = int(os.getenv("RABBITMQ_PUBLISH_BUFFER_SIZE", "5000"))
+# Seconds between attempts to flush buffered messages
+FLUSH_INTERVAL = float(os.getenv("RABBITMQ_FLUSH_INTERVAL", "1"))
+
+RECONNECT_BACKOFF_INITIAL = 1.0
+RECONNECT_BACKOFF_MAX = 30.0
+
+
+class RabbitMQPublisher:
+    """
+    Publishes JSON messages to the orders exchange
+
+    The connection is opened once in the application lifespan and channels
+    are borrowed from a small pool, so a publish costs one confirm round
+    trip. While the broker is down, or while older messages are still
+    waiting, messages go to a bounded local buffer that a background task
+    flushes in order once the broker is back.
+    """
+
+    def __init__(self, pool_size: int = CHANNEL_POOL_SIZE, buffer_size: int = PUBLISH_BUFFER_SIZE):
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel_pool: Optional[Pool] = None
+        self.rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq-service")
+        self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
+        self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
+        self.pool_size = pool_size
+
+        self.buffer: deque = deque()
+        self.buffer_size = buffer_size
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.messages_published = 0
+        self.messages_buffered = 0
+        self.messages_dropped = 0
+        self.publish_failures = 0
+
+    @property
+    def is_connected(self) -> bool:
+        return bool(self.connection and not self.connection.is_closed and self.channel_pool)
+
+    async def start(self):
+        """Start the background task that connects and flushes the buffer"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._run())
+            logger.info("RabbitMQ publisher started")
+
+    async def close(self):
+        """Flush what is buffered if possible and release the connection"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+
+        if self.buffer and self.is_connected:
+            await self._flush_buffer()
+        if self.buffer:
+            logger.warning(f"Shutting down with {len(self.buffer)} unpublished messages")
+
+        try:
+            if self.channel_pool:
+                await self.channel_pool.close()
+            if self.connection:
+                await self.connection.close()
+                logger.info("RabbitMQ publisher connection closed")
+        except Exception as e:
+            logger.error(f"Error closing RabbitMQ publisher: {e}")
+
+    async def _connect(self):
+        """Open the connection, create the channel pool and declare the exchange once"""
+        self.connection = await aio_pika.connect_robust(
+            f"amqp://{self.rabbitmq_user}:{self.rabbitmq_password}@{self.rabbitmq_host}/"
+        )
+        self.channel_pool = Pool(self._create_channel, max_size=self.pool_size)
+
+        async with self.channel_pool.acquire() as channel:
+            await channel.declare_exchange(EXCHANGE_NAME, aio_pika.ExchangeType.TOPIC, durable=True)
+
+        logger.info("RabbitMQ publisher connected")
+
+    async def _create_channel(self) -> aio_pika.abc.AbstractChannel:
+        return await self.connection.channel(publisher_confirms=True)
+
+    async def _run(self):
+        """Connect with backoff, then keep flushing the local buffer"""
+        backoff = RECONNECT_BACKOFF_INITIAL
+        while True:
+            try:
+                if not self.is_connected:
+                    await self._connect()
+                    backoff = RECONNECT_BACKOFF_INITIAL
+
+                if self.buffer:
+                    await self._flush_buffer()
+                await asyncio.sleep(FLUSH_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"RabbitMQ publisher error: {e}")
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    async def _send(self, routing_key: str, body: Dict[str, Any]):
+        """Publish one message on a pooled channel and wait for its confirm"""
+        async with self.channel_pool.acquire() as channel:
+            # The exchange was declared at connect time; no round trip here
+            exchange = await channel.get_exchange(EXCHANGE_NAME, ensure=False)
+            await exchange.publish(
+                aio_pika.Message(
+                    body=json.dumps(body, default=str).encode(),
+                    content_type="application/json",
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=routing_key,
+                timeout=CONFIRM_TIMEOUT
+            )
+
+    def _buffer(self, item: Tuple[str, Dict[str, Any]]):
+        if len(self.buffer) >= self.buffer_size:
+            self.buffer.popleft()
+            self.messages_dropped += 1
+            logger.warning("Publish buffer full, dropped oldest message")
+        self.buffer.append(item)
+        self.messages_buffered += 1
+
+    async def _flush_buffer(self):
+        """Publish buffered messages oldest first, stopping at the first failure"""
+        flushed = 0
+        while self.buffer:
+            routing_key, body = self.buffer[0]
+            await self._send(routing_key, body)
+            self.buffer.popleft()
+            self.messages_published += 1
+            flushed += 1
+        if flushed:
+            logger.info(f"Flushed {flushed} buffered messages to RabbitMQ")
+
+    async def publish(self, routing_key: str, body: Dict[str, Any]):
+        """
+        Publish a message, falling back to the local buffer
+
+        Never raises: the caller's work has already been done and the
+        message is delivered once the broker is reachable again.
+        """
+        # Keep ordering: queue behind anything still waiting to be flushed
+        if not self.is_connected or self.buffer:
+            self._buffer((routing_key, body))
+            return
+
+        try:
+            await self._send(routing_key, body)
+            self.messages_published += 1
+        except Exception as e:
+            self.publish_failures += 1
+            logger.warning(f"Publish to {routing_key} failed, buffering: {e}")
+            self._buffer((routing_key, body))
+
+    def get_stats(self) -> dict:
+        return {
+            "connected": self.is_connected,
+            "buffered": len(self.buffer),
+            "messages_published": self.messages_published,
+            "messages_buffered": self.messages_buffered,
+            "messages_dropped": self.messages_dropped,
+            "publish_failures": self.publish_failures
+        }
+
+
+# Global publisher instance
+publisher = RabbitMQPublisher()
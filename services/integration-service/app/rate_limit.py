@@ -0,0 +1,62 @@
+"""
+Token-bucket rate limiting for outbound delivery-platform API calls
+"""
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Async token bucket: `rate` requests per second with bursts up to `burst`
+
+    Callers await acquire() before each request. pause() holds every caller
+    back, e.g. for the Retry-After of a 429 response.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        # Metrics
+        self.acquired = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            start = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+            self.acquired += 1
+            self.waited_seconds += time.monotonic() - start
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for a while and drain the bucket"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated_at = self.paused_until
+
+    def get_stats(self) -> dict:
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "acquired": self.acquired,
+            "waited_seconds": round(self.waited_seconds, 3)
+        }
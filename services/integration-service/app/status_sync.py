@@ -0,0 +1,380 @@
+"""
+Outbound order-status sync to delivery platforms
+Consumes order lifecycle events from RabbitMQ, coalesces rapid transitions
+per order and pushes the latest status of platform orders in batches
+"""
+import aio_pika
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from shared.utils.logger import setup_logger
+from .database import async_session_maker, ensure_schema
+from .platform_client import platform_clients, PlatformAPIError
+
+logger = setup_logger("status-sync")
+
+# Seconds transitions of one order are collected before the latest is pushed
+STATUS_SYNC_COALESCE_SECONDS = float(os.getenv("STATUS_SYNC_COALESCE_SECONDS", "2"))
+STATUS_SYNC_BATCH_SIZE = int(os.getenv("STATUS_SYNC_BATCH_SIZE", "50"))
+# Push attempts (each already retried by the platform client) before giving up
+STATUS_SYNC_MAX_ATTEMPTS = int(os.getenv("STATUS_SYNC_MAX_ATTEMPTS", "5"))
+STATUS_SYNC_PREFETCH = int(os.getenv("STATUS_SYNC_PREFETCH", "500"))
+
+# Queue arguments are fixed at declaration, so single-active-consumer needs a
+# new queue; the old one is deleted once no consumer uses it
+QUEUE_NAME = "integration.order_status_sync.single"
+LEGACY_QUEUE_NAME = "integration.order_status_sync"
+ROUTING_KEYS = ["order.status_changed.*", "order.cancelled.*", "order.receipt_generated.*"]
+
+# Our order statuses as platform fulfilment states; others are not pushed
+PLATFORM_STATUSES = {
+    "confirmed": "accepted",
+    "preparing": "preparing",
+    "ready": "ready_for_pickup",
+    "served": "handed_off",
+    "completed": "completed",
+    "cancelled": "cancelled",
+}
+
+# Fulfilment progress; a status never replaces one at the same or a later
+# stage (completed and cancelled are both final)
+PLATFORM_STATUS_RANK = {
+    "accepted": 1,
+    "preparing": 2,
+    "ready_for_pickup": 3,
+    "handed_off": 4,
+    "completed": 5,
+    "cancelled": 5,
+}
+
+
+def advances(status: str, previous: Optional[str]) -> bool:
+    """Whether status moves an order forward from previous"""
+    return previous is None or PLATFORM_STATUS_RANK[status] > PLATFORM_STATUS_RANK.get(previous, 0)
+
+
+RESTART_BACKOFF_INITIAL = 1.0
+RESTART_BACKOFF_MAX = 60.0
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS integration_platform_orders (
+        order_id TEXT PRIMARY KEY,
+        platform TEXT NOT NULL,
+        platform_order_id TEXT NOT NULL,
+        store_id TEXT,
+        last_synced_status TEXT,
+        created_at DOUBLE PRECISION NOT NULL,
+        updated_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+]
+
+
+class PlatformOrderStore:
+    """
+    Links our order ids to platform order ids
+    Kept in Postgres: status events are consumed by whichever replica is the
+    queue's active consumer, not necessarily the one that created the order
+    """
+
+    def __init__(self, session_factory=async_session_maker):
+        self.session_factory = session_factory
+
+    async def open(self):
+        await ensure_schema(_SCHEMA)
+
+    async def link(self, order_id: str, platform: str, platform_order_id: str, store_id: Optional[str] = None):
+        now = time.time()
+        async with self.session_factory() as db:
+            await db.execute(
+                text(
+                    "INSERT INTO integration_platform_orders "
+                    "(order_id, platform, platform_order_id, store_id, created_at, updated_at) "
+                    "VALUES (:order_id, :platform, :platform_order_id, :store_id, :now, :now) "
+                    "ON CONFLICT (order_id) DO UPDATE SET platform = EXCLUDED.platform, "
+                    "platform_order_id = EXCLUDED.platform_order_id, store_id = EXCLUDED.store_id, "
+                    "updated_at = EXCLUDED.updated_at"
+                ),
+                {
+                    "order_id": order_id, "platform": platform, "platform_order_id": platform_order_id,
+                    "store_id": store_id, "now": now
+                }
+            )
+            await db.commit()
+
+    async def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                text("SELECT * FROM integration_platform_orders WHERE order_id = :order_id"),
+                {"order_id": order_id}
+            )).mappings().first()
+        return dict(row) if row else None
+
+    async def mark_synced(self, order_ids: List[str], statuses: List[str]):
+        now = time.time()
+        async with self.session_factory() as db:
+            await db.execute(
+                text(
+                    "UPDATE integration_platform_orders SET last_synced_status = :status, updated_at = :now "
+                    "WHERE order_id = :order_id"
+                ),
+                [
+                    {"status": status, "now": now, "order_id": order_id}
+                    for order_id, status in zip(order_ids, statuses)
+                ]
+            )
+            await db.commit()
+
+
+class PendingStatus:
+    """Latest unsynced status of one platform order and the messages it covers"""
+
+    def __init__(self, link: Dict[str, Any]):
+        self.link = link
+        self.status: Optional[str] = None
+        self.messages: List[aio_pika.IncomingMessage] = []
+        self.due_at = time.monotonic() + STATUS_SYNC_COALESCE_SECONDS
+        self.attempts = 0
+
+
+class OrderStatusSync:
+    """
+    Pushes status changes of platform orders back to the platform
+
+    Events are held per order for STATUS_SYNC_COALESCE_SECONDS; a burst
+    such as confirmed -> preparing -> ready becomes one push of "ready".
+    Messages are acked only after the push succeeds (or is given up), so
+    a restart re-delivers anything not yet synced. The queue has a single
+    active consumer across replicas, so all events of an order are seen by
+    one replica, and a status behind the last one synced (a redelivery or
+    a late event) is never pushed.
+    """
+
+    def __init__(self, store: PlatformOrderStore):
+        self.store = store
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self.rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq-service")
+        self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
+        self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
+
+        self.pending: Dict[str, PendingStatus] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.events_ignored = 0
+        self.stale_statuses = 0
+        self.statuses_pushed = 0
+        self.push_failures = 0
+        self.statuses_dropped = 0
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        try:
+            if self.connection:
+                await self.connection.close()
+        except Exception as e:
+            logger.error(f"Error closing status sync connection: {e}")
+
+    async def _run(self):
+        """Consume and flush, restarting with backoff on failure"""
+        backoff = RESTART_BACKOFF_INITIAL
+        while True:
+            started = time.monotonic()
+            try:
+                await self._consume()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Order status sync stopped: {e}")
+            # Unacked messages are redelivered on the new channel
+            self.pending.clear()
+            if time.monotonic() - started > RESTART_BACKOFF_MAX:
+                backoff = RESTART_BACKOFF_INITIAL
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def _consume(self):
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+        self.connection = await aio_pika.connect_robust(
+            f"amqp://{self.rabbitmq_user}:{self.rabbitmq_password}@{self.rabbitmq_host}/"
+        )
+        self.channel = await self.connection.channel()
+        await self.channel.set_qos(prefetch_count=STATUS_SYNC_PREFETCH)
+
+        exchange = await self.channel.declare_exchange("orders", aio_pika.ExchangeType.TOPIC, durable=True)
+        # Shared durable queue; the broker delivers to one replica at a time
+        # and fails over to another when it disconnects
+        queue = await self.channel.declare_queue(
+            QUEUE_NAME, durable=True, arguments={"x-single-active-consumer": True}
+        )
+        for routing_key in ROUTING_KEYS:
+            await queue.bind(exchange, routing_key=routing_key)
+        await self._delete_legacy_queue()
+
+        await queue.consume(self._on_message)
+        logger.info("Order status sync consuming order events")
+
+        while not self.connection.is_closed:
+            await asyncio.sleep(STATUS_SYNC_COALESCE_SECONDS / 4)
+            await self._flush_due()
+
+    async def _delete_legacy_queue(self):
+        """Remove the old competing-consumer queue once replicas stopped using it"""
+        # A failed delete closes its channel, so use a throwaway one
+        try:
+            channel = await self.connection.channel()
+            try:
+                await channel.queue_delete(LEGACY_QUEUE_NAME, if_unused=True)
+                logger.info(f"Deleted legacy queue {LEGACY_QUEUE_NAME}")
+            finally:
+                if not channel.is_closed:
+                    await channel.close()
+        except Exception as e:
+            logger.debug(f"Legacy queue {LEGACY_QUEUE_NAME} not deleted: {e}")
+
+    async def _on_message(self, message: aio_pika.IncomingMessage):
+        self.events_received += 1
+        try:
+            event = json.loads(message.body.decode())
+            order_id = event.get("order_id")
+            platform_status = PLATFORM_STATUSES.get(event.get("status"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            logger.error("Invalid JSON in order event")
+            await message.ack()
+            return
+
+        entry = self.pending.get(order_id) if order_id else None
+        if entry is None:
+            try:
+                link = await self.store.get(order_id) if order_id and platform_status else None
+            except Exception as e:
+                # Redelivered (to any replica) once the database answers again
+                logger.error(f"Platform order lookup failed for {order_id}: {e}")
+                await asyncio.sleep(1)
+                await message.nack(requeue=True)
+                return
+            if link is None or link["platform"] not in platform_clients:
+                # Not a platform order, or a status platforms do not track
+                self.events_ignored += 1
+                await message.ack()
+                return
+            # Another event for this order may have arrived during the lookup
+            entry = self.pending.get(order_id)
+            if entry is None:
+                entry = self.pending[order_id] = PendingStatus(link)
+        if entry.status is not None:
+            self.events_coalesced += 1
+
+        # Redeliveries can arrive after newer events; keep the furthest status
+        if platform_status and (entry.status is None or advances(platform_status, entry.status)):
+            entry.status = platform_status
+        entry.messages.append(message)
+
+    async def _flush_due(self):
+        now = time.monotonic()
+        due = [(order_id, entry) for order_id, entry in self.pending.items() if entry.due_at <= now]
+        if not due:
+            return
+
+        by_platform: Dict[str, List[tuple]] = {}
+        for order_id, entry in due:
+            del self.pending[order_id]
+            if entry.status is None:
+                await self._ack(entry)
+                continue
+            if not advances(entry.status, entry.link.get("last_synced_status")):
+                # Already synced, or behind the status the platform has
+                if entry.status != entry.link.get("last_synced_status"):
+                    self.stale_statuses += 1
+                    logger.info(
+                        f"Not syncing {entry.status} for order {order_id}: "
+                        f"{entry.link.get('last_synced_status')} already synced"
+                    )
+                await self._ack(entry)
+                continue
+            by_platform.setdefault(entry.link["platform"], []).append((order_id, entry))
+
+        for platform, entries in by_platform.items():
+            client = platform_clients[platform]
+            for i in range(0, len(entries), STATUS_SYNC_BATCH_SIZE):
+                await self._push_batch(client, entries[i:i + STATUS_SYNC_BATCH_SIZE])
+
+    async def _push_batch(self, client, entries: List[tuple]):
+        updates = [
+            {
+                "order_id": entry.link["platform_order_id"],
+                "store_id": entry.link.get("store_id"),
+                "status": entry.status
+            }
+            for _, entry in entries
+        ]
+        try:
+            await client.update_order_statuses(updates)
+        except PlatformAPIError as e:
+            self.push_failures += 1
+            logger.warning(f"Status push to {client.platform} failed for {len(entries)} orders: {e}")
+            for order_id, entry in entries:
+                await self._retry_later(order_id, entry)
+            return
+
+        await self.store.mark_synced([o for o, _ in entries], [e.status for _, e in entries])
+        self.statuses_pushed += len(entries)
+        for _, entry in entries:
+            await self._ack(entry)
+
+    async def _retry_later(self, order_id: str, entry: PendingStatus):
+        entry.attempts += 1
+        if entry.attempts >= STATUS_SYNC_MAX_ATTEMPTS:
+            self.statuses_dropped += 1
+            logger.error(f"Giving up syncing status {entry.status} for order {order_id}")
+            await self._ack(entry)
+            return
+
+        newer = self.pending.get(order_id)
+        if newer is not None:
+            # A newer transition arrived meanwhile; it supersedes this one
+            newer.messages.extend(entry.messages)
+            return
+        entry.due_at = time.monotonic() + min(2 ** entry.attempts, 60) * random.uniform(0.5, 1.0)
+        self.pending[order_id] = entry
+
+    async def _ack(self, entry: PendingStatus):
+        for message in entry.messages:
+            try:
+                await message.ack()
+            except Exception as e:
+                logger.warning(f"Failed to ack order event: {e}")
+        entry.messages = []
+
+    def get_stats(self) -> dict:
+        return {
+            "connected": bool(self.connection and not self.connection.is_closed),
+            "pending_orders": len(self.pending),
+            "events_received": self.events_received,
+            "events_coalesced": self.events_coalesced,
+            "events_ignored": self.events_ignored,
+            "stale_statuses": self.stale_statuses,
+            "statuses_pushed": self.statuses_pushed,
+            "push_failures": self.push_failures,
+            "statuses_dropped": self.statuses_dropped
+        }
+
+
+# Global instances
+platform_orders = PlatformOrderStore()
+status_sync = OrderStatusSync(platform_orders)
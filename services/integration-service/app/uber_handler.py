@@ -4,9 +4,13 @@ Processes Uber Eats webhook events and creates orders in the database
 """
 import httpx
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
 from shared.utils.logger import setup_logger
+from .rabbitmq_publisher import publisher
+from .menu_matcher import menu_matcher
+from .status_sync import platform_orders
+from .webhook_queue import WebhookJob
 
 logger = setup_logger("uber-handler")
 
@@ -15,12 +19,17 @@ ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://order-service:8004")
 RESTAURANT_ID = os.getenv("DEFAULT_RESTAURANT_ID", "6956017d-3aea-4ae2-9709-0ca0ac0a1a09")
 
 
-async def process_uber_order(payload: Dict[str, Any]) -> Dict[str, Any]:
+async def process_uber_order(payload: Dict[str, Any], job: Optional[WebhookJob] = None) -> Dict[str, Any]:
     """
     Process Uber Eats new order webhook
 
+    Safe to retry: the order is created with the Uber order id as
+    idempotency key, and each step is checkpointed on the job so a retry
+    resumes after the last one that succeeded.
+
     Args:
         payload: Webhook payload from Uber Eats
+        job: Queue job carrying progress from earlier attempts
 
     Returns:
         Created order details
@@ -29,65 +38,105 @@ async def process_uber_order(payload: Dict[str, Any]) -> Dict[str, Any]:
         # Extract order data from Uber payload
         # Note: Uber Eats webhook format may vary, adjust as needed
         uber_order = payload.get("order", {}) or payload.get("data", {})
+        progress = job.progress if job else {}
 
         logger.info(f"Processing Uber order: {uber_order.get('id', 'unknown')}")
 
-        # Map Uber Eats order to our order format
-        order_data = {
-            "restaurant_id": RESTAURANT_ID,
-            "table_id": None,  # Uber orders don't have table_id
-            "order_type": "UBER",
-            "customer_name": uber_order.get("eater", {}).get("first_name", "Uber Customer") + " " +
-                           uber_order.get("eater", {}).get("last_name", ""),
-            "customer_phone": uber_order.get("eater", {}).get("phone", ""),
-            "customer_email": uber_order.get("eater", {}).get("email", ""),
-            "delivery_address": format_delivery_address(uber_order.get("delivery", {})),
-            "special_instructions": uber_order.get("special_instructions", ""),
-            "items": []
-        }
-
-        # Process order items
-        cart = uber_order.get("cart", {})
-        items = cart.get("items", [])
-
-        for uber_item in items:
-            # Try to match Uber item with our menu items by name
-            item_data = {
-                "menu_item_id": await find_menu_item_id(uber_item.get("title", "")),
-                "quantity": uber_item.get("quantity", 1),
-                "special_requests": uber_item.get("special_instructions", "")
-            }
-
-            if item_data["menu_item_id"]:
-                order_data["items"].append(item_data)
-            else:
-                logger.warning(f"Could not match Uber item: {uber_item.get('title')}")
-
-        # Create order via order service API
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{ORDER_SERVICE_URL}/api/v1/orders",
-                json=order_data,
-                timeout=10.0
+        created_order = progress.get("order")
+        if created_order is None:
+            created_order = await create_platform_order(uber_order)
+            if job:
+                await job.checkpoint(order=created_order)
+        else:
+            logger.info(f"Order {created_order.get('order_number')} already created by an earlier attempt")
+
+        # Remember the Uber order id so status changes can be pushed back (an upsert)
+        if uber_order.get("id"):
+            await platform_orders.link(
+                str(created_order.get("id")),
+                "uber_eats",
+                uber_order["id"],
+                (uber_order.get("store") or {}).get("id")
             )
 
-            if response.status_code == 201:
-                created_order = response.json()
-                logger.info(f"Successfully created order {created_order.get('order_number')}")
+        # Publish notification event
+        if not progress.get("notified"):
+            await publish_order_notification(created_order, uber_order.get("id"))
+            if job:
+                await job.checkpoint(notified=True)
 
-                # Publish notification event
-                await publish_order_notification(created_order)
-
-                return created_order
-            else:
-                logger.error(f"Failed to create order: {response.status_code} - {response.text}")
-                raise Exception(f"Order creation failed: {response.text}")
+        return created_order
 
     except Exception as e:
         logger.error(f"Error processing Uber order: {str(e)}")
         raise
 
 
+async def create_platform_order(uber_order: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create the order in order-service
+    A repeated call for the same Uber order returns the existing order
+    """
+    # Map Uber Eats order to our order format
+    order_data = {
+        "restaurant_id": RESTAURANT_ID,
+        "table_id": None,  # Uber orders don't have table_id
+        "order_type": "UBER",
+        "customer_name": uber_order.get("eater", {}).get("first_name", "Uber Customer") + " " +
+                       uber_order.get("eater", {}).get("last_name", ""),
+        "customer_phone": uber_order.get("eater", {}).get("phone", ""),
+        "customer_email": uber_order.get("eater", {}).get("email", ""),
+        "delivery_address": format_delivery_address(uber_order.get("delivery", {})),
+        "special_instructions": uber_order.get("special_instructions", ""),
+        "items": []
+    }
+
+    # Process order items
+    cart = uber_order.get("cart", {})
+    items = cart.get("items", [])
+
+    # Match the whole cart against the restaurant's menu index in one pass
+    matches = await menu_matcher.match_cart(RESTAURANT_ID, [i.get("title", "") for i in items])
+
+    # An order missing items the customer paid for must not be created; the
+    # job is retried against a fresh menu index, then dead-lettered for review
+    unmatched = [uber_item.get("title") for uber_item, match in zip(items, matches) if not match]
+    if unmatched:
+        menu_matcher.invalidate(RESTAURANT_ID)
+        raise Exception(f"Uber cart items not on the menu: {', '.join(map(str, unmatched))}")
+
+    for uber_item, match in zip(items, matches):
+        if match.method == "fuzzy":
+            logger.info(f"Matched Uber item '{uber_item.get('title')}' to '{match.name}' (score {match.score})")
+
+        order_data["items"].append({
+            "menu_item_id": match.menu_item_id,
+            "quantity": uber_item.get("quantity", 1),
+            "special_requests": uber_item.get("special_instructions", "")
+        })
+
+    # Create order via order service API; retries reuse the key
+    headers = {"Idempotency-Key": f"uber_eats:{uber_order['id']}"} if uber_order.get("id") else {}
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{ORDER_SERVICE_URL}/api/v1/orders",
+            json=order_data,
+            headers=headers,
+            timeout=10.0
+        )
+
+    if response.status_code in (200, 201):
+        created_order = response.json()
+        if response.status_code == 200:
+            logger.info(f"Order {created_order.get('order_number')} already existed for this Uber order")
+        else:
+            logger.info(f"Successfully created order {created_order.get('order_number')}")
+        return created_order
+
+    logger.error(f"Failed to create order: {response.status_code} - {response.text}")
+    raise Exception(f"Order creation failed: {response.text}")
+
+
 def format_delivery_address(delivery_data: Dict[str, Any]) -> str:
     """Format Uber delivery address into a single string"""
     if not delivery_data:
@@ -105,81 +154,29 @@ def format_delivery_address(delivery_data: Dict[str, Any]) -> str:
     return ", ".join([p for p in parts if p])
 
 
-async def find_menu_item_id(item_name: str) -> str:
+async def publish_order_notification(order: Dict[str, Any], uber_order_id: Optional[str] = None):
     """
-    Find menu item ID by name
-    For now, returns a default menu item ID
-    TODO: Implement proper menu item matching logic
+    Publish platform notification to RabbitMQ
+    order-service already publishes order.created for every order it stores,
+    so this only adds which platform the order came from
     """
-    # Hardcoded menu item mapping for testing
-    # In production, you should query the restaurant service to match items
-    menu_mapping = {
-        "biriyani": "aaf9ad8c-ee6a-4bb6-84f9-4f0f7cf3f11e",
-        "biryani": "aaf9ad8c-ee6a-4bb6-84f9-4f0f7cf3f11e",
-        "salad": "18386a1a-89a8-497d-b90b-02d0cf33b48a",
-        "pizza": "aaf9ad8c-ee6a-4bb6-84f9-4f0f7cf3f11e",  # Default to biriyani for testing
+    notification = {
+        "event": "order.platform_accepted",
+        "platform": "uber_eats",
+        "platform_order_id": uber_order_id,
+        "order_id": order.get("id"),
+        "order_number": order.get("order_number"),
+        "restaurant_id": order.get("restaurant_id"),
+        "order_type": order.get("order_type"),
+        "customer_name": order.get("customer_name"),
+        "total": order.get("total"),
+        "created_at": order.get("created_at"),
+        "timestamp": datetime.utcnow().isoformat()
     }
 
-    item_key = item_name.lower().strip()
-    return menu_mapping.get(item_key, menu_mapping["biriyani"])  # Default fallback
-
-
-async def publish_order_notification(order: Dict[str, Any]):
-    """
-    Publish order notification to RabbitMQ
-    This will be consumed by the order service WebSocket handler
-    """
-    try:
-        import aio_pika
-        import json
-
-        RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq-service")
-        RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
-        RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "guest")
-
-        # Connect to RabbitMQ
-        connection = await aio_pika.connect_robust(
-            f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASSWORD}@{RABBITMQ_HOST}/"
-        )
-
-        async with connection:
-            channel = await connection.channel()
-
-            # Declare exchange
-            exchange = await channel.declare_exchange(
-                "orders",
-                aio_pika.ExchangeType.TOPIC,
-                durable=True
-            )
-
-            # Prepare notification message
-            notification = {
-                "event": "order.created",
-                "order_id": order.get("id"),
-                "order_number": order.get("order_number"),
-                "restaurant_id": order.get("restaurant_id"),
-                "order_type": order.get("order_type"),
-                "customer_name": order.get("customer_name"),
-                "total": order.get("total"),
-                "created_at": order.get("created_at"),
-                "timestamp": datetime.utcnow().isoformat()
-            }
-
-            # Publish message
-            await exchange.publish(
-                aio_pika.Message(
-                    body=json.dumps(notification).encode(),
-                    content_type="application/json",
-                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
-                ),
-                routing_key=f"order.created.{order.get('restaurant_id')}"
-            )
-
-            logger.info(f"Published order notification for {order.get('order_number')}")
-
-    except Exception as e:
-        logger.error(f"Failed to publish notification: {str(e)}")
-        # Don't raise - order was created successfully, notification is secondary
+    # Buffered locally if the broker is unavailable; never raises
+    await publisher.publish(f"order.platform_accepted.{order.get('restaurant_id')}", notification)
+    logger.info(f"Published order notification for {order.get('order_number')}")
 
 
 async def handle_order_cancel(payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -212,3 +209,30 @@ async def handle_status_update(payload: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Error handling status update: {str(e)}")
         raise
+
+
+async def process_uber_event(payload: Dict[str, Any], job: Optional[WebhookJob] = None) -> Dict[str, Any]:
+    """
+    Process one queued Uber Eats webhook event
+    Raises on failure so the worker pool can retry it
+    """
+    event_type = payload.get("event_type", "unknown")
+    logger.info(f"Processing Uber Eats event: {event_type}")
+
+    if event_type == "orders.notification":
+        order = await process_uber_order(payload, job)
+        return {
+            "message": "Order created successfully",
+            "order_number": order.get("order_number"),
+            "order_id": order.get("id")
+        }
+
+    elif event_type == "orders.cancel":
+        result = await handle_order_cancel(payload)
+        return {"message": "Order cancelled", "data": result}
+
+    elif event_type == "orders.status_update":
+        result = await handle_status_update(payload)
+        return {"message": "Status updated", "data": result}
+
+    return {"message": "Webhook processed"}
@@ -0,0 +1,360 @@
+"""
+Durable work queue for delivery-platform webhooks
+Webhooks are stored in the shared Postgres database and acknowledged right
+away; workers on every replica claim them with SELECT ... FOR UPDATE SKIP
+LOCKED and process them with retries and dead-lettering
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import text
+from shared.utils.logger import setup_logger
+from .database import async_session_maker, ensure_schema
+
+logger = setup_logger("webhook-queue")
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+# Attempts before an event is dead-lettered
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "2"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "300"))
+# Seconds an idle worker waits before checking for due retries
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+# Seconds a claimed event stays with its worker; after that (the replica
+# died mid-event) any worker may claim it again
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "300"))
+
+# Event statuses
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+DEAD = "dead"
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS integration_webhook_events (
+        id TEXT PRIMARY KEY,
+        platform TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        dedup_key TEXT,
+        progress TEXT,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at DOUBLE PRECISION NOT NULL,
+        claimed_by TEXT,
+        last_error TEXT,
+        result TEXT,
+        created_at DOUBLE PRECISION NOT NULL,
+        updated_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+    # Columns added after the table was first created
+    "ALTER TABLE integration_webhook_events ADD COLUMN IF NOT EXISTS dedup_key TEXT",
+    "ALTER TABLE integration_webhook_events ADD COLUMN IF NOT EXISTS progress TEXT",
+    # Only claimable events are indexed; done events accumulate
+    """
+    CREATE INDEX IF NOT EXISTS ix_integration_webhook_events_due
+        ON integration_webhook_events (next_attempt_at)
+        WHERE status IN ('pending', 'processing')
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_integration_webhook_events_dead
+        ON integration_webhook_events (updated_at)
+        WHERE status = 'dead'
+    """,
+]
+
+# A processing event's next_attempt_at is the end of its lease. Statuses
+# are literals so the partial index matches even in a generic plan.
+CLAIM_SQL = f"""
+    UPDATE integration_webhook_events
+    SET status = '{PROCESSING}', attempts = attempts + 1, claimed_by = :token,
+        next_attempt_at = :lease_until, updated_at = :now
+    WHERE id = (
+        SELECT id FROM integration_webhook_events
+        WHERE status IN ('{PENDING}', '{PROCESSING}') AND next_attempt_at <= :now
+        ORDER BY next_attempt_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, platform, event_type, payload, dedup_key, progress, status, attempts, claimed_by
+"""
+
+
+class WebhookQueue:
+    """
+    Postgres-backed queue of raw webhook events, shared by all replicas
+
+    A claimed event carries a lease and the claiming worker's token; complete
+    and fail only apply while the worker still holds it, so an event
+    reclaimed after an expired lease is never finished twice.
+    """
+
+    def __init__(self, session_factory=async_session_maker):
+        self.session_factory = session_factory
+        # Wakes local workers on enqueue; other replicas find it on their next poll
+        self.available = asyncio.Event()
+
+    async def open(self):
+        await ensure_schema(_SCHEMA)
+        self.available.set()
+        logger.info("Webhook queue ready")
+
+    async def close(self):
+        pass
+
+    async def _execute(self, sql: str, params: Dict[str, Any] = None, commit: bool = False):
+        async with self.session_factory() as db:
+            result = await db.execute(text(sql), params or {})
+            rows = result.mappings().all() if result.returns_rows else result.rowcount
+            if commit:
+                await db.commit()
+            return rows
+
+    async def enqueue(
+        self,
+        platform: str,
+        event_type: str,
+        payload: str,
+        event_id: Optional[str] = None,
+        dedup_key: Optional[str] = None
+    ) -> str:
+        """Persist a raw event and wake a worker; returns the event id"""
+        event_id = event_id or uuid.uuid4().hex
+        now = time.time()
+        await self._execute(
+            "INSERT INTO integration_webhook_events "
+            "(id, platform, event_type, payload, dedup_key, status, attempts, next_attempt_at, created_at, updated_at) "
+            "VALUES (:id, :platform, :event_type, :payload, :dedup_key, :status, 0, :now, :now, :now)",
+            {
+                "id": event_id, "platform": platform, "event_type": event_type, "payload": payload,
+                "dedup_key": dedup_key, "status": PENDING, "now": now
+            },
+            commit=True
+        )
+        self.available.set()
+        return event_id
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the next due event (or one whose lease expired), marking it as processing"""
+        now = time.time()
+        rows = await self._execute(
+            CLAIM_SQL,
+            {"token": uuid.uuid4().hex, "lease_until": now + WEBHOOK_LEASE_SECONDS, "now": now},
+            commit=True
+        )
+        return dict(rows[0]) if rows else None
+
+    async def save_progress(self, event: Dict[str, Any], progress: Dict[str, Any]) -> bool:
+        """Checkpoint steps already done, kept across retries; False if the lease was lost"""
+        updated = await self._execute(
+            "UPDATE integration_webhook_events SET progress = :progress, updated_at = :now "
+            "WHERE id = :id AND claimed_by = :token",
+            {
+                "progress": json.dumps(progress, default=str), "now": time.time(),
+                "id": event["id"], "token": event["claimed_by"]
+            },
+            commit=True
+        )
+        return updated > 0
+
+    async def complete(self, event: Dict[str, Any], result: Any) -> bool:
+        """Record the outcome; False if the lease was lost to another worker"""
+        updated = await self._execute(
+            "UPDATE integration_webhook_events "
+            "SET status = :status, result = :result, last_error = NULL, claimed_by = NULL, updated_at = :now "
+            "WHERE id = :id AND claimed_by = :token",
+            {
+                "status": DONE, "result": json.dumps(result, default=str), "now": time.time(),
+                "id": event["id"], "token": event["claimed_by"]
+            },
+            commit=True
+        )
+        return updated > 0
+
+    async def fail(self, event: Dict[str, Any], error: str) -> Optional[str]:
+        """
+        Schedule a retry with backoff, or dead-letter after the last attempt
+        Returns the new status, or None if the lease was lost to another worker
+        """
+        now = time.time()
+        attempts = event["attempts"]
+        if attempts >= WEBHOOK_MAX_ATTEMPTS:
+            new_status, next_attempt_at = DEAD, now
+        else:
+            delay = min(WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), WEBHOOK_RETRY_MAX_SECONDS)
+            new_status, next_attempt_at = PENDING, now + delay * random.uniform(0.8, 1.2)
+
+        updated = await self._execute(
+            "UPDATE integration_webhook_events "
+            "SET status = :status, next_attempt_at = :next_attempt_at, last_error = :error, "
+            "claimed_by = NULL, updated_at = :now "
+            "WHERE id = :id AND claimed_by = :token",
+            {
+                "status": new_status, "next_attempt_at": next_attempt_at, "error": error[:2000],
+                "now": now, "id": event["id"], "token": event["claimed_by"]
+            },
+            commit=True
+        )
+        return new_status if updated else None
+
+    async def get(self, event_id: str) -> Optional[Dict[str, Any]]:
+        """Status record for one event (without the raw payload)"""
+        rows = await self._execute(
+            "SELECT id, platform, event_type, status, attempts, next_attempt_at, last_error, result, "
+            "created_at, updated_at FROM integration_webhook_events WHERE id = :id",
+            {"id": event_id}
+        )
+        if not rows:
+            return None
+        event = dict(rows[0])
+        event["result"] = json.loads(event["result"]) if event["result"] else None
+        return event
+
+    async def list_dead(self, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = await self._execute(
+            "SELECT id, platform, event_type, attempts, last_error, created_at, updated_at "
+            "FROM integration_webhook_events WHERE status = :status ORDER BY updated_at DESC LIMIT :limit",
+            {"status": DEAD, "limit": limit}
+        )
+        return [dict(row) for row in rows]
+
+    async def retry(self, event_id: str) -> bool:
+        """Move a dead-lettered event back to pending with a fresh attempt count"""
+        now = time.time()
+        retried = await self._execute(
+            "UPDATE integration_webhook_events "
+            "SET status = :pending, attempts = 0, next_attempt_at = :now, updated_at = :now "
+            "WHERE id = :id AND status = :dead",
+            {"pending": PENDING, "now": now, "id": event_id, "dead": DEAD},
+            commit=True
+        ) > 0
+        if retried:
+            self.available.set()
+        return retried
+
+    async def counts(self) -> Dict[str, int]:
+        rows = await self._execute(
+            "SELECT status, COUNT(*) AS count FROM integration_webhook_events GROUP BY status"
+        )
+        return {row["status"]: row["count"] for row in rows}
+
+
+class WebhookJob:
+    """
+    One attempt at a queued event, as seen by its handler
+
+    progress holds what earlier attempts checkpointed, so a retry can skip
+    side effects that already happened (e.g. the order was created).
+    """
+
+    def __init__(self, queue: WebhookQueue, event: Dict[str, Any]):
+        self.queue = queue
+        self.event = event
+        self.progress: Dict[str, Any] = json.loads(event.get("progress") or "{}")
+
+    async def checkpoint(self, **values):
+        """Persist values into progress before the next side effect"""
+        self.progress.update(values)
+        if not await self.queue.save_progress(self.event, self.progress):
+            raise RuntimeError(f"Lost the claim on webhook event {self.event['id']}")
+
+
+class WebhookWorkerPool:
+    """Processes queued webhook events with a fixed number of workers"""
+
+    def __init__(
+        self,
+        queue: WebhookQueue,
+        handler: Callable[[Dict[str, Any], WebhookJob], Awaitable[Any]],
+        workers: int = WEBHOOK_WORKERS,
+        on_done: Optional[Callable[[Dict[str, Any], Any], Awaitable[None]]] = None,
+        on_dead: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        # Hooks called after an event completes or is dead-lettered
+        self.on_done = on_done
+        self.on_dead = on_dead
+        self._tasks: List[asyncio.Task] = []
+
+        # Metrics
+        self.events_processed = 0
+        self.events_retried = 0
+        self.events_dead_lettered = 0
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} webhook workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _wait_for_work(self):
+        try:
+            async with asyncio.timeout(WEBHOOK_POLL_INTERVAL):
+                await self.queue.available.wait()
+        except TimeoutError:
+            pass
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                event = await self.queue.claim()
+                if event is None:
+                    self.queue.available.clear()
+                    await self._wait_for_work()
+                    continue
+
+                await self._process(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook worker {worker_id} error: {e}")
+                await asyncio.sleep(WEBHOOK_POLL_INTERVAL)
+
+    async def _process(self, event: Dict[str, Any]):
+        try:
+            payload = json.loads(event["payload"])
+            result = await self.handler(payload, WebhookJob(self.queue, event))
+        except Exception as e:
+            new_status = await self.queue.fail(event, str(e))
+            if new_status is None:
+                logger.warning(f"Webhook event {event['id']} lease expired; another worker has it")
+            elif new_status == DEAD:
+                self.events_dead_lettered += 1
+                logger.error(f"Webhook event {event['id']} dead-lettered after {event['attempts']} attempts: {e}")
+                if self.on_dead:
+                    await self.on_dead(event)
+            else:
+                self.events_retried += 1
+                logger.warning(f"Webhook event {event['id']} failed (attempt {event['attempts']}), will retry: {e}")
+            return
+
+        if not await self.queue.complete(event, result):
+            logger.warning(f"Webhook event {event['id']} lease expired before completion")
+            return
+        self.events_processed += 1
+        if self.on_done:
+            await self.on_done(event, result)
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "events_processed": self.events_processed,
+            "events_retried": self.events_retried,
+            "events_dead_lettered": self.events_dead_lettered
+        }
+
+
+# Global queue instance
+webhook_queue = WebhookQueue()
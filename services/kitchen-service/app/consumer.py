@@ -0,0 +1,145 @@
+"""
+RabbitMQ consumer feeding the ticket engine
+Every replica consumes order lifecycle events from its own exclusive queue,
+so each keeps complete boards for the restaurants its screens show
+"""
+import aio_pika
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+from shared.utils.logger import setup_logger
+from .ticket_engine import TicketEngine
+
+logger = setup_logger("kitchen-consumer")
+
+PREFETCH_COUNT = int(os.getenv("RABBITMQ_PREFETCH_COUNT", "200"))
+ROUTING_KEY = "order.*.*"
+# Published by this service; carries no ticket change
+ETA_EVENT = "order.eta_updated"
+
+RESTART_BACKOFF_INITIAL = 1.0
+RESTART_BACKOFF_MAX = 60.0
+
+
+class OrderEventConsumer:
+    """
+    Applies order events to the ticket engine, reconnecting with backoff
+    Also publishes kitchen events (ready-time estimates) to the same exchange
+    """
+
+    def __init__(self, engine: TicketEngine):
+        self.engine = engine
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self.rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq-service")
+        self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
+        self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.events_received = 0
+        self.invalid_events = 0
+        self.reconnects = 0
+        self.events_published = 0
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        try:
+            if self.connection:
+                await self.connection.close()
+        except Exception as e:
+            logger.error(f"Error closing kitchen consumer connection: {e}")
+
+    async def _run(self):
+        backoff = RESTART_BACKOFF_INITIAL
+        while True:
+            started = time.monotonic()
+            try:
+                await self._consume()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Kitchen consumer stopped: {e}")
+            if time.monotonic() - started > RESTART_BACKOFF_MAX:
+                backoff = RESTART_BACKOFF_INITIAL
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def _consume(self):
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+        self.connection = await aio_pika.connect_robust(
+            f"amqp://{self.rabbitmq_user}:{self.rabbitmq_password}@{self.rabbitmq_host}/"
+        )
+        self.connection.reconnect_callbacks.add(self._on_reconnect)
+        channel = await self.connection.channel()
+        await channel.set_qos(prefetch_count=PREFETCH_COUNT)
+
+        exchange = await channel.declare_exchange("orders", aio_pika.ExchangeType.TOPIC, durable=True)
+        queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(exchange, routing_key=ROUTING_KEY)
+        self.exchange = exchange
+        await queue.consume(self._on_message, no_ack=True)
+
+        # Boards loaded before this point may have missed events
+        self.engine.invalidate_all()
+        logger.info("Kitchen consumer listening for order events")
+
+        while not self.connection.is_closed:
+            await asyncio.sleep(1)
+
+    def _on_reconnect(self, *args):
+        # The exclusive queue was recreated; events in between were lost
+        self.reconnects += 1
+        self.engine.invalidate_all()
+
+    async def _on_message(self, message: aio_pika.IncomingMessage):
+        self.events_received += 1
+        try:
+            event = json.loads(message.body.decode())
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            self.invalid_events += 1
+            logger.error("Invalid JSON in order event")
+            return
+        if isinstance(event, dict) and event.get("event") != ETA_EVENT:
+            self.engine.apply_event(event)
+
+    async def publish(self, events: List[Dict[str, Any]]) -> int:
+        """Publish events to the orders exchange; returns how many were sent"""
+        if self.exchange is None or not self.connection or self.connection.is_closed:
+            return 0
+        sent = 0
+        for event in events:
+            try:
+                await self.exchange.publish(
+                    aio_pika.Message(
+                        body=json.dumps(event).encode(),
+                        content_type="application/json",
+                        message_id=event.get("event_id")
+                    ),
+                    routing_key=f"{event['event']}.{event['restaurant_id']}"
+                )
+                sent += 1
+            except Exception as e:
+                logger.warning(f"Failed to publish {event.get('event')}: {e}")
+                break
+        self.events_published += sent
+        return sent
+
+    def get_stats(self) -> dict:
+        return {
+            "connected": bool(self.connection and not self.connection.is_closed),
+            "events_received": self.events_received,
+            "invalid_events": self.invalid_events,
+            "reconnects": self.reconnects,
+            "events_published": self.events_published,
+        }
@@ -0,0 +1,316 @@
+"""
+Kitchen Service - Main application
+Serves kitchen display screens from an in-memory model of active tickets
+"""
+from fastapi import FastAPI, HTTPException, Request, status, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+from uuid import UUID, uuid4
+import asyncio
+import httpx
+import os
+from pydantic import BaseModel
+from shared.config.settings import settings
+from shared.utils.logger import setup_logger
+from .database import init_db, close_db
+from .ticket_engine import TicketEngine, ACTIVE_STATUSES
+from .ticket_store import load_active_tickets, record_transition
+from .consumer import OrderEventConsumer, ETA_EVENT
+from .scheduler import KitchenScheduler
+
+# Setup logger
+logger = setup_logger("kitchen-service", settings.log_level, settings.log_format)
+
+ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://order-service:8004")
+
+# Statuses a kitchen screen may move a ticket to
+KITCHEN_STATUSES = ("confirmed", "preparing", "ready", "served", "cancelled")
+
+# Seconds between scheduler ticks (starting due items, pushing estimates)
+SCHEDULE_INTERVAL_SECONDS = float(os.getenv("KITCHEN_SCHEDULE_INTERVAL_SECONDS", "1"))
+
+kitchen_scheduler = KitchenScheduler(os.getenv("KITCHEN_SCHEDULER_POLICY", "spt"))
+ticket_engine = TicketEngine(load_active_tickets, kitchen_scheduler)
+event_consumer = OrderEventConsumer(ticket_engine)
+
+
+def eta_event(restaurant_id: str, ticket) -> dict:
+    """Versioned order event carrying a new ready-time estimate"""
+    return {
+        "v": 1,
+        "event_id": uuid4().hex,
+        "event": ETA_EVENT,
+        "order_id": ticket.order_id,
+        "order_number": ticket.order_number,
+        "restaurant_id": restaurant_id,
+        "status": ticket.status,
+        "estimated_ready_at": datetime.utcfromtimestamp(ticket.estimated_ready_at).isoformat(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+async def run_scheduler():
+    """Advance the schedule and push changed estimates to order trackers"""
+    while True:
+        await asyncio.sleep(SCHEDULE_INTERVAL_SECONDS)
+        try:
+            kitchen_scheduler.tick()
+            updates = kitchen_scheduler.pop_eta_updates()
+            if updates:
+                await event_consumer.publish([eta_event(rid, plan.ticket) for rid, plan in updates])
+        except Exception as e:
+            logger.error(f"Scheduler tick failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Lifespan context manager for startup and shutdown events"""
+    # Startup
+    logger.info("Starting Kitchen Service...")
+    await init_db()
+    logger.info("Database initialized")
+
+    await event_consumer.start()
+    logger.info("Order event consumer started")
+    scheduler_task = asyncio.create_task(run_scheduler())
+
+    yield
+
+    # Shutdown
+    logger.info("Shutting down Kitchen Service...")
+    scheduler_task.cancel()
+    await event_consumer.close()
+    await close_db()
+    logger.info("Database connections closed")
+
+
+# Create FastAPI app
+app = FastAPI(
+    title="Restaurant Management - Kitchen Service",
+    description="Kitchen display tickets by station and priority",
+    version="1.0.0",
+    docs_url="/docs",
+    redoc_url="/redoc",
+    lifespan=lifespan
+)
+
+# Configure CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000", "http://localhost:3001", "http://localhost:5173"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+class TicketStatusUpdate(BaseModel):
+    """Schema for bumping a ticket"""
+    status: str
+    station: Optional[str] = None
+
+
+class TicketPriorityUpdate(BaseModel):
+    """Schema for flagging a ticket as rush"""
+    rush: bool
+
+
+@app.get("/", status_code=status.HTTP_200_OK)
+async def root():
+    """Root endpoint"""
+    return {
+        "service": "Kitchen Service",
+        "version": "1.0.0",
+        "status": "running"
+    }
+
+
+@app.get("/health", status_code=status.HTTP_200_OK)
+async def health_check():
+    """Health check endpoint"""
+    return {
+        "status": "healthy",
+        "service": "kitchen-service"
+    }
+
+
+@app.get("/health/tickets", status_code=status.HTTP_200_OK)
+async def tickets_health():
+    """Ticket engine and event consumer counters"""
+    return {
+        "engine": ticket_engine.get_stats(),
+        "scheduler": kitchen_scheduler.get_stats(),
+        "consumer": event_consumer.get_stats()
+    }
+
+
+@app.get("/api/v1/kitchen/{restaurant_id}/tickets")
+async def list_tickets(restaurant_id: UUID, station: Optional[str] = None):
+    """
+    Active tickets, highest priority first
+    Served from memory; station narrows tickets and items to one station
+    """
+    board = await ticket_engine.get_board(str(restaurant_id))
+    return {
+        "restaurant_id": str(restaurant_id),
+        "version": board.version,
+        "stations": board.stations(),
+        "tickets": board.snapshot(station)
+    }
+
+
+@app.post("/api/v1/kitchen/{restaurant_id}/tickets/{order_id}/status")
+async def update_ticket_status(
+    restaurant_id: UUID,
+    order_id: UUID,
+    update: TicketStatusUpdate,
+    request: Request
+):
+    """
+    Bump a ticket from a kitchen screen
+
+    The order status is changed in order-service; screens update
+    immediately and the resulting order event is a no-op here.
+    """
+    new_status = update.status.lower()
+    if new_status not in KITCHEN_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status: {update.status}")
+
+    board = await ticket_engine.get_board(str(restaurant_id))
+    ticket = board.tickets.get(str(order_id))
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    previous_status = ticket.status
+
+    headers = {}
+    if "authorization" in request.headers:
+        headers["Authorization"] = request.headers["authorization"]
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.patch(
+                f"{ORDER_SERVICE_URL}/api/v1/orders/{order_id}/status",
+                json={"status": new_status},
+                headers=headers,
+                timeout=10.0
+            )
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to update order {order_id} status: {e}")
+        raise HTTPException(status_code=502, detail="Order service unavailable")
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", "Status update failed")
+        except ValueError:
+            detail = "Status update failed"
+        raise HTTPException(status_code=response.status_code, detail=detail)
+
+    ticket_engine.set_status(str(restaurant_id), str(order_id), new_status)
+    await record_transition(ticket, previous_status, new_status, update.station)
+    return {"order_id": str(order_id), "status": new_status, "active": new_status in ACTIVE_STATUSES}
+
+
+@app.post("/api/v1/kitchen/{restaurant_id}/tickets/{order_id}/priority")
+async def update_ticket_priority(restaurant_id: UUID, order_id: UUID, update: TicketPriorityUpdate):
+    """Flag or unflag a ticket as rush; rush tickets sort first on every screen"""
+    await ticket_engine.get_board(str(restaurant_id))
+    ticket = ticket_engine.set_rush(str(restaurant_id), str(order_id), update.rush)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    await record_transition(ticket, ticket.status, ticket.status, note="rush" if update.rush else "unrush")
+    return ticket.to_dict()
+
+
+@app.post("/api/v1/kitchen/{restaurant_id}/tickets/{order_id}/stations/{station}/done")
+async def complete_station(restaurant_id: UUID, order_id: UUID, station: str):
+    """A station finished its part of a ticket; frees its cooks and updates estimates"""
+    board = await ticket_engine.get_board(str(restaurant_id))
+    ticket = board.tickets.get(str(order_id))
+    if ticket is None or not kitchen_scheduler.complete_station(str(restaurant_id), str(order_id), station):
+        raise HTTPException(status_code=404, detail="No open work for this ticket at this station")
+    await record_transition(ticket, ticket.status, ticket.status, station, note="station_done")
+    return ticket.to_dict()
+
+
+@app.get("/api/v1/kitchen/{restaurant_id}/stations")
+async def station_loads(restaurant_id: UUID):
+    """Queue depth and time to clear per station"""
+    await ticket_engine.get_board(str(restaurant_id))
+    return {"restaurant_id": str(restaurant_id), "stations": kitchen_scheduler.station_loads(str(restaurant_id))}
+
+
+@app.websocket("/ws/kitchen/{restaurant_id}")
+async def kitchen_websocket(websocket: WebSocket, restaurant_id: str):
+    """
+    Live ticket feed for a kitchen screen
+
+    Sends a snapshot on connect, then ticket_added / ticket_updated /
+    ticket_removed changes. Optional ?station= limits the feed to one
+    station. A screen that falls behind gets a fresh snapshot instead of
+    the changes it missed.
+    """
+    try:
+        restaurant_id = str(UUID(restaurant_id))
+    except ValueError:
+        await websocket.close(code=1008)
+        return
+
+    station = websocket.query_params.get("station")
+    await websocket.accept()
+    board = await ticket_engine.get_board(restaurant_id)
+    subscriber = ticket_engine.subscribe(board, station)
+
+    async def send_snapshot():
+        nonlocal board
+        board = await ticket_engine.get_board(restaurant_id)
+        # Everything queued so far is already in the snapshot
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.resync = False
+        await websocket.send_json({
+            "type": "snapshot",
+            "version": board.version,
+            "station": station,
+            "tickets": board.snapshot(station)
+        })
+
+    async def receive_loop():
+        while True:
+            data = await websocket.receive_text()
+            if data == "ping":
+                await websocket.send_json({"type": "pong"})
+
+    receiver = asyncio.create_task(receive_loop())
+    try:
+        await send_snapshot()
+        while not receiver.done():
+            getter = asyncio.create_task(subscriber.queue.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            message = getter.result()
+            if message["type"] == "resync":
+                await send_snapshot()
+            else:
+                await websocket.send_json(message)
+        # Surface the disconnect (or error) of the receive loop
+        await receiver
+    except WebSocketDisconnect:
+        logger.info(f"Kitchen screen disconnected from restaurant {restaurant_id}")
+    except Exception as e:
+        logger.error(f"Kitchen WebSocket error: {e}")
+    finally:
+        receiver.cancel()
+        ticket_engine.unsubscribe(board, subscriber)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8005,
+        reload=True if settings.environment == "development" else False,
+        log_level=settings.log_level.lower()
+    )
@@ -0,0 +1,61 @@
+"""
+Database models for Kitchen Service
+"""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, MetaData, Table, Index
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+from .database import Base
+
+
+class KitchenTicketTransition(Base):
+    """
+    One state change of a kitchen ticket
+
+    Tickets themselves live in memory; only transitions made from kitchen
+    screens (bumps and rush flags) are written, as an audit trail.
+    """
+    __tablename__ = "kitchen_ticket_transitions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    order_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    restaurant_id = Column(UUID(as_uuid=True), nullable=False)
+    station = Column(String(50), nullable=True)
+    from_status = Column(String(20), nullable=True)
+    to_status = Column(String(20), nullable=False)
+    note = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_kitchen_transitions_restaurant_created', 'restaurant_id', 'created_at'),
+    )
+
+
+# Read-only views of order-service tables, used to rebuild tickets on cold
+# start. Kept on their own metadata so init_db never tries to create them.
+order_metadata = MetaData()
+
+orders = Table(
+    "orders",
+    order_metadata,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("restaurant_id", UUID(as_uuid=True)),
+    Column("table_id", UUID(as_uuid=True)),
+    Column("order_number", String(50)),
+    Column("status", String(20)),
+    Column("order_type", String(20)),
+    Column("special_instructions", Text),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+order_items = Table(
+    "order_items",
+    order_metadata,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("order_id", UUID(as_uuid=True)),
+    Column("menu_item_id", UUID(as_uuid=True)),
+    Column("item_name", String(255)),
+    Column("quantity", Integer),
+    Column("special_instructions", Text),
+)
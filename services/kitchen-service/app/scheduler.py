@@ -0,0 +1,374 @@
+"""
+Kitchen station scheduler
+Assigns ticket items to stations, orders each station's work to keep total
+ticket time low and keeps a live ready-time estimate for every order
+"""
+import heapq
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from shared.utils.logger import setup_logger
+from .ticket_engine import Ticket
+
+logger = setup_logger("kitchen-scheduler")
+
+# Items a station can work on at once; override with KITCHEN_STATION_CAPACITY (JSON)
+STATION_CAPACITY: Dict[str, int] = json.loads(os.getenv("KITCHEN_STATION_CAPACITY", "{}"))
+DEFAULT_CAPACITY = int(os.getenv("KITCHEN_DEFAULT_CAPACITY", "4"))
+# Categories that may go to more than one station, e.g. {"main_course": ["grill", "saute"]};
+# each item goes to the candidate with the least queued work
+STATION_CANDIDATES: Dict[str, List[str]] = json.loads(os.getenv("KITCHEN_STATION_CANDIDATES", "{}"))
+
+# Used when a menu item has no preparation_time
+DEFAULT_PREP_MINUTES = float(os.getenv("KITCHEN_DEFAULT_PREP_MINUTES", "8"))
+# Extra time per additional unit of the same item, as a fraction of one unit
+QUANTITY_FACTOR = float(os.getenv("KITCHEN_QUANTITY_FACTOR", "0.25"))
+# Seconds of waiting that offset one second of work, so big orders are not starved
+AGING_FACTOR = float(os.getenv("KITCHEN_AGING_FACTOR", "1.0"))
+# Estimates are pushed to customers only when they move by at least this much
+ETA_PUSH_THRESHOLD_SECONDS = float(os.getenv("KITCHEN_ETA_PUSH_THRESHOLD_SECONDS", "30"))
+# How often a station with an overrunning item is re-planned
+OVERRUN_RECHECK_SECONDS = 30.0
+
+# Orders the kitchen has accepted; pending orders are planned but not started
+STARTABLE_STATUSES = ("confirmed", "preparing")
+
+QUEUED, COOKING, DONE = "queued", "cooking", "done"
+
+
+class WorkItem:
+    """One ticket item at one station"""
+
+    __slots__ = ("order", "index", "station", "duration", "state", "start", "finish")
+
+    def __init__(self, order: "OrderPlan", index: int, station: str, duration: float):
+        self.order = order
+        self.index = index
+        self.station = station
+        self.duration = duration
+        self.state = QUEUED
+        self.start: Optional[float] = None
+        self.finish: Optional[float] = None
+
+
+class OrderPlan:
+    """Scheduling state of one ticket"""
+
+    __slots__ = ("ticket", "arrival", "items", "eta", "pushed_eta")
+
+    def __init__(self, ticket: Ticket, arrival: float):
+        self.ticket = ticket
+        self.arrival = arrival
+        self.items: List[WorkItem] = []
+        self.eta: Optional[float] = None
+        self.pushed_eta: Optional[float] = None
+
+    @property
+    def startable(self) -> bool:
+        return self.ticket.status in STARTABLE_STATUSES
+
+    def critical_path(self) -> float:
+        """Remaining work at the order's busiest station"""
+        work: Dict[str, float] = {}
+        for item in self.items:
+            if item.state != DONE:
+                work[item.station] = work.get(item.station, 0.0) + item.duration
+        return max(work.values(), default=0.0)
+
+
+class StationState:
+    """Queued and in-progress work of one station"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.capacity = max(1, int(STATION_CAPACITY.get(name, DEFAULT_CAPACITY)))
+        self.queued: List[WorkItem] = []
+        self.cooking: List[WorkItem] = []
+        # Seconds of work not yet done, kept incrementally for load balancing
+        self.work_seconds = 0.0
+        self.dirty = True
+        self.next_change_at = float("inf")
+
+
+class RestaurantSchedule:
+    def __init__(self):
+        self.stations: Dict[str, StationState] = {}
+        self.orders: Dict[str, OrderPlan] = {}
+
+    def station(self, name: str) -> StationState:
+        state = self.stations.get(name)
+        if state is None:
+            state = self.stations[name] = StationState(name)
+        return state
+
+
+def item_duration(preparation_time: Optional[float], quantity: int) -> float:
+    """Seconds one ticket item takes at its station"""
+    minutes = float(preparation_time) if preparation_time else DEFAULT_PREP_MINUTES
+    return minutes * 60.0 * (1.0 + max(quantity - 1, 0) * QUANTITY_FACTOR)
+
+
+class KitchenScheduler:
+    """
+    Plans station work per restaurant
+
+    Every station works on up to its capacity of items at once. Items wait in a station queue ordered
+    by ticket priority, then by the order's remaining critical-path work
+    (shortest first, which minimises the sum of ticket times) less an aging
+    credit, so large orders still progress during a rush. Planning a
+    station simulates its slots over that queue, which gives each item a
+    start and finish time and each order a ready time (its last item).
+
+    Only stations touched by an event, or whose next planned start/finish
+    has passed, are re-planned, so the cost of an event is bounded by the
+    size of the stations it touches rather than the whole kitchen.
+    """
+
+    def __init__(self, policy: str = "spt", clock: Callable[[], float] = time.time):
+        self.policy = policy
+        self.clock = clock
+        self.restaurants: Dict[str, RestaurantSchedule] = {}
+        # order_id -> (restaurant_id, plan) whose estimate moved enough to push
+        self.eta_updates: Dict[str, Tuple[str, OrderPlan]] = {}
+
+        # Metrics
+        self.events = 0
+        self.station_plans = 0
+        self.plan_seconds = 0.0
+
+    def _schedule(self, restaurant_id: str) -> RestaurantSchedule:
+        schedule = self.restaurants.get(restaurant_id)
+        if schedule is None:
+            schedule = self.restaurants[restaurant_id] = RestaurantSchedule()
+        return schedule
+
+    # Ticket events -------------------------------------------------------
+
+    def add_order(self, restaurant_id: str, ticket: Ticket, arrival: Optional[float] = None, refresh: bool = True):
+        """Queue the items of a new ticket, choosing the least loaded station where there is a choice"""
+        self.events += 1
+        schedule = self._schedule(restaurant_id)
+        if ticket.order_id in schedule.orders:
+            return
+        plan = OrderPlan(ticket, arrival if arrival is not None else self._arrival(ticket))
+        schedule.orders[ticket.order_id] = plan
+
+        for index, ticket_item in enumerate(ticket.items):
+            candidates = STATION_CANDIDATES.get(ticket_item.category or "")
+            if candidates:
+                ticket_item.station = min(
+                    candidates,
+                    key=lambda name: schedule.station(name).work_seconds / schedule.station(name).capacity
+                )
+            station = schedule.station(ticket_item.station)
+            item = WorkItem(plan, index, station.name, item_duration(ticket_item.preparation_time, ticket_item.quantity))
+            plan.items.append(item)
+            station.queued.append(item)
+            station.work_seconds += item.duration
+            station.dirty = True
+
+        if ticket.status == "ready":
+            self._finish_items(schedule, plan.items)
+        if refresh:
+            self.refresh(restaurant_id)
+
+    def _arrival(self, ticket: Ticket) -> float:
+        try:
+            return datetime.fromisoformat(ticket.created_at).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            return self.clock()
+
+    def update_order(self, restaurant_id: str, ticket: Ticket):
+        """Re-plan after a status or priority change of a ticket"""
+        self.events += 1
+        schedule = self.restaurants.get(restaurant_id)
+        plan = schedule.orders.get(ticket.order_id) if schedule else None
+        if plan is None:
+            return
+        if ticket.status == "ready":
+            self._finish_items(schedule, plan.items)
+        for item in plan.items:
+            schedule.station(item.station).dirty = True
+        self.refresh(restaurant_id)
+
+    def remove_order(self, restaurant_id: str, order_id: str):
+        """Forget a ticket that left the kitchen"""
+        self.events += 1
+        schedule = self.restaurants.get(restaurant_id)
+        plan = schedule.orders.pop(order_id, None) if schedule else None
+        if plan is None:
+            return
+        self._finish_items(schedule, plan.items, remove=True)
+        self.eta_updates.pop(order_id, None)
+        self.refresh(restaurant_id)
+
+    def complete_station(self, restaurant_id: str, order_id: str, station: str) -> bool:
+        """A station bumped its part of a ticket"""
+        self.events += 1
+        schedule = self.restaurants.get(restaurant_id)
+        plan = schedule.orders.get(order_id) if schedule else None
+        if plan is None:
+            return False
+        items = [item for item in plan.items if item.station == station and item.state != DONE]
+        if not items:
+            return False
+        self._finish_items(schedule, items)
+        self.refresh(restaurant_id)
+        return True
+
+    def complete_item(self, restaurant_id: str, order_id: str, index: int):
+        """A single item is done"""
+        self.events += 1
+        schedule = self.restaurants.get(restaurant_id)
+        plan = schedule.orders.get(order_id) if schedule else None
+        if plan is None or index >= len(plan.items) or plan.items[index].state == DONE:
+            return
+        self._finish_items(schedule, [plan.items[index]])
+        self.refresh(restaurant_id)
+
+    def rebuild(self, restaurant_id: str, tickets: List[Ticket]):
+        """Start over from a freshly loaded board"""
+        self.restaurants[restaurant_id] = RestaurantSchedule()
+        for ticket in sorted(tickets, key=lambda t: t.created_at):
+            self.add_order(restaurant_id, ticket, refresh=False)
+        self.refresh(restaurant_id)
+
+    def _finish_items(self, schedule: RestaurantSchedule, items: List[WorkItem], remove: bool = False):
+        now = self.clock()
+        for item in items:
+            station = schedule.station(item.station)
+            if item.state == QUEUED:
+                station.queued.remove(item)
+            elif item.state == COOKING:
+                station.cooking.remove(item)
+            if item.state != DONE:
+                station.work_seconds = max(station.work_seconds - item.duration, 0.0)
+                item.state = DONE
+                item.finish = now
+            station.dirty = True
+
+    # Planning ------------------------------------------------------------
+
+    def refresh(self, restaurant_id: str):
+        """Re-plan the dirty and due stations of one restaurant"""
+        schedule = self.restaurants.get(restaurant_id)
+        if schedule is None:
+            return
+        now = self.clock()
+        touched: Dict[str, OrderPlan] = {}
+        for station in schedule.stations.values():
+            if station.dirty or station.next_change_at <= now:
+                self._plan_station(station, now, touched)
+        for order_id, plan in touched.items():
+            self._update_eta(restaurant_id, plan, now)
+
+    def tick(self):
+        """Advance every restaurant to the current time; call periodically"""
+        for restaurant_id in list(self.restaurants):
+            self.refresh(restaurant_id)
+
+    def _sort_key(self, item: WorkItem, now: float, critical_paths: Dict[int, float]):
+        plan = item.order
+        if self.policy == "fifo":
+            return (not plan.startable, -plan.ticket.priority, plan.arrival, item.index)
+        critical = critical_paths.get(id(plan))
+        if critical is None:
+            critical = critical_paths[id(plan)] = plan.critical_path()
+        return (
+            not plan.startable,
+            -plan.ticket.priority,
+            critical - AGING_FACTOR * (now - plan.arrival),
+            plan.arrival,
+            item.index
+        )
+
+    def _plan_station(self, station: StationState, now: float, touched: Dict[str, OrderPlan]):
+        start_time = time.perf_counter()
+        next_change = float("inf")
+
+        # Busy slots free up when their item finishes (or now, if it overran)
+        lanes = []
+        for item in station.cooking:
+            if item.finish > now:
+                next_change = min(next_change, item.finish)
+            else:
+                next_change = min(next_change, now + OVERRUN_RECHECK_SECONDS)
+            lanes.append(max(item.finish, now))
+            touched[item.order.ticket.order_id] = item.order
+        lanes.extend([now] * max(station.capacity - len(lanes), 0))
+        heapq.heapify(lanes)
+
+        critical_paths: Dict[int, float] = {}
+        keys = {id(item): self._sort_key(item, now, critical_paths) for item in station.queued}
+        station.queued.sort(key=lambda item: keys[id(item)])
+        started = []
+        for item in station.queued:
+            free_at = heapq.heappop(lanes)
+            item.start = max(free_at, now)
+            item.finish = item.start + item.duration
+            heapq.heappush(lanes, item.finish)
+            touched[item.order.ticket.order_id] = item.order
+
+            if item.order.startable:
+                if item.start <= now:
+                    started.append(item)
+                else:
+                    next_change = min(next_change, item.start)
+
+        for item in started:
+            station.queued.remove(item)
+            item.state = COOKING
+            station.cooking.append(item)
+            next_change = min(next_change, item.finish)
+
+        station.dirty = False
+        station.next_change_at = next_change
+        self.station_plans += 1
+        self.plan_seconds += time.perf_counter() - start_time
+
+    def _update_eta(self, restaurant_id: str, plan: OrderPlan, now: float):
+        pending = [item.finish for item in plan.items if item.state != DONE]
+        plan.eta = max(pending) if pending else now
+        plan.ticket.estimated_ready_at = plan.eta
+        if plan.pushed_eta is None or abs(plan.eta - plan.pushed_eta) >= ETA_PUSH_THRESHOLD_SECONDS:
+            self.eta_updates[plan.ticket.order_id] = (restaurant_id, plan)
+
+    def pop_eta_updates(self) -> List[Tuple[str, OrderPlan]]:
+        """Estimates to push to customers since the last call"""
+        updates = list(self.eta_updates.values())
+        self.eta_updates.clear()
+        for _, plan in updates:
+            plan.pushed_eta = plan.eta
+        return updates
+
+    # Reporting -----------------------------------------------------------
+
+    def station_loads(self, restaurant_id: str) -> Dict[str, dict]:
+        schedule = self.restaurants.get(restaurant_id)
+        if schedule is None:
+            return {}
+        now = self.clock()
+        loads = {}
+        for name, station in schedule.stations.items():
+            finishes = [item.finish for item in station.queued + station.cooking if item.finish]
+            loads[name] = {
+                "capacity": station.capacity,
+                "queued": len(station.queued),
+                "cooking": len(station.cooking),
+                "work_seconds": round(station.work_seconds),
+                "clear_in_seconds": round(max(max(finishes, default=now) - now, 0))
+            }
+        return loads
+
+    def get_stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "restaurants": len(self.restaurants),
+            "orders": sum(len(s.orders) for s in self.restaurants.values()),
+            "events": self.events,
+            "station_plans": self.station_plans,
+            "avg_plan_us": round(self.plan_seconds / self.station_plans * 1e6, 1) if self.station_plans else 0,
+            "pending_eta_updates": len(self.eta_updates)
+        }
@@ -0,0 +1,378 @@
+"""
+In-memory kitchen ticket engine
+Keeps the active tickets of every restaurant a replica serves, grouped by
+station and ordered by priority, and fans changes out to kitchen screens
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("ticket-engine")
+
+# Statuses a ticket is shown in; anything else takes it off the screens
+ACTIVE_STATUSES = ("pending", "confirmed", "preparing", "ready")
+
+# Menu category -> kitchen station; override with KITCHEN_STATIONS (JSON)
+STATION_BY_CATEGORY = {
+    "appetizer": "cold",
+    "main_course": "hot",
+    "side_dish": "hot",
+    "special": "hot",
+    "dessert": "pastry",
+    "beverage": "bar",
+}
+STATION_BY_CATEGORY.update(json.loads(os.getenv("KITCHEN_STATIONS", "{}")))
+DEFAULT_STATION = os.getenv("KITCHEN_DEFAULT_STATION", "hot")
+
+# Online orders are waited on by couriers and customers, so they sort first
+ORDER_TYPE_PRIORITY = {"ONLINE": 1, "TABLE": 0}
+RUSH_PRIORITY = 10
+
+# Changes a slow screen may fall behind before it is sent a fresh snapshot
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("KITCHEN_SUBSCRIBER_QUEUE_SIZE", "256"))
+
+
+def station_for(category: Optional[str]) -> str:
+    return STATION_BY_CATEGORY.get(category or "", DEFAULT_STATION)
+
+
+@dataclass
+class TicketItem:
+    menu_item_id: str
+    name: str
+    quantity: int
+    station: str
+    category: Optional[str] = None
+    preparation_time: Optional[int] = None
+    special_instructions: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "menu_item_id": self.menu_item_id,
+            "name": self.name,
+            "quantity": self.quantity,
+            "station": self.station,
+            "category": self.category,
+            "preparation_time": self.preparation_time,
+            "special_instructions": self.special_instructions,
+        }
+
+
+@dataclass
+class Ticket:
+    order_id: str
+    restaurant_id: str
+    order_number: Optional[str]
+    order_type: Optional[str]
+    table_id: Optional[str]
+    status: str
+    created_at: str
+    items: List[TicketItem] = field(default_factory=list)
+    special_instructions: Optional[str] = None
+    rush: bool = False
+    updated_at: float = field(default_factory=time.time)
+    # Set by the scheduler (epoch seconds)
+    estimated_ready_at: Optional[float] = None
+
+    @property
+    def stations(self) -> Set[str]:
+        return {item.station for item in self.items}
+
+    @property
+    def priority(self) -> int:
+        return ORDER_TYPE_PRIORITY.get(self.order_type or "", 0) + (RUSH_PRIORITY if self.rush else 0)
+
+    def sort_key(self):
+        return (-self.priority, self.created_at)
+
+    def to_dict(self, station: Optional[str] = None) -> Dict[str, Any]:
+        items = [i for i in self.items if station is None or i.station == station]
+        return {
+            "order_id": self.order_id,
+            "order_number": self.order_number,
+            "order_type": self.order_type,
+            "table_id": self.table_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "priority": self.priority,
+            "rush": self.rush,
+            "special_instructions": self.special_instructions,
+            "stations": sorted(self.stations),
+            "estimated_ready_at": (
+                datetime.utcfromtimestamp(self.estimated_ready_at).isoformat()
+                if self.estimated_ready_at else None
+            ),
+            "items": [i.to_dict() for i in items],
+        }
+
+
+class Subscriber:
+    """One kitchen screen: a bounded queue of changes, optionally for a single station"""
+
+    def __init__(self, station: Optional[str]):
+        self.station = station
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the queue overflowed or the board was rebuilt
+        self.resync = False
+
+    def wants(self, ticket: Ticket) -> bool:
+        return self.station is None or self.station in ticket.stations
+
+    def offer(self, message: Dict[str, Any]):
+        if self.resync:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.request_resync()
+
+    def request_resync(self):
+        self.resync = True
+        # Drain so the screen wakes up and fetches a snapshot
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": "resync"})
+
+
+class RestaurantBoard:
+    """Active tickets of one restaurant"""
+
+    def __init__(self, restaurant_id: str):
+        self.restaurant_id = restaurant_id
+        self.tickets: Dict[str, Ticket] = {}
+        self.version = 0
+        self.loaded = False
+        self.subscribers: Set[Subscriber] = set()
+        # Events received while the cold-start load is running
+        self.buffered: List[Dict[str, Any]] = []
+        self.lock = asyncio.Lock()
+
+    def snapshot(self, station: Optional[str] = None) -> List[Dict[str, Any]]:
+        tickets = sorted(self.tickets.values(), key=Ticket.sort_key)
+        return [t.to_dict(station) for t in tickets if station is None or station in t.stations]
+
+    def stations(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for ticket in self.tickets.values():
+            for station in ticket.stations:
+                counts[station] = counts.get(station, 0) + 1
+        return counts
+
+
+TicketLoader = Callable[[str], Awaitable[List[Ticket]]]
+
+
+class TicketEngine:
+    """
+    Per-restaurant ticket boards built from order events
+
+    A board is loaded from the database the first time a screen asks for
+    it and kept current by order events from then on, so any number of
+    screens are served from memory. Events for restaurants nobody has asked
+    for are ignored.
+    """
+
+    def __init__(self, loader: Optional[TicketLoader] = None, scheduler=None):
+        self.loader = loader
+        # Optional KitchenScheduler kept in step with the boards
+        self.scheduler = scheduler
+        self.boards: Dict[str, RestaurantBoard] = {}
+
+        # Metrics
+        self.events_applied = 0
+        self.events_ignored = 0
+        self.cold_loads = 0
+        self.resyncs = 0
+
+    async def get_board(self, restaurant_id: str) -> RestaurantBoard:
+        """Return the board of a restaurant, loading it on first use"""
+        board = self.boards.get(restaurant_id)
+        if board is None:
+            board = self.boards[restaurant_id] = RestaurantBoard(restaurant_id)
+        if board.loaded:
+            return board
+
+        async with board.lock:
+            if not board.loaded:
+                await self._load(board)
+        return board
+
+    async def _load(self, board: RestaurantBoard):
+        start = time.perf_counter()
+        board.buffered = []
+        tickets = await self.loader(board.restaurant_id) if self.loader else []
+        board.tickets = {t.order_id: t for t in tickets}
+        if self.scheduler:
+            self.scheduler.rebuild(board.restaurant_id, tickets)
+        board.loaded = True
+        board.version += 1
+        self.cold_loads += 1
+
+        # Replay what arrived while the query ran; status events are
+        # idempotent and creations of already-loaded orders are skipped
+        buffered, board.buffered = board.buffered, []
+        for event in buffered:
+            self._apply(board, event)
+
+        for subscriber in board.subscribers:
+            subscriber.request_resync()
+        logger.info(
+            f"Loaded {len(board.tickets)} active tickets for restaurant {board.restaurant_id} "
+            f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+
+    def invalidate_all(self):
+        """Forget all boards, e.g. after events may have been missed; screens resync"""
+        for board in self.boards.values():
+            board.loaded = False
+            for subscriber in board.subscribers:
+                subscriber.request_resync()
+
+    def apply_event(self, event: Dict[str, Any]) -> bool:
+        """Apply an order lifecycle event; returns whether a board changed"""
+        board = self.boards.get(event.get("restaurant_id") or "")
+        if board is None:
+            self.events_ignored += 1
+            return False
+        if not board.loaded:
+            if board.lock.locked():
+                board.buffered.append(event)
+            else:
+                self.events_ignored += 1
+            return False
+        return self._apply(board, event)
+
+    def _apply(self, board: RestaurantBoard, event: Dict[str, Any]) -> bool:
+        order_id = event.get("order_id")
+        status = event.get("status")
+        if not order_id or not status:
+            self.events_ignored += 1
+            return False
+
+        ticket = board.tickets.get(order_id)
+        if status not in ACTIVE_STATUSES:
+            if ticket is None:
+                return False
+            self._remove(board, ticket, status)
+            return True
+
+        if ticket is None:
+            if "items" not in event:
+                # A status change of an order created before the board was
+                # loaded and already finished; nothing to show
+                self.events_ignored += 1
+                return False
+            ticket = ticket_from_event(event)
+            board.tickets[order_id] = ticket
+            if self.scheduler:
+                self.scheduler.add_order(board.restaurant_id, ticket)
+            self._publish(board, ticket, "ticket_added")
+        elif ticket.status != status:
+            ticket.status = status
+            ticket.updated_at = time.time()
+            if self.scheduler:
+                self.scheduler.update_order(board.restaurant_id, ticket)
+            self._publish(board, ticket, "ticket_updated")
+        else:
+            return False
+        self.events_applied += 1
+        return True
+
+    def set_status(self, restaurant_id: str, order_id: str, status: str) -> Optional[Ticket]:
+        """Apply a status change made from a kitchen screen without waiting for the event"""
+        board = self.boards.get(restaurant_id)
+        ticket = board.tickets.get(order_id) if board else None
+        if ticket is None:
+            return None
+        if status not in ACTIVE_STATUSES:
+            self._remove(board, ticket, status)
+        elif ticket.status != status:
+            ticket.status = status
+            ticket.updated_at = time.time()
+            if self.scheduler:
+                self.scheduler.update_order(board.restaurant_id, ticket)
+            self._publish(board, ticket, "ticket_updated")
+        return ticket
+
+    def set_rush(self, restaurant_id: str, order_id: str, rush: bool) -> Optional[Ticket]:
+        board = self.boards.get(restaurant_id)
+        ticket = board.tickets.get(order_id) if board else None
+        if ticket is None:
+            return None
+        if ticket.rush != rush:
+            ticket.rush = rush
+            ticket.updated_at = time.time()
+            if self.scheduler:
+                self.scheduler.update_order(restaurant_id, ticket)
+            self._publish(board, ticket, "ticket_updated")
+        return ticket
+
+    def _remove(self, board: RestaurantBoard, ticket: Ticket, status: str):
+        del board.tickets[ticket.order_id]
+        ticket.status = status
+        if self.scheduler:
+            self.scheduler.remove_order(board.restaurant_id, ticket.order_id)
+        self._publish(board, ticket, "ticket_removed")
+        self.events_applied += 1
+
+    def _publish(self, board: RestaurantBoard, ticket: Ticket, change: str):
+        board.version += 1
+        for subscriber in board.subscribers:
+            if subscriber.wants(ticket):
+                was_resyncing = subscriber.resync
+                subscriber.offer({
+                    "type": change,
+                    "version": board.version,
+                    "ticket": ticket.to_dict(subscriber.station)
+                })
+                if subscriber.resync and not was_resyncing:
+                    self.resyncs += 1
+
+    def subscribe(self, board: RestaurantBoard, station: Optional[str] = None) -> Subscriber:
+        subscriber = Subscriber(station)
+        board.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, board: RestaurantBoard, subscriber: Subscriber):
+        board.subscribers.discard(subscriber)
+
+    def get_stats(self) -> dict:
+        return {
+            "restaurants": len(self.boards),
+            "active_tickets": sum(len(b.tickets) for b in self.boards.values()),
+            "screens": sum(len(b.subscribers) for b in self.boards.values()),
+            "events_applied": self.events_applied,
+            "events_ignored": self.events_ignored,
+            "cold_loads": self.cold_loads,
+            "resyncs": self.resyncs,
+        }
+
+
+def ticket_from_event(event: Dict[str, Any]) -> Ticket:
+    """Build a ticket from an order.created event"""
+    return Ticket(
+        order_id=event["order_id"],
+        restaurant_id=event["restaurant_id"],
+        order_number=event.get("order_number"),
+        order_type=event.get("order_type"),
+        table_id=event.get("table_id"),
+        status=event["status"],
+        created_at=event.get("timestamp") or "",
+        items=[
+            TicketItem(
+                menu_item_id=str(item.get("menu_item_id")),
+                name=item.get("name") or "",
+                quantity=int(item.get("quantity") or 1),
+                station=station_for(item.get("category")),
+                category=item.get("category"),
+                preparation_time=item.get("preparation_time"),
+                special_instructions=item.get("special_instructions"),
+            )
+            for item in event.get("items") or []
+        ],
+    )
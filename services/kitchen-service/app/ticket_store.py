@@ -0,0 +1,117 @@
+"""
+Database access for kitchen tickets
+Cold-start rebuild of active tickets and persistence of ticket transitions
+"""
+import httpx
+import os
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, text
+from shared.utils.logger import setup_logger
+from .database import async_session_maker
+from .models import KitchenTicketTransition, orders, order_items
+from .ticket_engine import Ticket, TicketItem, station_for
+
+logger = setup_logger("ticket-store")
+
+RESTAURANT_SERVICE_URL = os.getenv("RESTAURANT_SERVICE_URL", "http://restaurant-service:8003")
+MENU_PAGE_SIZE = 500
+
+# Must match the predicate of idx_orders_active_restaurant_created
+# (order-service migration 002) for the planner to use the partial index
+ACTIVE_ORDERS_PREDICATE = text("orders.status IN ('PENDING', 'CONFIRMED', 'PREPARING', 'READY')")
+
+
+async def fetch_menu_details(restaurant_id: str) -> Dict[str, Dict[str, Any]]:
+    """Category and preparation time of every menu item, by id"""
+    details: Dict[str, Dict[str, Any]] = {}
+    params = {"limit": MENU_PAGE_SIZE, "skip": 0}
+    try:
+        async with httpx.AsyncClient() as client:
+            while True:
+                response = await client.get(
+                    f"{RESTAURANT_SERVICE_URL}/api/v1/restaurants/{restaurant_id}/menu-items",
+                    params=params,
+                    timeout=10.0
+                )
+                response.raise_for_status()
+                page = response.json()
+                for item in page:
+                    details[str(item["id"])] = {
+                        "category": item.get("category"),
+                        "preparation_time": item.get("preparation_time")
+                    }
+                if len(page) < MENU_PAGE_SIZE:
+                    return details
+                params["skip"] += MENU_PAGE_SIZE
+    except Exception as e:
+        # Tickets still load; items fall back to the default station
+        logger.warning(f"Could not fetch menu of restaurant {restaurant_id}: {e}")
+        return details
+
+
+async def load_active_tickets(restaurant_id: str) -> List[Ticket]:
+    """Rebuild the active tickets of a restaurant from the orders tables"""
+    async with async_session_maker() as session:
+        order_rows = (await session.execute(
+            select(orders)
+            .where(orders.c.restaurant_id == uuid.UUID(restaurant_id))
+            .where(ACTIVE_ORDERS_PREDICATE)
+            .order_by(orders.c.created_at)
+        )).all()
+        if not order_rows:
+            return []
+
+        item_rows = (await session.execute(
+            select(order_items).where(order_items.c.order_id.in_([row.id for row in order_rows]))
+        )).all()
+
+    menu = await fetch_menu_details(restaurant_id)
+    items_by_order = defaultdict(list)
+    for row in item_rows:
+        detail = menu.get(str(row.menu_item_id), {})
+        items_by_order[row.order_id].append(TicketItem(
+            menu_item_id=str(row.menu_item_id),
+            name=row.item_name,
+            quantity=row.quantity,
+            station=station_for(detail.get("category")),
+            category=detail.get("category"),
+            preparation_time=detail.get("preparation_time"),
+            special_instructions=row.special_instructions,
+        ))
+
+    return [
+        Ticket(
+            order_id=str(row.id),
+            restaurant_id=restaurant_id,
+            order_number=row.order_number,
+            order_type=row.order_type,
+            table_id=str(row.table_id) if row.table_id else None,
+            status=row.status.lower(),
+            created_at=row.created_at.isoformat() if row.created_at else "",
+            items=items_by_order[row.id],
+            special_instructions=row.special_instructions,
+        )
+        for row in order_rows
+    ]
+
+
+async def record_transition(
+    ticket: Ticket,
+    from_status: Optional[str],
+    to_status: str,
+    station: Optional[str] = None,
+    note: Optional[str] = None
+):
+    """Persist one ticket state change"""
+    async with async_session_maker() as session:
+        session.add(KitchenTicketTransition(
+            order_id=uuid.UUID(ticket.order_id),
+            restaurant_id=uuid.UUID(ticket.restaurant_id),
+            station=station,
+            from_status=from_status,
+            to_status=to_status,
+            note=note,
+        ))
+        await session.commit()
@@ -0,0 +1,39 @@
+"""Add partial index on active orders for kitchen-service cold start
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE_STATUSES = "status IN ('PENDING', 'CONFIRMED', 'PREPARING', 'READY')"
+
+
+def upgrade() -> None:
+    """
+    Index only orders still in the kitchen
+
+    kitchen-service rebuilds its in-memory tickets from this on startup.
+    Active orders are a tiny fraction of the table, so the index stays
+    small no matter how much order history accumulates.
+    """
+    op.create_index(
+        'idx_orders_active_restaurant_created',
+        'orders',
+        ['restaurant_id', 'created_at'],
+        unique=False,
+        postgresql_where=sa.text(ACTIVE_STATUSES)
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_orders_active_restaurant_created', table_name='orders')
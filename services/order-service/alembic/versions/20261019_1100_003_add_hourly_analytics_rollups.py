@@ -0,0 +1,58 @@
+"""Add hourly analytics rollup tables per restaurant and per menu item
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Create analytics_hourly_restaurant and analytics_hourly_item
+
+    Both start empty; fill them for existing orders with
+    python -m app.services.analytics_rollups backfill
+    """
+    op.create_table(
+        'analytics_hourly_restaurant',
+        sa.Column('restaurant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('order_type', sa.String(length=20), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('item_quantity', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cancelled_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('restaurant_id', 'bucket', 'order_type')
+    )
+
+    op.create_table(
+        'analytics_hourly_item',
+        sa.Column('restaurant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('menu_item_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('order_type', sa.String(length=20), nullable=False),
+        sa.Column('item_name', sa.String(length=255), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('restaurant_id', 'bucket', 'menu_item_id', 'order_type')
+    )
+    op.create_index('idx_hourly_item_restaurant_bucket', 'analytics_hourly_item', ['restaurant_id', 'bucket'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_hourly_item_restaurant_bucket', table_name='analytics_hourly_item')
+    op.drop_table('analytics_hourly_item')
+    op.drop_table('analytics_hourly_restaurant')
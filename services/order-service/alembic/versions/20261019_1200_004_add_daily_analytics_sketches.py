@@ -0,0 +1,45 @@
+"""Add daily analytics sketches for approximate analytics
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '004'
+down_revision: Union[str, None] = '003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Create analytics_daily_sketches
+
+    Starts empty; fill it for existing orders with
+    python -m app.services.analytics_sketches build
+    """
+    op.create_table(
+        'analytics_daily_sketches',
+        sa.Column('restaurant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('customers_hll', sa.LargeBinary(), nullable=False),
+        sa.Column('identified_orders', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('identified_revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('top_items', postgresql.JSONB(astext_type=sa.Text()), nullable=False, server_default='[]'),
+        sa.Column('top_items_threshold', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('source_orders', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('source_updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('restaurant_id', 'day')
+    )
+    op.create_index('idx_daily_sketches_day', 'analytics_daily_sketches', ['day'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_daily_sketches_day', table_name='analytics_daily_sketches')
+    op.drop_table('analytics_daily_sketches')
@@ -0,0 +1,32 @@
+"""Add idempotency key to orders
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '005'
+down_revision: Union[str, None] = '004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Nullable unique key sent by clients that retry order creation
+
+    Existing orders have no key; NULLs never conflict, so the constraint
+    only covers orders created with one.
+    """
+    op.add_column('orders', sa.Column('idempotency_key', sa.String(length=255), nullable=True))
+    op.create_unique_constraint('orders_idempotency_key_key', 'orders', ['idempotency_key'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('orders_idempotency_key_key', 'orders', type_='unique')
+    op.drop_column('orders', 'idempotency_key')
@@ -3,7 +3,7 @@ Analytics Schemas for Order Service
 Pydantic models for analytics API responses
 """
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import date, datetime
 from uuid import UUID
 
@@ -68,6 +68,7 @@ class PopularItem(BaseModel):
     avg_price: float = Field(..., description="Average price per unit")
     trend: str = Field(..., description="Trend direction: up, down, stable")
     trend_percentage: Optional[float] = Field(None, description="Percentage change from previous period")
+    quantity_error: Optional[int] = Field(None, description="Approximate mode: quantity_sold may be low by at most this much")
 
     class Config:
         json_schema_extra = {
@@ -88,6 +89,8 @@ class PopularItemsResponse(BaseModel):
     """Response for popular items query"""
     days: int = Field(..., description="Number of days analyzed")
     items: List[PopularItem]
+    approximate: bool = Field(False, description="Computed from daily sketches (approx=true)")
+    error_bounds: Optional[Dict[str, Any]] = Field(None, description="Error bounds of an approximate result")
 
     class Config:
         json_schema_extra = {
@@ -98,6 +101,29 @@ class PopularItemsResponse(BaseModel):
         }
 
 
+class TrendingItem(BaseModel):
+    """Menu item ordered most right now"""
+    menu_item_id: UUID
+    item_name: str
+    category: Optional[str] = None
+    score: float = Field(..., description="Quantity ordered, each order halved every half-life")
+    error: float = Field(0.0, description="score may be high by at most this much")
+
+
+class TrendingItemsResponse(BaseModel):
+    """Response for trending items query (served from memory)"""
+    half_life_minutes: float = Field(..., description="Minutes after which an order counts half")
+    items: List[TrendingItem]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "half_life_minutes": 20,
+                "items": []
+            }
+        }
+
+
 # ============================================================================
 # Day-of-Week Pattern Schemas
 # ============================================================================
@@ -498,11 +524,14 @@ class OrderTypeAnalysisResponse(BaseModel):
 
 class CustomerBehaviorMetrics(BaseModel):
     """Customer behavior metrics"""
+    total_customers: Optional[int] = None
     new_customers: int
     returning_customers: int
     repeat_rate: float = Field(..., description="Percentage of returning customers")
     avg_orders_per_customer: float
     avg_customer_lifetime_value: float
+    approximate: bool = Field(False, description="Computed from daily sketches (approx=true)")
+    error_bounds: Optional[Dict[str, Any]] = Field(None, description="95% intervals of an approximate result")
 
     class Config:
         json_schema_extra = {
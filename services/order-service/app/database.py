@@ -1,22 +1,155 @@
 """
 Database configuration for Order Service
+
+Engines act as bulkheads: order taking (OLTP) keeps its own pool on the
+primary, read-only routes use replicas (or a read pool on the primary), and
+analytics queries run on a smaller pool whose connections carry a
+server-side statement timeout, so heavy reports can neither starve order
+creation nor run unbounded.
 """
+import os
+import time
+from collections import deque
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from shared.config.settings import settings
+from shared.utils.db_routing import ReadRouter, parse_database_urls
+
+# Read pool per replica (or on the primary when there are no replicas)
+READ_DB_POOL_SIZE = int(os.getenv("READ_DB_POOL_SIZE", "10"))
+READ_DB_MAX_OVERFLOW = int(os.getenv("READ_DB_MAX_OVERFLOW", "20"))
+
+# Analytics pool; its connections are shared by reports only
+ANALYTICS_DB_POOL_SIZE = int(os.getenv("ANALYTICS_DB_POOL_SIZE", "5"))
+ANALYTICS_DB_MAX_OVERFLOW = int(os.getenv("ANALYTICS_DB_MAX_OVERFLOW", "5"))
+# Seconds a report waits for a connection before failing fast
+ANALYTICS_DB_POOL_TIMEOUT = float(os.getenv("ANALYTICS_DB_POOL_TIMEOUT", "5"))
+# Postgres aborts any analytics statement running longer than this
+ANALYTICS_STATEMENT_TIMEOUT_MS = int(os.getenv("ANALYTICS_STATEMENT_TIMEOUT_MS", "15000"))
+
+# Waits longer than this are counted as slow
+SLOW_POOL_WAIT_SECONDS = 0.1
+
+
+class PoolWaitStats:
+    """How long callers waited to check a connection out of one pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.timeouts = 0
+        self.slow_waits = 0
+        self.max_wait = 0.0
+        self.waits: deque = deque(maxlen=1000)
+
+    def record(self, seconds: float):
+        self.checkouts += 1
+        self.waits.append(seconds)
+        self.max_wait = max(self.max_wait, seconds)
+        if seconds > SLOW_POOL_WAIT_SECONDS:
+            self.slow_waits += 1
+
+    def snapshot(self, pool) -> dict:
+        waits = sorted(self.waits)
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "slow_waits": self.slow_waits,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 3) if waits else None,
+                "p95": round(waits[int(len(waits) * 0.95) - 1] * 1000, 3) if waits else None,
+                "max": round(self.max_wait * 1000, 3)
+            }
+        }
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording checkout wait times (kept across pool.recreate())"""
+
+    stats: PoolWaitStats = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            self.stats.record(time.perf_counter() - started)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+def _timed_pool(name: str) -> type:
+    return type(f"TimedQueuePool[{name}]", (TimedQueuePool,), {"stats": PoolWaitStats(name)})
 
-# Create async engine with increased pool for analytics queries
+
+DATABASE_URL = settings.database_url.replace("postgresql://", "postgresql+asyncpg://")
+REPLICA_URLS = parse_database_urls(settings.database_replica_urls)
+# Reports read from the first replica unless pointed elsewhere
+ANALYTICS_DATABASE_URL = (
+    parse_database_urls(os.getenv("ANALYTICS_DATABASE_URL", "")) or REPLICA_URLS or [DATABASE_URL]
+)[0]
+
+# Create async engine for order taking and other transactional routes
 engine = create_async_engine(
-    settings.database_url.replace("postgresql://", "postgresql+asyncpg://"),
+    DATABASE_URL,
     echo=True if settings.environment == "development" else False,
     future=True,
     pool_pre_ping=True,
+    poolclass=_timed_pool("oltp"),
     pool_size=15,        # Increased from 10 (laptop-adjusted, production: 20)
     max_overflow=25,     # Increased from 20 (laptop-adjusted, production: 30)
     pool_timeout=30,     # Connection timeout
 )
 
-# Create async session factory
+
+def _read_engine(url: str, name: str):
+    """Engine whose transactions are read-only, so a misrouted write fails loudly"""
+    return create_async_engine(
+        url,
+        echo=True if settings.environment == "development" else False,
+        future=True,
+        pool_pre_ping=True,
+        poolclass=_timed_pool(name),
+        pool_size=READ_DB_POOL_SIZE,
+        max_overflow=READ_DB_MAX_OVERFLOW,
+        pool_timeout=30,
+        connect_args={"server_settings": {"default_transaction_read_only": "on"}},
+    )
+
+
+# Read-only routes: one engine per replica, or a read pool on the primary
+read_engines = (
+    [_read_engine(url, f"replica-{index}") for index, url in enumerate(REPLICA_URLS)]
+    or [_read_engine(DATABASE_URL, "read")]
+)
+
+# Separate, smaller engine for analytics and reports
+analytics_engine = create_async_engine(
+    ANALYTICS_DATABASE_URL,
+    echo=True if settings.environment == "development" else False,
+    future=True,
+    pool_pre_ping=True,
+    poolclass=_timed_pool("analytics"),
+    pool_size=ANALYTICS_DB_POOL_SIZE,
+    max_overflow=ANALYTICS_DB_MAX_OVERFLOW,
+    pool_timeout=ANALYTICS_DB_POOL_TIMEOUT,
+    connect_args={
+        "server_settings": {
+            "statement_timeout": str(ANALYTICS_STATEMENT_TIMEOUT_MS),
+            "application_name": "order-service-analytics",
+            "default_transaction_read_only": "on",
+        }
+    },
+)
+
+# Create async session factories
 async_session_maker = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -25,18 +158,43 @@ async_session_maker = async_sessionmaker(
     autoflush=False,
 )
 
+read_session_makers = [
+    async_sessionmaker(
+        read_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+    for read_engine in read_engines
+]
+
+read_router = ReadRouter(
+    read_session_makers if REPLICA_URLS else [],
+    read_session_makers[0]
+)
+
+analytics_session_maker = async_sessionmaker(
+    analytics_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+)
+
 # Base class for models
 Base = declarative_base()
 
 
 async def get_db() -> AsyncSession:
     """
-    Dependency for getting database session
+    Dependency for getting database session (write routes, primary)
     """
     async with async_session_maker() as session:
         try:
             yield session
             await session.commit()
+            await read_router.record_write_lsn(session)
         except Exception:
             await session.rollback()
             raise
@@ -44,6 +202,42 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+async def get_read_db() -> AsyncSession:
+    """
+    Dependency for getting a read-only session (replica, never commits)
+    """
+    session = await read_router.open_session()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_analytics_db() -> AsyncSession:
+    """
+    Dependency for getting a read-only analytics session
+    """
+    async with analytics_session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+def get_pool_stats() -> dict:
+    """Checkout wait times and usage of each pool, plus read routing counts"""
+    stats = {
+        pool.stats.name: pool.stats.snapshot(pool)
+        for pool in [
+            engine.sync_engine.pool,
+            analytics_engine.sync_engine.pool,
+            *(read_engine.sync_engine.pool for read_engine in read_engines)
+        ]
+    }
+    stats["read_routing"] = dict(read_router.stats)
+    return stats
+
+
 async def init_db():
     """
     Initialize database tables
@@ -60,3 +254,6 @@ async def close_db():
     Close database connections
     """
     await engine.dispose()
+    await analytics_engine.dispose()
+    for read_engine in read_engines:
+        await read_engine.dispose()
@@ -0,0 +1,196 @@
+"""
+RabbitMQ publisher for order lifecycle events
+Publishes compact versioned events to the "orders" exchange without blocking requests
+"""
+import aio_pika
+import asyncio
+import json
+import os
+import random
+from collections import deque
+from typing import Any, Dict, List, Optional
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("event-publisher")
+
+# Events held in memory while the broker is slow or unreachable
+EVENT_BUFFER_SIZE = int(os.getenv("ORDER_EVENT_BUFFER_SIZE", "10000"))
+# Micro-batch limits
+EVENT_BATCH_SIZE = int(os.getenv("ORDER_EVENT_BATCH_SIZE", "100"))
+EVENT_BATCH_WINDOW = float(os.getenv("ORDER_EVENT_BATCH_WINDOW", "0.02"))
+# Seconds to wait for a publisher confirm
+CONFIRM_TIMEOUT = float(os.getenv("ORDER_EVENT_CONFIRM_TIMEOUT", "5"))
+
+RECONNECT_BACKOFF_INITIAL = 1.0
+RECONNECT_BACKOFF_MAX = 30.0
+
+
+class OrderEventPublisher:
+    """
+    Buffers order lifecycle events and publishes them in micro-batches
+
+    publish() only appends to an in-memory buffer, so request handlers never
+    wait on the broker. A background task drains the buffer over one
+    long-lived channel with publisher confirms; events that are not confirmed
+    go back to the front of the buffer and are retried.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = EVENT_BUFFER_SIZE,
+        batch_size: int = EVENT_BATCH_SIZE,
+        batch_window: float = EVENT_BATCH_WINDOW
+    ):
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self.exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self.rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq-service")
+        self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
+        self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
+
+        self.buffer: deque = deque()
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.events_published = 0
+        self.events_confirmed = 0
+        self.events_failed = 0
+        self.events_dropped = 0
+        self.batches = 0
+
+    def publish(self, event: Dict[str, Any]):
+        """Queue an event for publishing; never blocks"""
+        if len(self.buffer) >= self.buffer_size:
+            self.buffer.popleft()
+            self.events_dropped += 1
+            logger.warning("Order event buffer full, dropped oldest event")
+
+        self.buffer.append(event)
+        self.events_published += 1
+
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self):
+        """Start the background publishing task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("Order event publisher started")
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush what can be flushed within timeout, then close the connection"""
+        if self.buffer and self.exchange:
+            try:
+                async with asyncio.timeout(timeout):
+                    while self.buffer:
+                        await self._publish_next_batch()
+            except Exception as e:
+                logger.warning(f"Shutting down with {len(self.buffer)} unpublished order events: {e}")
+
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        try:
+            if self.connection:
+                await self.connection.close()
+                logger.info("Order event publisher connection closed")
+        except Exception as e:
+            logger.error(f"Error closing publisher connection: {e}")
+
+    async def _connect(self):
+        """Open the long-lived connection and confirm-mode channel"""
+        self.connection = await aio_pika.connect_robust(
+            f"amqp://{self.rabbitmq_user}:{self.rabbitmq_password}@{self.rabbitmq_host}/"
+        )
+        self.channel = await self.connection.channel(publisher_confirms=True)
+        self.exchange = await self.channel.declare_exchange(
+            "orders",
+            aio_pika.ExchangeType.TOPIC,
+            durable=True
+        )
+        logger.info("Order event publisher connected to RabbitMQ")
+
+    async def _run(self):
+        """Keep publishing, reconnecting with exponential backoff on failure"""
+        backoff = RECONNECT_BACKOFF_INITIAL
+        while True:
+            try:
+                if self.connection is None or self.connection.is_closed:
+                    await self._connect()
+                backoff = RECONNECT_BACKOFF_INITIAL
+                await self._flush_loop()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Order event publisher error: {e}")
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    async def _flush_loop(self):
+        """Wait for a full batch or the batch window, then publish"""
+        while True:
+            if len(self.buffer) < self.batch_size:
+                try:
+                    async with asyncio.timeout(self.batch_window):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            while self.buffer:
+                await self._publish_next_batch()
+
+    async def _publish_next_batch(self):
+        """Publish up to batch_size events and wait for all confirms together"""
+        count = min(self.batch_size, len(self.buffer))
+        batch: List[Dict[str, Any]] = [self.buffer.popleft() for _ in range(count)]
+
+        results = await asyncio.gather(
+            *(self._publish_one(event) for event in batch),
+            return_exceptions=True
+        )
+        self.batches += 1
+
+        failed = [event for event, result in zip(batch, results) if isinstance(result, BaseException)]
+        self.events_confirmed += len(batch) - len(failed)
+
+        if failed:
+            self.events_failed += len(failed)
+            # Retry unconfirmed events first, keeping their original order
+            self.buffer.extendleft(reversed(failed))
+            error = next(r for r in results if isinstance(r, BaseException))
+            raise RuntimeError(f"{len(failed)} of {len(batch)} order events not confirmed: {error}")
+
+    async def _publish_one(self, event: Dict[str, Any]):
+        routing_key = f"{event['event']}.{event['restaurant_id']}"
+        await self.exchange.publish(
+            aio_pika.Message(
+                body=json.dumps(event, default=str).encode(),
+                content_type="application/json",
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                message_id=event.get("event_id"),
+                type=event["event"]
+            ),
+            routing_key=routing_key,
+            timeout=CONFIRM_TIMEOUT
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            "connected": bool(self.connection and not self.connection.is_closed),
+            "buffered": len(self.buffer),
+            "events_published": self.events_published,
+            "events_confirmed": self.events_confirmed,
+            "events_failed": self.events_failed,
+            "events_dropped": self.events_dropped,
+            "batches": self.batches
+        }
+
+
+# Global publisher instance
+order_event_publisher = OrderEventPublisher()
@@ -6,12 +6,22 @@ from fastapi import FastAPI, status, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import asyncio
+import json
+import os
 from shared.config.settings import settings
 from shared.utils.logger import setup_logger
-from .database import init_db, close_db
+from shared.utils.db_routing import ReadYourWritesMiddleware
+from .database import init_db, close_db, get_pool_stats
 from .routes import orders, sessions, assistance, analytics
-from .websocket import manager
-from .rabbitmq_consumer import start_consumer
+from .websocket import manager, SubscriptionFilter
+from .rabbitmq_consumer import start_consumer, consumer
+from .event_publisher import order_event_publisher
+from .services.analytics_cache import analytics_cache, invalidation_consumer
+from .services.analytics_snapshots import snapshot_store, snapshot_exporter
+from .services.analytics_sketches import sketch_builder
+from .services.trending_items import trending_tracker
+from .services.live_kpis import live_kpis
+from .utils.cancel_on_disconnect import CancelOnDisconnectMiddleware
 
 # Setup logger
 logger = setup_logger("order-service", settings.log_level, settings.log_format)
@@ -26,13 +36,39 @@ async def lifespan(app: FastAPI):
     logger.info("Database initialized")
 
     # Start RabbitMQ consumer in background
-    asyncio.create_task(start_consumer())
+    consumer_task = asyncio.create_task(start_consumer())
     logger.info("RabbitMQ consumer started")
 
+    # Start order lifecycle event publisher
+    await order_event_publisher.start()
+
+    # Order events invalidate cached analytics and feed trending items and live KPIs
+    invalidation_consumer.listeners.append(trending_tracker.handle_event)
+    invalidation_consumer.listeners.append(live_kpis.handle_event)
+    await invalidation_consumer.start()
+    try:
+        await trending_tracker.seed()
+    except Exception as e:
+        logger.error(f"Trending items not seeded: {e}")
+    await live_kpis.start()
+
+    # Keep the columnar snapshots for long-range analytics up to date
+    await snapshot_exporter.start()
+
+    # Keep the daily sketches behind approx=true analytics up to date
+    await sketch_builder.start()
+
     yield
 
     # Shutdown
     logger.info("Shutting down Order Service...")
+    await order_event_publisher.stop()
+    await invalidation_consumer.close()
+    await snapshot_exporter.stop()
+    await sketch_builder.stop()
+    await live_kpis.stop()
+    consumer_task.cancel()
+    await consumer.close()
     await close_db()
     logger.info("Database connections closed")
 
@@ -56,6 +92,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Abandoned analytics requests cancel their queries
+app.add_middleware(CancelOnDisconnectMiddleware, path_fragments=["/analytics"])
+
+# Reads after a client's own write (e.g. tracking a new order) wait for replicas
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Include routers
 app.include_router(
     orders.router,
@@ -101,24 +143,91 @@ async def health_check():
     }
 
 
+@app.get("/health/notifications", status_code=status.HTTP_200_OK)
+async def notifications_health():
+    """RabbitMQ consumer lag/latency, publisher and WebSocket fan-out counters"""
+    return {
+        "consumer": await consumer.get_stats(),
+        "publisher": order_event_publisher.get_stats(),
+        "websocket": manager.get_stats()
+    }
+
+
+@app.get("/health/analytics-cache", status_code=status.HTTP_200_OK)
+async def analytics_cache_health():
+    """Analytics cache hit rates per endpoint and invalidation counters"""
+    return {
+        **analytics_cache.get_stats(),
+        "events_received": invalidation_consumer.events_received
+    }
+
+
+@app.get("/health/analytics-snapshots", status_code=status.HTTP_200_OK)
+async def analytics_snapshots_health():
+    """Columnar snapshot coverage and how analytics queries were routed"""
+    return snapshot_store.get_stats()
+
+
+@app.get("/health/trending-items", status_code=status.HTTP_200_OK)
+async def trending_items_health():
+    """Trending items tracker size and event counters"""
+    return trending_tracker.get_stats()
+
+
+@app.get("/health/live-kpis", status_code=status.HTTP_200_OK)
+async def live_kpis_health():
+    """Live KPI aggregator size, event and seed counters"""
+    return live_kpis.get_stats()
+
+
+@app.get("/health/db-pools", status_code=status.HTTP_200_OK)
+async def db_pools_health():
+    """Connection pool usage and checkout wait times (OLTP and analytics)"""
+    return get_pool_stats()
+
+
+def _is_truthy(value) -> bool:
+    """Interpret a query-string or JSON flag"""
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
 @app.websocket("/ws/orders/{restaurant_id}")
 async def websocket_endpoint(websocket: WebSocket, restaurant_id: str):
     """
     WebSocket endpoint for real-time order notifications
     Clients connect to receive instant notifications when new orders arrive
+
+    Optional query parameters narrow the feed (comma-separated values):
+    events, order_types, categories, tables, and compact=true for delta payloads.
+    Filters can be changed later by sending
+    {"action": "subscribe", "filters": {...}, "compact": true} or {"action": "unsubscribe"}.
+
+    Every event carries a per-restaurant "seq". After a dropped connection,
+    reconnect with last_seq (and the stream id from the welcome message) to
+    receive only the missed events; a resync_required message means the gap
+    is too old and full order lists must be reloaded.
     """
-    await manager.connect(websocket, restaurant_id)
+    params = websocket.query_params
+    subscription = SubscriptionFilter.from_dict(dict(params))
+    compact = _is_truthy(params.get("compact", "false"))
+
+    # Reconnecting clients pass the last seq (and stream) they saw to get missed events replayed
+    last_seq = params.get("last_seq")
+    last_seq = int(last_seq) if last_seq and last_seq.isdigit() else None
+
+    # Sends the welcome message, then any replayed events
+    await manager.connect(
+        websocket,
+        restaurant_id,
+        subscription,
+        compact,
+        last_seq=last_seq,
+        stream_id=params.get("stream")
+    )
 
     try:
-        # Send welcome message
-        await manager.send_personal_message(
-            {
-                "type": "connection",
-                "message": f"Connected to order notifications for restaurant {restaurant_id}",
-                "restaurant_id": restaurant_id
-            },
-            websocket
-        )
+        # Inside the try so the finally releases it even if binding fails
+        await consumer.subscribe_restaurant(restaurant_id)
 
         # Keep connection alive and handle incoming messages
         while True:
@@ -128,13 +237,42 @@ async def websocket_endpoint(websocket: WebSocket, restaurant_id: str):
             # Echo heartbeat/ping messages
             if data == "ping":
                 await manager.send_personal_message({"type": "pong"}, websocket)
+                continue
+
+            try:
+                command = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+
+            if not isinstance(command, dict):
+                continue
+
+            action = command.get("action")
+            if action in ("subscribe", "unsubscribe"):
+                if action == "subscribe":
+                    subscription = SubscriptionFilter.from_dict(command.get("filters"))
+                else:
+                    subscription = SubscriptionFilter()
+
+                compact_flag = command.get("compact")
+                manager.update_subscription(
+                    websocket,
+                    restaurant_id,
+                    subscription,
+                    None if compact_flag is None else _is_truthy(compact_flag)
+                )
+                await manager.send_personal_message(
+                    {"type": "subscribed", "filters": subscription.to_dict()},
+                    websocket
+                )
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, restaurant_id)
         logger.info(f"WebSocket client disconnected from restaurant {restaurant_id}")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
+    finally:
         manager.disconnect(websocket, restaurant_id)
+        await consumer.unsubscribe_restaurant(restaurant_id)
 
 
 if __name__ == "__main__":
@@ -144,5 +282,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8004,
         reload=True if settings.environment == "development" else False,
-        log_level=settings.log_level.lower()
+        log_level=settings.log_level.lower(),
+        ws_per_message_deflate=_is_truthy(os.getenv("WS_PER_MESSAGE_DEFLATE", "true"))
     )
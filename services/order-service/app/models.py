@@ -2,7 +2,7 @@
 Database models for Order Service
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey, Enum as SQLEnum, Index
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Float, Text, LargeBinary, ForeignKey, Enum as SQLEnum, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 import uuid
@@ -25,6 +25,8 @@ class Order(Base):
     order_number = Column(String(50), unique=True, nullable=False, index=True)
     status = Column(SQLEnum(OrderStatus), default=OrderStatus.PENDING, nullable=False, index=True)
     order_type = Column(SQLEnum(OrderType), nullable=False, server_default='TABLE', index=True)
+    # Client-supplied key (e.g. a platform order id); a repeated create returns this order
+    idempotency_key = Column(String(255), nullable=True, unique=True)
 
     # Customer info
     customer_id = Column(UUID(as_uuid=True), nullable=True, index=True)  # Soft reference (no FK)
@@ -178,3 +180,83 @@ class CustomerItemPreference(Base):
 
     def __repr__(self):
         return f"<CustomerItemPreference(customer={self.customer_identifier}, item={self.menu_item_id}, orders={self.order_count})>"
+
+
+class HourlyRestaurantRollup(Base):
+    """
+    Orders and revenue of one restaurant per hour and order type
+
+    Maintained in the same transaction as the order writes it summarises
+    (see services/analytics_rollups.py). Orders are bucketed by created_at;
+    cancelled orders are excluded from order_count and revenue.
+    """
+
+    __tablename__ = "analytics_hourly_restaurant"
+
+    restaurant_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Hour start (UTC)
+    order_type = Column(String(20), primary_key=True)
+
+    order_count = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0.0, nullable=False)
+    item_quantity = Column(Integer, default=0, nullable=False)
+    completed_count = Column(Integer, default=0, nullable=False)
+    cancelled_count = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<HourlyRestaurantRollup(restaurant={self.restaurant_id}, bucket={self.bucket}, orders={self.order_count})>"
+
+
+class HourlyItemRollup(Base):
+    """Quantity and revenue of one menu item per hour and order type (cancelled orders excluded)"""
+
+    __tablename__ = "analytics_hourly_item"
+
+    restaurant_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    menu_item_id = Column(UUID(as_uuid=True), primary_key=True)
+    order_type = Column(String(20), primary_key=True)
+
+    item_name = Column(String(255), nullable=False)  # Latest snapshot of the name
+    quantity = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0.0, nullable=False)  # item_price * quantity, before tax
+    order_count = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index('idx_hourly_item_restaurant_bucket', 'restaurant_id', 'bucket'),
+    )
+
+    def __repr__(self):
+        return f"<HourlyItemRollup(item={self.item_name}, bucket={self.bucket}, qty={self.quantity})>"
+
+
+class DailySketch(Base):
+    """
+    Mergeable summaries of one restaurant's day for approximate analytics
+
+    Built from orders and analytics_hourly_item once the day is over (see
+    services/analytics_sketches.py). source_orders and source_updated_at
+    record the orders the sketch was built from, so late changes trigger
+    a rebuild. Cancelled orders are excluded.
+    """
+
+    __tablename__ = "analytics_daily_sketches"
+
+    restaurant_id = Column(UUID(as_uuid=True), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    customers_hll = Column(LargeBinary, nullable=False)  # HyperLogLog registers of customer identities
+    identified_orders = Column(Integer, default=0, nullable=False)  # Orders with a customer identity
+    identified_revenue = Column(Float, default=0.0, nullable=False)
+    top_items = Column(JSONB, default=list, nullable=False)  # [menu_item_id, item_name, quantity, revenue, order_count]
+    top_items_threshold = Column(Integer, default=0, nullable=False)  # Quantity of the last kept item if truncated, else 0
+
+    source_orders = Column(Integer, default=0, nullable=False)
+    source_updated_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_daily_sketches_day', 'day'),
+    )
+
+    def __repr__(self):
+        return f"<DailySketch(restaurant={self.restaurant_id}, day={self.day})>"
@@ -0,0 +1,123 @@
+"""
+In-process pub/sub for per-order status events
+Feeds Server-Sent Events streams used by customer order tracking
+"""
+from typing import Dict, Set, Optional, Any, List
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import uuid
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("order-events")
+
+# Terminal statuses end the customer's tracking stream
+TERMINAL_STATUSES = {"completed", "cancelled"}
+
+# Bump when a field is removed or changes meaning; adding fields is compatible
+EVENT_VERSION = 1
+
+# Recently delivered event ids, so an event published locally and then
+# received back from RabbitMQ reaches subscribers only once
+SEEN_EVENT_IDS = 1024
+
+
+class OrderEventBroker:
+    """Fans out order status events to subscribers waiting on a single order"""
+
+    def __init__(self, queue_size: int = 16):
+        # Store subscriber queues by order_id
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.queue_size = queue_size
+        self.seen_event_ids: OrderedDict = OrderedDict()
+
+    def subscribe(self, order_id: str) -> asyncio.Queue:
+        """Register a subscriber for an order and return its event queue"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(order_id, set()).add(queue)
+        logger.debug(f"Subscriber added for order {order_id}. Total: {len(self.subscribers[order_id])}")
+        return queue
+
+    def unsubscribe(self, order_id: str, queue: asyncio.Queue):
+        """Remove a subscriber queue"""
+        if order_id in self.subscribers:
+            self.subscribers[order_id].discard(queue)
+
+            # Clean up empty sets
+            if not self.subscribers[order_id]:
+                del self.subscribers[order_id]
+
+    def publish(self, order_id: str, event: Dict[str, Any]):
+        """
+        Deliver an event to every subscriber of an order
+
+        Never blocks: a subscriber that has fallen behind loses its oldest
+        event, since only the latest status matters for tracking.
+        """
+        event_id = event.get("event_id")
+        if event_id:
+            if event_id in self.seen_event_ids:
+                return
+            self.seen_event_ids[event_id] = None
+            if len(self.seen_event_ids) > SEEN_EVENT_IDS:
+                self.seen_event_ids.popitem(last=False)
+
+        queues = self.subscribers.get(order_id)
+        if not queues:
+            return
+
+        for queue in list(queues):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(event)
+
+        logger.debug(f"Published {event.get('event')} to {len(queues)} subscribers of order {order_id}")
+
+    def subscriber_count(self, order_id: Optional[str] = None) -> int:
+        """Number of subscribers for one order, or across all orders"""
+        if order_id is not None:
+            return len(self.subscribers.get(order_id, ()))
+        return sum(len(queues) for queues in self.subscribers.values())
+
+
+def build_order_event(
+    order,
+    event: str = "order.status_changed",
+    previous_status: Optional[Any] = None,
+    items: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Build the compact versioned event for an order lifecycle transition
+
+    The same payload is published to RabbitMQ and sent to order tracking
+    clients. items is only included where consumers need the order contents
+    (order.created).
+    """
+    order_status = getattr(order.status, "value", order.status)
+    payload = {
+        "v": EVENT_VERSION,
+        "event_id": uuid.uuid4().hex,
+        "event": event,
+        "order_id": str(order.id),
+        "order_number": order.order_number,
+        "restaurant_id": str(order.restaurant_id),
+        "table_id": str(order.table_id) if order.table_id else None,
+        "order_type": getattr(order.order_type, "name", order.order_type),
+        "status": order_status,
+        "previous_status": getattr(previous_status, "value", previous_status),
+        "total": order.total,
+        "updated_at": order.updated_at.isoformat() if order.updated_at else None,
+        "completed_at": order.completed_at.isoformat() if order.completed_at else None,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    if items is not None:
+        payload["items"] = items
+        payload["categories"] = sorted({item["category"] for item in items if item.get("category")})
+    return payload
+
+
+# Global broker instance
+order_event_broker = OrderEventBroker()
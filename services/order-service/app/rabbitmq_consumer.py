@@ -1,36 +1,162 @@
 """
 RabbitMQ consumer for order notifications
 Listens for order events and broadcasts them via WebSocket
+
+Every replica consumes from its own exclusive queue and binds it only to the
+restaurants it currently serves, so a notification reaches every replica that
+holds connections for that restaurant instead of one competing consumer.
 """
 import aio_pika
 import json
 import asyncio
 import os
-from typing import Optional
+import random
+import socket
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Set
 from shared.utils.logger import setup_logger
 from .websocket import manager
+from .order_events import order_event_broker
 
 logger = setup_logger("rabbitmq-consumer")
 
+# Seconds a restaurant stays bound after its last subscriber leaves, so clients
+# reconnecting after a brief network drop can replay what they missed
+UNBIND_GRACE_SECONDS = float(os.getenv("WS_UNBIND_GRACE_SECONDS", "60"))
+# Attempts to bind a restaurant before the subscriber is refused
+BIND_ATTEMPTS = 3
+BIND_RETRY_DELAY = 0.5
+
+# Consumer tuning
+CONSUMER_CONCURRENCY = int(os.getenv("RABBITMQ_CONSUMER_CONCURRENCY", "4"))
+PREFETCH_COUNT = int(os.getenv("RABBITMQ_PREFETCH_COUNT", "100"))
+ACK_BATCH_SIZE = int(os.getenv("RABBITMQ_ACK_BATCH_SIZE", "25"))
+ACK_FLUSH_INTERVAL = float(os.getenv("RABBITMQ_ACK_FLUSH_INTERVAL", "0.25"))
+
+# Supervisor restart backoff (seconds)
+RESTART_BACKOFF_INITIAL = float(os.getenv("RABBITMQ_RESTART_BACKOFF_INITIAL", "1"))
+RESTART_BACKOFF_MAX = float(os.getenv("RABBITMQ_RESTART_BACKOFF_MAX", "60"))
+# A run lasting this long counts as healthy and resets the backoff
+RESTART_BACKOFF_RESET_AFTER = 30.0
+
+
+class AckBatcher:
+    """
+    Acknowledges processed messages in batches
+
+    Messages may finish out of order across workers, so only the longest
+    prefix of finished deliveries is acknowledged, with a single
+    multiple=True ack for the last one.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.in_flight: "OrderedDict[int, bool]" = OrderedDict()
+        self.messages: Dict[int, aio_pika.abc.AbstractIncomingMessage] = {}
+        self.ready = 0
+        self.acked = 0
+
+    def track(self, message: aio_pika.abc.AbstractIncomingMessage):
+        self.in_flight[message.delivery_tag] = False
+        self.messages[message.delivery_tag] = message
+
+    def complete(self, message: aio_pika.abc.AbstractIncomingMessage):
+        # Tags restart on a new channel: a message from the old one may share
+        # its tag with a newer delivery, so only the tracked message counts
+        if self.messages.get(message.delivery_tag) is message:
+            self.in_flight[message.delivery_tag] = True
+            self.ready += 1
+
+    def should_flush(self) -> bool:
+        return self.ready >= self.batch_size
+
+    async def flush(self):
+        """Ack every finished message at the head of the delivery order"""
+        last = None
+        count = 0
+        while self.in_flight:
+            tag, done = next(iter(self.in_flight.items()))
+            if not done:
+                break
+            self.in_flight.popitem(last=False)
+            last = self.messages.pop(tag)
+            count += 1
+
+        if last is None:
+            return
+
+        self.ready -= count
+        await last.ack(multiple=True)
+        self.acked += count
+
+    def reset(self):
+        """Forget deliveries from a closed channel; the broker redelivers them"""
+        self.in_flight.clear()
+        self.messages.clear()
+        self.ready = 0
+
 
 class OrderNotificationConsumer:
     """Consumes order notification events from RabbitMQ and broadcasts via WebSocket"""
 
+    # Routing keys bound per served restaurant
+    ROUTING_KEY_PATTERNS = ["order.*.{restaurant_id}"]
+
     def __init__(self):
         self.connection: Optional[aio_pika.Connection] = None
         self.channel: Optional[aio_pika.Channel] = None
+        self.exchange: Optional[aio_pika.Exchange] = None
+        self.queue: Optional[aio_pika.Queue] = None
         self.rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq-service")
         self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
         self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
 
+        # Queue private to this replica, removed by the broker when it disconnects
+        self.queue_name = f"order_notifications.{socket.gethostname()}.{uuid.uuid4().hex[:8]}"
+
+        # Number of local subscribers (WebSockets, SSE streams) per restaurant
+        self.restaurant_refs: Dict[str, int] = {}
+        # Restaurants whose routing keys are bound to the current queue
+        self.bound_restaurants: Set[str] = set()
+        self._pending_unbinds: Dict[str, asyncio.Task] = {}
+        self._binding_lock = asyncio.Lock()
+
+        # Worker pool; each restaurant always maps to the same worker so its
+        # events keep their order while different restaurants drain in parallel
+        self.concurrency = max(1, CONSUMER_CONCURRENCY)
+        self.prefetch_count = PREFETCH_COUNT
+        self.acks = AckBatcher(ACK_BATCH_SIZE)
+        self._worker_queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+
+        # Metrics
+        self.messages_processed = 0
+        self.messages_failed = 0
+        self.redeliveries = 0
+        self.restarts = 0
+        self.discarded = 0
+        self.latencies: deque = deque(maxlen=1000)
+
     async def connect(self):
         """Connect to RabbitMQ"""
         try:
+            # Drop a previous connection so its exclusive queue is released
+            if self.connection:
+                if not self.connection.is_closed:
+                    await self.connection.close()
+                # Notifications published in between were lost with the old queue
+                manager.reset_all_streams()
+            self.queue = None
+            self.bound_restaurants.clear()
+
             self.connection = await aio_pika.connect_robust(
                 f"amqp://{self.rabbitmq_user}:{self.rabbitmq_password}@{self.rabbitmq_host}/"
             )
+            self.connection.reconnect_callbacks.add(self._on_reconnect)
             self.channel = await self.connection.channel()
-            await self.channel.set_qos(prefetch_count=10)
+            await self.channel.set_qos(prefetch_count=self.prefetch_count)
 
             logger.info("Connected to RabbitMQ successfully")
         except Exception as e:
@@ -47,51 +173,283 @@ class OrderNotificationConsumer:
                 durable=True
             )
 
-            # Declare queue
+            # Declare this replica's exclusive queue
             queue = await self.channel.declare_queue(
-                "order_notifications",
-                durable=True
+                self.queue_name,
+                exclusive=True,
+                auto_delete=True
             )
 
-            # Bind queue to exchange with routing key pattern
-            await queue.bind(exchange, routing_key="order.created.*")
+            self.exchange = exchange
+            self.queue = queue
+
+            # Bind restaurants that gained subscribers before the queue existed
+            for restaurant_id in list(self.restaurant_refs):
+                await self._bind_restaurant(restaurant_id)
 
-            logger.info("Starting to consume order notifications...")
+            logger.info(f"Starting to consume order notifications on {self.queue_name} with {self.concurrency} workers...")
 
-            # Start consuming messages
-            async with queue.iterator() as queue_iter:
-                async for message in queue_iter:
-                    async with message.process():
-                        await self.process_message(message)
+            self._start_workers()
+            flusher = asyncio.create_task(self._flush_acks_periodically())
+
+            try:
+                # Dispatch messages to workers; acks are sent in batches
+                async with queue.iterator() as queue_iter:
+                    async for message in queue_iter:
+                        self.acks.track(message)
+                        if message.redelivered:
+                            self.redeliveries += 1
+                        await self._worker_queues[self._worker_index(message)].put(message)
+            finally:
+                flusher.cancel()
+                await self._stop_workers()
 
         except Exception as e:
             logger.error(f"Error in consuming loop: {e}")
             raise
 
-    async def process_message(self, message: aio_pika.IncomingMessage):
-        """Process a single notification message"""
+    def _worker_index(self, message: aio_pika.abc.AbstractIncomingMessage) -> int:
+        """Pick a worker from the restaurant id at the end of the routing key"""
+        restaurant_key = (message.routing_key or "").rsplit(".", 1)[-1]
+        return hash(restaurant_key) % self.concurrency
+
+    def _start_workers(self):
+        self._worker_queues = [asyncio.Queue() for _ in range(self.concurrency)]
+        self._workers = [
+            asyncio.create_task(self._worker(queue))
+            for queue in self._worker_queues
+        ]
+
+    async def _stop_workers(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._worker_queues = []
+        self.acks.reset()
+
+    def _discard_dispatched(self):
+        """Drop messages from a closed channel that workers have not started; the broker redelivers them"""
+        for queue in self._worker_queues:
+            while not queue.empty():
+                queue.get_nowait()
+                self.discarded += 1
+
+    async def _worker(self, queue: asyncio.Queue):
+        """Process dispatched messages one at a time"""
+        while True:
+            message = await queue.get()
+            started = time.perf_counter()
+            try:
+                await self.process_message(message)
+                self.messages_processed += 1
+            except Exception as e:
+                self.messages_failed += 1
+                logger.error(f"Worker failed to process message: {e}")
+            finally:
+                self.latencies.append(time.perf_counter() - started)
+                self.acks.complete(message)
+
+            if self.acks.should_flush():
+                await self._flush_acks()
+
+    async def _flush_acks(self):
         try:
-            body = message.body.decode()
-            notification = json.loads(body)
+            await self.acks.flush()
+        except Exception as e:
+            # Channel closed: unacked deliveries will be redelivered by the broker
+            logger.error(f"Failed to acknowledge messages: {e}")
+            self.acks.reset()
+
+    async def _flush_acks_periodically(self):
+        """Ack stragglers during quiet periods so the prefetch window never stalls"""
+        while True:
+            await asyncio.sleep(ACK_FLUSH_INTERVAL)
+            await self._flush_acks()
+
+    async def run(self):
+        """Supervise the consumer, restarting it with exponential backoff"""
+        backoff = RESTART_BACKOFF_INITIAL
+        while True:
+            started = time.monotonic()
+            try:
+                await self.connect()
+                await self.start_consuming()
+                logger.warning("Consumer stopped, restarting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Consumer failed: {e}")
+
+            self.restarts += 1
+            if time.monotonic() - started > RESTART_BACKOFF_RESET_AFTER:
+                backoff = RESTART_BACKOFF_INITIAL
+
+            delay = backoff * random.uniform(0.5, 1.0)
+            logger.info(f"Restarting RabbitMQ consumer in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def get_stats(self) -> dict:
+        """Consumer lag, processing latency and redelivery counters"""
+        broker_backlog = None
+        if self.connection and self.queue and not self.connection.is_closed:
+            # A failed passive declare closes its channel, so probe on a
+            # throwaway one rather than the channel the workers consume from
+            try:
+                probe = await self.connection.channel()
+                try:
+                    declared = await probe.declare_queue(self.queue_name, passive=True, robust=False)
+                    broker_backlog = declared.declaration_result.message_count
+                finally:
+                    if not probe.is_closed:
+                        await probe.close()
+            except Exception as e:
+                logger.warning(f"Could not read queue depth: {e}")
+
+        latencies = sorted(self.latencies)
+        local_backlog = sum(q.qsize() for q in self._worker_queues)
 
-            logger.info(f"Received notification: {notification.get('event')} for order {notification.get('order_number')}")
+        return {
+            "queue": self.queue_name,
+            "concurrency": self.concurrency,
+            "prefetch_count": self.prefetch_count,
+            "broker_backlog": broker_backlog,
+            "local_backlog": local_backlog,
+            "unacked": len(self.acks.in_flight),
+            "messages_processed": self.messages_processed,
+            "messages_failed": self.messages_failed,
+            "messages_acked": self.acks.acked,
+            "redeliveries": self.redeliveries,
+            "discarded": self.discarded,
+            "restarts": self.restarts,
+            "latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+                "p95": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3) if latencies else None,
+                "max": round(latencies[-1] * 1000, 3) if latencies else None
+            },
+            "restaurants_bound": len(self.bound_restaurants)
+        }
 
-            # Extract restaurant_id from routing key or payload
-            restaurant_id = notification.get("restaurant_id")
+    def _on_reconnect(self, *args):
+        """The robust connection came back; anything published meanwhile was missed"""
+        logger.warning("RabbitMQ connection restored, resetting notification streams")
+        # Delivery tags restart on the new channel
+        self._discard_dispatched()
+        self.acks.reset()
+        manager.reset_all_streams()
+
+    async def subscribe_restaurant(self, restaurant_id: str):
+        """Register a local subscriber, binding the restaurant on first use"""
+        count = self.restaurant_refs.get(restaurant_id, 0)
+        self.restaurant_refs[restaurant_id] = count + 1
+
+        # Still bound from a subscriber that left moments ago
+        pending = self._pending_unbinds.pop(restaurant_id, None)
+        if pending:
+            pending.cancel()
+
+        # Also retries a bind that failed for an earlier subscriber
+        if restaurant_id not in self.bound_restaurants:
+            await self._bind_restaurant(restaurant_id)
+
+    async def unsubscribe_restaurant(self, restaurant_id: str):
+        """Release a local subscriber, unbinding the restaurant when none remain"""
+        count = self.restaurant_refs.get(restaurant_id, 0) - 1
+
+        if count > 0:
+            self.restaurant_refs[restaurant_id] = count
+            return
+
+        self.restaurant_refs.pop(restaurant_id, None)
+
+        if UNBIND_GRACE_SECONDS > 0:
+            self._pending_unbinds[restaurant_id] = asyncio.create_task(
+                self._delayed_unbind(restaurant_id)
+            )
+        else:
+            await self._unbind_restaurant(restaurant_id)
 
-            if not restaurant_id:
-                logger.warning("No restaurant_id in notification, skipping")
+    async def _delayed_unbind(self, restaurant_id: str):
+        """Unbind a restaurant once the grace period passes without a new subscriber"""
+        await asyncio.sleep(UNBIND_GRACE_SECONDS)
+        self._pending_unbinds.pop(restaurant_id, None)
+        await self._unbind_restaurant(restaurant_id)
+
+    async def _bind_restaurant(self, restaurant_id: str):
+        """
+        Bind this replica's queue to a restaurant's routing keys
+        Raises if binding keeps failing, so the subscriber is not left
+        waiting on a stream that gets no events.
+        """
+        async with self._binding_lock:
+            # Subscribers may have left (or another bound it) while waiting for the lock
+            if not self.queue or restaurant_id not in self.restaurant_refs or restaurant_id in self.bound_restaurants:
+                return
+            for attempt in range(1, BIND_ATTEMPTS + 1):
+                try:
+                    for pattern in self.ROUTING_KEY_PATTERNS:
+                        await self.queue.bind(self.exchange, routing_key=pattern.format(restaurant_id=restaurant_id))
+                    self.bound_restaurants.add(restaurant_id)
+                    logger.info(f"Subscribed to notifications for restaurant {restaurant_id}")
+                    return
+                except Exception as e:
+                    if attempt == BIND_ATTEMPTS:
+                        logger.error(f"Failed to bind restaurant {restaurant_id}: {e}")
+                        raise
+                    logger.warning(f"Binding restaurant {restaurant_id} failed (attempt {attempt}): {e}")
+                    await asyncio.sleep(BIND_RETRY_DELAY * attempt)
+
+    async def _unbind_restaurant(self, restaurant_id: str):
+        """Remove a restaurant's routing keys from this replica's queue"""
+        async with self._binding_lock:
+            # A new subscriber may have arrived while waiting for the lock
+            if restaurant_id in self.restaurant_refs:
                 return
 
-            # Broadcast to all WebSocket clients connected to this restaurant
-            await manager.broadcast_to_restaurant(notification, str(restaurant_id))
+            # Events stop arriving from here on, so replay history is no longer complete
+            manager.reset_stream(restaurant_id)
+            self.bound_restaurants.discard(restaurant_id)
 
-            logger.info(f"Notification broadcasted for order {notification.get('order_number')}")
+            if not self.queue:
+                return
+            try:
+                for pattern in self.ROUTING_KEY_PATTERNS:
+                    await self.queue.unbind(self.exchange, routing_key=pattern.format(restaurant_id=restaurant_id))
+                logger.info(f"Unsubscribed from notifications for restaurant {restaurant_id}")
+            except Exception as e:
+                logger.error(f"Failed to unbind restaurant {restaurant_id}: {e}")
 
+    async def process_message(self, message: aio_pika.IncomingMessage):
+        """
+        Process a single notification message
+        Errors propagate to the worker, which counts them as failed.
+        """
+        body = message.body.decode()
+        try:
+            notification = json.loads(body)
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in message: {e}")
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
+            raise
+
+        logger.info(f"Received notification: {notification.get('event')} for order {notification.get('order_number')}")
+
+        # Extract restaurant_id from routing key or payload
+        restaurant_id = notification.get("restaurant_id")
+
+        if not restaurant_id:
+            logger.warning("No restaurant_id in notification, skipping")
+            return
+
+        # Broadcast to all WebSocket clients connected to this restaurant
+        await manager.broadcast_to_restaurant(notification, str(restaurant_id))
+
+        logger.info(f"Notification broadcasted for order {notification.get('order_number')}")
+
+        # Push to customers tracking this order over SSE
+        order_id = notification.get("order_id")
+        if order_id:
+            order_event_broker.publish(str(order_id), notification)
 
     async def close(self):
         """Close RabbitMQ connection"""
@@ -108,12 +466,5 @@ consumer = OrderNotificationConsumer()
 
 
 async def start_consumer():
-    """Start the RabbitMQ consumer in the background"""
-    try:
-        await consumer.connect()
-        await consumer.start_consuming()
-    except Exception as e:
-        logger.error(f"Consumer failed: {e}")
-        # Retry after delay
-        await asyncio.sleep(5)
-        await start_consumer()
+    """Start the supervised RabbitMQ consumer in the background"""
+    await consumer.run()
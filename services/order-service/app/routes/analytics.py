@@ -2,16 +2,20 @@
 Analytics Routes for Order Service
 REST API endpoints for analytics and reporting
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
+import asyncio
+import time
 from datetime import date, timedelta
 from uuid import UUID
 
-from ..database import get_db
+from ..database import get_analytics_db
 from ..analytics_schemas.analytics import (
     RevenueAnalyticsResponse,
     PopularItemsResponse,
+    TrendingItemsResponse,
     DayPatternsResponse,
     CustomerPreferencesResponse,
     PredictionResponse,
@@ -24,7 +28,11 @@ from ..analytics_schemas.analytics import (
     CustomerBehaviorMetrics,
     AnalyticsErrorResponse
 )
-from ..services import analytics_service
+from ..services import analytics_service, analytics_engine, analytics_snapshots, analytics_sketches
+from ..services.analytics_cache import analytics_cache
+from ..services.trending_items import trending_tracker
+from ..services.live_kpis import live_kpis, KPI_PUSH_SECONDS
+from .orders import format_sse, SSE_KEEPALIVE_SECONDS
 from shared.utils.logger import setup_logger
 
 logger = setup_logger("analytics-routes")
@@ -46,8 +54,7 @@ async def get_revenue_analytics(
     restaurant_id: UUID,
     start_date: date = Query(..., description="Start date for analysis"),
     end_date: date = Query(..., description="End date for analysis"),
-    group_by: str = Query("daily", regex="^(daily|weekly|monthly)$", description="Grouping method"),
-    db: AsyncSession = Depends(get_db)
+    group_by: str = Query("daily", regex="^(daily|weekly|monthly)$", description="Grouping method")
 ):
     """
     Get revenue analytics with flexible grouping.
@@ -61,8 +68,9 @@ async def get_revenue_analytics(
     **Returns:** Revenue metrics grouped by period
     """
     try:
-        result = await analytics_service.get_revenue_analytics(
-            db, restaurant_id, start_date, end_date, group_by
+        result = await analytics_cache.get(
+            "revenue", restaurant_id, {"start_date": start_date, "end_date": end_date, "group_by": group_by},
+            lambda db: analytics_snapshots.get_revenue_analytics(db, restaurant_id, start_date, end_date, group_by)
         )
         return result
     except Exception as e:
@@ -87,7 +95,7 @@ async def get_popular_items(
     restaurant_id: UUID,
     days: int = Query(30, ge=1, le=365, description="Number of days to analyze"),
     limit: int = Query(10, ge=1, le=50, description="Maximum items to return"),
-    db: AsyncSession = Depends(get_db)
+    approx: bool = Query(False, description="Answer from daily sketches, with error bounds")
 ):
     """
     Get popular menu items ranked by sales with trend indicators.
@@ -96,12 +104,21 @@ async def get_popular_items(
     - **restaurant_id**: Restaurant UUID
     - **days**: Number of days to analyze (1-365)
     - **limit**: Maximum items to return (1-50)
+    - **approx**: Merge daily top-item summaries instead of scanning every hour
 
     **Returns:** List of popular items with sales metrics and trends
     """
     try:
-        items = await analytics_service.get_popular_items(
-            db, restaurant_id, days, limit
+        if approx:
+            result = await analytics_cache.get(
+                "popular_items_approx", restaurant_id, {"days": days, "limit": limit},
+                lambda db: analytics_sketches.get_popular_items(db, restaurant_id, days, limit)
+            )
+            return {"days": days, **result}
+
+        items = await analytics_cache.get(
+            "popular_items", restaurant_id, {"days": days, "limit": limit},
+            lambda db: analytics_service.get_popular_items(db, restaurant_id, days, limit)
         )
         return {
             "days": days,
@@ -115,6 +132,32 @@ async def get_popular_items(
         )
 
 
+@router.get(
+    "/restaurants/{restaurant_id}/analytics/trending",
+    response_model=TrendingItemsResponse,
+    summary="Get trending menu items",
+    description="Items ordered most in the last hour or so, from in-memory counters"
+)
+async def get_trending_items(
+    restaurant_id: UUID,
+    limit: int = Query(10, ge=1, le=50, description="Maximum items to return")
+):
+    """
+    Get items trending right now, for menu badges and the kitchen prep view.
+
+    **Parameters:**
+    - **restaurant_id**: Restaurant UUID
+    - **limit**: Maximum items to return (1-50)
+
+    **Returns:** Items ranked by recently ordered quantity, where each order
+    counts half as much after every half-life. Does not query the database.
+    """
+    return {
+        "half_life_minutes": trending_tracker.half_life / 60,
+        "items": trending_tracker.top(str(restaurant_id), limit)
+    }
+
+
 # ============================================================================
 # 3. Day-of-Week Patterns
 # ============================================================================
@@ -127,8 +170,7 @@ async def get_popular_items(
 )
 async def get_day_patterns(
     restaurant_id: UUID,
-    weeks: int = Query(8, ge=4, le=52, description="Number of weeks to analyze"),
-    db: AsyncSession = Depends(get_db)
+    weeks: int = Query(8, ge=4, le=52, description="Number of weeks to analyze")
 ):
     """
     Analyze sales patterns for each day of the week.
@@ -140,8 +182,9 @@ async def get_day_patterns(
     **Returns:** Sales patterns for Monday through Sunday
     """
     try:
-        patterns = await analytics_service.get_day_patterns(
-            db, restaurant_id, weeks
+        patterns = await analytics_cache.get(
+            "day_patterns", restaurant_id, {"weeks": weeks},
+            lambda db: analytics_snapshots.get_day_patterns(db, restaurant_id, weeks)
         )
         return {
             "weeks_analyzed": weeks,
@@ -168,7 +211,7 @@ async def get_day_patterns(
 async def get_customer_preferences(
     restaurant_id: UUID,
     customer_id: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """
     Get customer preferences and personalized recommendations.
@@ -203,7 +246,7 @@ async def get_demand_predictions(
         regex="^(1_week|2_weeks|1_month|3_months|6_months|12_months)$",
         description="Prediction period"
     ),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_analytics_db)
 ):
     """
     Predict demand for menu items using Facebook Prophet ML.
@@ -253,8 +296,7 @@ async def get_order_volume(
         "daily",
         regex="^(hourly|daily|weekly|monthly)$",
         description="Grouping method"
-    ),
-    db: AsyncSession = Depends(get_db)
+    )
 ):
     """
     Get order volume trends with period-over-period growth rates.
@@ -268,8 +310,9 @@ async def get_order_volume(
     **Returns:** Order volume metrics with growth rates
     """
     try:
-        result = await analytics_service.get_order_volume(
-            db, restaurant_id, start_date, end_date, group_by
+        result = await analytics_cache.get(
+            "order_volume", restaurant_id, {"start_date": start_date, "end_date": end_date, "group_by": group_by},
+            lambda db: analytics_service.get_order_volume(db, restaurant_id, start_date, end_date, group_by)
         )
         return result
     except Exception as e:
@@ -293,8 +336,7 @@ async def get_order_volume(
 async def get_category_performance(
     restaurant_id: UUID,
     start_date: date = Query(..., description="Start date for analysis"),
-    end_date: date = Query(..., description="End date for analysis"),
-    db: AsyncSession = Depends(get_db)
+    end_date: date = Query(..., description="End date for analysis")
 ):
     """
     Get performance metrics for each menu category.
@@ -307,8 +349,9 @@ async def get_category_performance(
     **Returns:** Category performance metrics
     """
     try:
-        categories = await analytics_service.get_category_performance(
-            db, restaurant_id, start_date, end_date
+        categories = await analytics_cache.get(
+            "category_performance", restaurant_id, {"start_date": start_date, "end_date": end_date},
+            lambda db: analytics_service.get_category_performance(db, restaurant_id, start_date, end_date)
         )
         return {
             "start_date": start_date,
@@ -336,8 +379,7 @@ async def get_category_performance(
 async def get_peak_hours(
     restaurant_id: UUID,
     start_date: date = Query(..., description="Start date for analysis"),
-    end_date: date = Query(..., description="End date for analysis"),
-    db: AsyncSession = Depends(get_db)
+    end_date: date = Query(..., description="End date for analysis")
 ):
     """
     Analyze order patterns by hour of day to identify peak times.
@@ -350,8 +392,9 @@ async def get_peak_hours(
     **Returns:** Hourly metrics with busiest and slowest hours
     """
     try:
-        result = await analytics_service.get_peak_hours(
-            db, restaurant_id, start_date, end_date
+        result = await analytics_cache.get(
+            "peak_hours", restaurant_id, {"start_date": start_date, "end_date": end_date},
+            lambda db: analytics_service.get_peak_hours(db, restaurant_id, start_date, end_date)
         )
         return result
     except Exception as e:
@@ -378,8 +421,7 @@ async def get_sales_comparison(
         "week",
         regex="^(week|month|quarter|year)$",
         description="Comparison period"
-    ),
-    db: AsyncSession = Depends(get_db)
+    )
 ):
     """
     Compare sales metrics between current and previous period.
@@ -391,8 +433,9 @@ async def get_sales_comparison(
     **Returns:** Comparison metrics with growth percentages
     """
     try:
-        result = await analytics_service.get_sales_comparison(
-            db, restaurant_id, period
+        result = await analytics_cache.get(
+            "sales_comparison", restaurant_id, {"period": period},
+            lambda db: analytics_service.get_sales_comparison(db, restaurant_id, period)
         )
         return result
     except Exception as e:
@@ -422,8 +465,7 @@ async def get_top_performers(
         regex="^(revenue|quantity|orders)$",
         description="Ranking method"
     ),
-    limit: int = Query(20, ge=1, le=100, description="Maximum items to return"),
-    db: AsyncSession = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100, description="Maximum items to return")
 ):
     """
     Get top performing items with detailed metrics.
@@ -438,8 +480,9 @@ async def get_top_performers(
     **Returns:** Ranked list of top performing items
     """
     try:
-        items = await analytics_service.get_top_performers(
-            db, restaurant_id, start_date, end_date, rank_by, limit
+        items = await analytics_cache.get(
+            "top_performers", restaurant_id, {"start_date": start_date, "end_date": end_date, "rank_by": rank_by, "limit": limit},
+            lambda db: analytics_service.get_top_performers(db, restaurant_id, start_date, end_date, rank_by, limit)
         )
         return {
             "start_date": start_date,
@@ -468,8 +511,7 @@ async def get_top_performers(
 async def get_order_type_breakdown(
     restaurant_id: UUID,
     start_date: date = Query(..., description="Start date for analysis"),
-    end_date: date = Query(..., description="End date for analysis"),
-    db: AsyncSession = Depends(get_db)
+    end_date: date = Query(..., description="End date for analysis")
 ):
     """
     Analyze order distribution between table and online orders.
@@ -482,8 +524,9 @@ async def get_order_type_breakdown(
     **Returns:** Breakdown by order type with percentages
     """
     try:
-        breakdown = await analytics_service.get_order_type_breakdown(
-            db, restaurant_id, start_date, end_date
+        breakdown = await analytics_cache.get(
+            "order_type_breakdown", restaurant_id, {"start_date": start_date, "end_date": end_date},
+            lambda db: analytics_service.get_order_type_breakdown(db, restaurant_id, start_date, end_date)
         )
         return {
             "start_date": start_date,
@@ -512,7 +555,7 @@ async def get_customer_behavior(
     restaurant_id: UUID,
     start_date: date = Query(..., description="Start date for analysis"),
     end_date: date = Query(..., description="End date for analysis"),
-    db: AsyncSession = Depends(get_db)
+    approx: bool = Query(False, description="Answer from daily sketches, with error bounds")
 ):
     """
     Analyze customer behavior including new vs returning customers.
@@ -521,12 +564,20 @@ async def get_customer_behavior(
     - **restaurant_id**: Restaurant UUID
     - **start_date**: Start date (YYYY-MM-DD)
     - **end_date**: End date (YYYY-MM-DD)
+    - **approx**: Estimate distinct customers with HyperLogLog (sub-second for any range)
 
     **Returns:** Customer behavior metrics
     """
     try:
-        result = await analytics_service.get_customer_behavior(
-            db, restaurant_id, start_date, end_date
+        if approx:
+            return await analytics_cache.get(
+                "customer_behavior_approx", restaurant_id, {"start_date": start_date, "end_date": end_date},
+                lambda db: analytics_sketches.get_customer_behavior(db, restaurant_id, start_date, end_date)
+            )
+
+        result = await analytics_cache.get(
+            "customer_behavior", restaurant_id, {"start_date": start_date, "end_date": end_date},
+            lambda db: analytics_snapshots.get_customer_behavior(db, restaurant_id, start_date, end_date)
         )
         return result
     except Exception as e:
@@ -538,7 +589,71 @@ async def get_customer_behavior(
 
 
 # ============================================================================
-# 13. Analytics Dashboard Summary
+# 13. Live KPIs
+# ============================================================================
+
+@router.get(
+    "/restaurants/{restaurant_id}/analytics/live",
+    summary="Get live KPIs",
+    description="Today's and this hour's orders, revenue and average order value, from memory"
+)
+async def get_live_kpis(restaurant_id: UUID):
+    """
+    Get today's and this hour's KPIs without querying the database.
+
+    **Parameters:**
+    - **restaurant_id**: Restaurant UUID
+
+    **Returns:** Order count, revenue, average order value and completed/cancelled
+    counts for the current UTC day and hour
+    """
+    return live_kpis.snapshot(str(restaurant_id))
+
+
+@router.get(
+    "/restaurants/{restaurant_id}/analytics/live/stream",
+    summary="Stream live KPIs",
+    description="Server-Sent Events stream of live KPIs for the admin dashboard"
+)
+async def stream_live_kpis(restaurant_id: UUID, request: Request):
+    """
+    Stream today's and this hour's KPIs as Server-Sent Events.
+
+    Sends the current KPIs at once, then at most every few seconds while
+    orders change them (and when the hour or day rolls over).
+    """
+    key = str(restaurant_id)
+
+    async def event_stream():
+        version = live_kpis.version(key)
+        last_sent = time.monotonic()
+        yield format_sse(live_kpis.snapshot(key), "kpis")
+        while True:
+            await asyncio.sleep(KPI_PUSH_SECONDS)
+            if await request.is_disconnected():
+                break
+            current = live_kpis.version(key)
+            if current != version:
+                version = current
+                last_sent = time.monotonic()
+                yield format_sse(live_kpis.snapshot(key), "kpis")
+            elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+# ============================================================================
+# 14. Analytics Dashboard Summary
 # ============================================================================
 
 @router.get(
@@ -548,8 +663,7 @@ async def get_customer_behavior(
 )
 async def get_analytics_dashboard(
     restaurant_id: UUID,
-    days: int = Query(30, ge=7, le=90, description="Number of days to analyze"),
-    db: AsyncSession = Depends(get_db)
+    days: int = Query(30, ge=7, le=90, description="Number of days to analyze")
 ):
     """
     Get comprehensive analytics summary for dashboard.
@@ -566,31 +680,24 @@ async def get_analytics_dashboard(
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=days)
 
-        # Get revenue analytics
-        revenue_data = await analytics_service.get_revenue_analytics(
-            db, restaurant_id, start_date, end_date, "daily"
-        )
-
-        # Get popular items
-        popular_items_data = await analytics_service.get_popular_items(
-            db, restaurant_id, days, 10
-        )
-
-        # Get day patterns
-        weeks = min(days // 7, 8)
-        day_patterns_data = await analytics_service.get_day_patterns(
-            db, restaurant_id, weeks
-        )
-
-        # Get order volume
-        order_volume_data = await analytics_service.get_order_volume(
-            db, restaurant_id, start_date, end_date, "daily"
-        )
-
-        # Get customer behavior
-        customer_behavior_data = await analytics_service.get_customer_behavior(
-            db, restaurant_id, start_date, end_date
+        # One scan per table, run concurrently; the engine opens its own sessions
+        dashboard = await analytics_cache.get(
+            "dashboard", restaurant_id, {"days": days, "end_date": end_date},
+            lambda db: analytics_engine.compute_metrics(
+                restaurant_id,
+                analytics_engine.METRICS,
+                start_date,
+                end_date,
+                days=days,
+                weeks=min(days // 7, 8),
+                limit=10
+            )
         )
+        revenue_data = dashboard[analytics_engine.REVENUE]
+        popular_items_data = dashboard[analytics_engine.POPULAR_ITEMS]
+        day_patterns_data = dashboard[analytics_engine.DAY_PATTERNS]
+        order_volume_data = dashboard[analytics_engine.VOLUME]
+        customer_behavior_data = dashboard[analytics_engine.CUSTOMER_BEHAVIOR]
 
         # Calculate summary metrics
         total_revenue = revenue_data.get("total_revenue", 0)
@@ -598,7 +705,7 @@ async def get_analytics_dashboard(
         avg_order_value = revenue_data.get("overall_avg_order_value", 0)
 
         # Get growth from order volume
-        periods = order_volume_data.get("periods", [])
+        periods = order_volume_data.get("metrics", [])
         recent_growth = 0
         if len(periods) >= 2:
             recent_count = periods[-1]["order_count"]
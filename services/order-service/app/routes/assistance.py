@@ -7,7 +7,7 @@ from sqlalchemy import select
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models import AssistanceRequest
 from ..schemas import (
     AssistanceRequestCreate,
@@ -53,7 +53,7 @@ async def list_assistance_requests(
     resolved: Optional[bool] = Query(None),
     table_id: Optional[UUID] = Query(None),
     limit: int = Query(100, ge=1, le=500),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     List assistance requests for a restaurant (STAFF/ADMIN)
@@ -82,7 +82,7 @@ async def list_assistance_requests(
 @router.get("/assistance/{request_id}", response_model=AssistanceRequestResponse)
 async def get_assistance_request(
     request_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get a specific assistance request
@@ -1,9 +1,11 @@
 """
 Order management routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from uuid import UUID
@@ -11,8 +13,16 @@ from datetime import datetime
 import secrets
 import httpx
 import os
-from ..database import get_db
+import json
+import asyncio
+from ..database import get_db, get_read_db, read_router
 from ..models import Order, OrderItem
+from ..order_events import order_event_broker, build_order_event, TERMINAL_STATUSES
+from ..event_publisher import order_event_publisher
+from ..rabbitmq_consumer import consumer
+from ..services.analytics_rollups import record_order_created, record_status_change
+from ..services.trending_items import trending_tracker
+from ..services.live_kpis import live_kpis
 from ..schemas import (
     OrderCreate,
     OrderResponse,
@@ -28,6 +38,9 @@ logger = setup_logger("order-routes")
 # Restaurant service URL
 RESTAURANT_SERVICE_URL = os.getenv("RESTAURANT_SERVICE_URL", "http://restaurant-service:8003")
 
+# Seconds between SSE keep-alive comments (keeps proxies from closing idle streams)
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
 
 def generate_order_number() -> str:
     """Generate a unique order number"""
@@ -36,6 +49,17 @@ def generate_order_number() -> str:
     return f"ORD-{timestamp}-{random_suffix}"
 
 
+def publish_order_event(event: dict):
+    """
+    Deliver a lifecycle event to local trackers and queue it for RabbitMQ
+    Neither step waits on the broker
+    """
+    order_event_broker.publish(event["order_id"], event)
+    trending_tracker.handle_event(event)
+    live_kpis.handle_event(event)
+    order_event_publisher.publish(event)
+
+
 async def fetch_menu_item(restaurant_id: UUID, menu_item_id: UUID) -> dict:
     """Fetch menu item details from restaurant service"""
     try:
@@ -113,18 +137,42 @@ async def unlock_table(restaurant_id: UUID, table_id: UUID) -> bool:
         return False
 
 
+async def get_order_by_idempotency_key(db: AsyncSession, idempotency_key: str) -> Optional[Order]:
+    """Order created earlier with this Idempotency-Key, with its items"""
+    result = await db.execute(
+        select(Order)
+        .options(selectinload(Order.items))
+        .where(Order.idempotency_key == idempotency_key)
+    )
+    return result.scalar_one_or_none()
+
+
 @router.post("/orders", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(
     order_data: OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new order (PUBLIC - no authentication required)
     Customers can place orders directly via QR code or table session
+
+    Clients that retry (e.g. the delivery-platform integration) send an
+    Idempotency-Key header; a repeated key returns the order created by the
+    first request with 200 instead of creating another.
     """
+    if idempotency_key:
+        existing = await get_order_by_idempotency_key(db, idempotency_key)
+        if existing:
+            logger.info(f"Order {existing.order_number} returned for repeated idempotency key")
+            response.status_code = status.HTTP_200_OK
+            return existing
+
     # Calculate order totals
     subtotal = 0.0
     order_items_data = []
+    event_items = []
 
     for item in order_data.items:
         # Fetch menu item details from restaurant service
@@ -150,6 +198,13 @@ async def create_order(
             "quantity": item.quantity,
             "special_instructions": item.special_requests
         })
+        event_items.append({
+            "menu_item_id": str(item.menu_item_id),
+            "name": item_name,
+            "quantity": item.quantity,
+            "category": menu_item.get("category"),
+            "preparation_time": menu_item.get("preparation_time")
+        })
 
     # Calculate tax (10%)
     tax = subtotal * 0.10
@@ -169,20 +224,33 @@ async def create_order(
         subtotal=subtotal,
         tax=tax,
         total=total,
-        special_instructions=order_data.special_instructions
+        special_instructions=order_data.special_instructions,
+        idempotency_key=idempotency_key
     )
 
     db.add(new_order)
-    await db.flush()  # Get order ID before adding items
+    try:
+        await db.flush()  # Get order ID before adding items
+    except IntegrityError:
+        # A concurrent request with the same key committed first
+        await db.rollback()
+        existing = await get_order_by_idempotency_key(db, idempotency_key) if idempotency_key else None
+        if existing is None:
+            raise
+        response.status_code = status.HTTP_200_OK
+        return existing
 
     # Add order items
+    order_items = []
     for item_data in order_items_data:
         order_item = OrderItem(
             order_id=new_order.id,
             **item_data
         )
         db.add(order_item)
+        order_items.append(order_item)
 
+    await record_order_created(db, new_order, order_items)
     await db.commit()
     await db.refresh(new_order)
 
@@ -199,6 +267,8 @@ async def create_order(
     )
     order_with_items = result.scalar_one()
 
+    publish_order_event(build_order_event(order_with_items, "order.created", items=event_items))
+
     logger.info(f"Order created: {new_order.order_number}")
 
     return order_with_items
@@ -210,7 +280,7 @@ async def list_orders(
     status_filter: Optional[OrderStatus] = Query(None, alias="status"),
     table_id: Optional[UUID] = Query(None),
     limit: int = Query(100, ge=1, le=500),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     List all orders for a restaurant (CHEF/ADMIN)
@@ -239,7 +309,7 @@ async def list_orders(
 @router.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get a specific order by ID (PUBLIC - for order tracking)
@@ -286,6 +356,90 @@ async def get_order(
     return order_dict
 
 
+def format_sse(data: dict, event: Optional[str] = None) -> str:
+    """Format a payload as a Server-Sent Events message"""
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n{message}"
+    return message
+
+
+@router.get("/orders/{order_id}/events")
+async def stream_order_events(
+    order_id: UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Stream order status changes as Server-Sent Events (PUBLIC - for order tracking)
+    Sends the current status once, then pushes every transition until the
+    order reaches a terminal status or the client disconnects
+    """
+    result = await db.execute(
+        select(Order).where(Order.id == order_id)
+    )
+    order = result.scalar_one_or_none()
+
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found"
+        )
+
+    snapshot = build_order_event(order, "order.snapshot")
+    key = str(order_id)
+
+    async def event_stream():
+        # Registered only once the response is being streamed, so the
+        # finally below always runs for it
+        queue = order_event_broker.subscribe(key)
+        try:
+            # Route this restaurant's notifications to this replica while streaming
+            await consumer.subscribe_restaurant(snapshot["restaurant_id"])
+
+            # Re-read now that we are subscribed, so no transition falls
+            # between the snapshot and the subscription
+            current = snapshot
+            try:
+                async with await read_router.open_session() as fresh_db:
+                    fresh = (await fresh_db.execute(select(Order).where(Order.id == order_id))).scalar_one_or_none()
+                if fresh is not None:
+                    current = build_order_event(fresh, "order.snapshot")
+            except Exception as e:
+                logger.warning(f"Could not refresh order {order_id} snapshot: {e}")
+
+            yield format_sse(current, "status")
+            if current["status"] in TERMINAL_STATUSES:
+                return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield format_sse(event, "eta" if event.get("event") == "order.eta_updated" else "status")
+
+                if event.get("status") in TERMINAL_STATUSES:
+                    break
+        finally:
+            order_event_broker.unsubscribe(key, queue)
+            await consumer.unsubscribe_restaurant(snapshot["restaurant_id"])
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.patch("/orders/{order_id}/status", response_model=OrderResponse)
 async def update_order_status(
     order_id: UUID,
@@ -311,15 +465,19 @@ async def update_order_status(
         )
 
     # Update status
+    previous_status = order.status
     order.status = status_update.status
 
     # Set timestamps based on status
     if status_update.status in [OrderStatus.COMPLETED, OrderStatus.CANCELLED]:
         order.completed_at = datetime.utcnow()
 
+    await record_status_change(db, order, previous_status, order.items)
     await db.commit()
     await db.refresh(order)
 
+    publish_order_event(build_order_event(order, previous_status=previous_status))
+
     logger.info(f"Order {order.order_number} status updated to {status_update.status}")
 
     return order
@@ -355,6 +513,7 @@ async def generate_receipt(
         )
 
     # Mark order as completed if it was just SERVED
+    previous_status = order.status
     if order.status == OrderStatus.SERVED:
         order.status = OrderStatus.COMPLETED
         order.completed_at = datetime.utcnow()
@@ -367,9 +526,12 @@ async def generate_receipt(
         else:
             logger.warning(f"Failed to unlock table {order.table_id} for order {order.order_number}")
 
+    await record_status_change(db, order, previous_status, order.items)
     await db.commit()
     await db.refresh(order)
 
+    publish_order_event(build_order_event(order, "order.receipt_generated", previous_status=previous_status))
+
     logger.info(f"Receipt generated for order {order.order_number}")
 
     return order
@@ -385,7 +547,9 @@ async def cancel_order(
     Also unlocks the table if it was locked
     """
     result = await db.execute(
-        select(Order).where(Order.id == order_id)
+        select(Order)
+        .options(selectinload(Order.items))
+        .where(Order.id == order_id)
     )
     order = result.scalar_one_or_none()
 
@@ -401,6 +565,7 @@ async def cancel_order(
             detail="Cannot cancel a completed or served order"
         )
 
+    previous_status = order.status
     order.status = OrderStatus.CANCELLED
     order.completed_at = datetime.utcnow()
 
@@ -409,8 +574,11 @@ async def cancel_order(
         await unlock_table(order.restaurant_id, order.table_id)
         logger.info(f"Table {order.table_id} unlocked after order {order.order_number} was cancelled")
 
+    await record_status_change(db, order, previous_status, order.items)
     await db.commit()
 
+    publish_order_event(build_order_event(order, "order.cancelled", previous_status=previous_status))
+
     logger.info(f"Order {order.order_number} cancelled")
 
     return MessageResponse(message="Order cancelled successfully")
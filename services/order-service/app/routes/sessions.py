@@ -8,7 +8,7 @@ from typing import List
 from uuid import UUID
 from datetime import datetime, timedelta
 import secrets
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models import TableSession, Order
 from ..schemas import (
     TableSessionCreate,
@@ -176,7 +176,7 @@ async def add_item_to_session(
 @router.get("/sessions/{session_token}", response_model=TableSessionResponse)
 async def get_session(
     session_token: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get current session status
@@ -0,0 +1,391 @@
+"""
+Analytics result cache for Order Service
+Results are keyed by restaurant, endpoint and normalized parameters and kept
+in an in-process LRU in front of Redis. Order events for a restaurant mark
+its results stale; a stale result is still returned at once while a single
+background refresh recomputes it.
+"""
+import aio_pika
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("analytics-cache")
+
+# Seconds a result is served without recomputing, if no order event arrives
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "300"))
+# Seconds a stale result may still be served while it is refreshed;
+# older results are recomputed before answering
+ANALYTICS_CACHE_MAX_STALE_SECONDS = float(os.getenv("ANALYTICS_CACHE_MAX_STALE_SECONDS", "3600"))
+# Results kept in process memory
+ANALYTICS_CACHE_LRU_SIZE = int(os.getenv("ANALYTICS_CACHE_LRU_SIZE", "2000"))
+# Seconds one replica holds the right to refresh a result
+REFRESH_LOCK_SECONDS = 30
+# Seconds Redis is bypassed after an error, so an outage costs one timeout
+REDIS_RETRY_SECONDS = 30.0
+REDIS_KEY_PREFIX = "analytics:"
+
+# Order events that do not change any analytics result
+IGNORED_EVENTS = {"order.eta_updated"}
+
+COUNTERS = ("requests", "hits", "redis_hits", "stale_served", "misses", "refreshes", "errors")
+
+# Redis shares results between replicas (optional - falls back to memory only)
+try:
+    import redis.asyncio as redis
+
+    redis_client = redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        password=os.getenv("REDIS_PASSWORD") or None,
+        db=int(os.getenv("REDIS_DB", "0")),
+        decode_responses=True,
+        # A slow Redis must not be slower than recomputing
+        socket_connect_timeout=0.2,
+        socket_timeout=0.2
+    )
+    REDIS_AVAILABLE = True
+except Exception as e:
+    logger.warning(f"Redis not available for analytics cache: {e}")
+    redis_client = None
+    REDIS_AVAILABLE = False
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    # When computing started (epoch seconds); events after it make the entry stale
+    computed_at: float
+
+
+Compute = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class AnalyticsCache:
+    """
+    Two-level result cache with event-driven invalidation
+
+    Each result is computed once at a time per replica: concurrent misses
+    wait for the same computation, and a stale result triggers at most one
+    background refresh (across replicas, when Redis is available).
+    """
+
+    def __init__(self, session_factory: Optional[Callable[[], AsyncSession]] = None, clock=time.time):
+        self.session_factory = session_factory
+        self.clock = clock
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        # Last order event seen per restaurant (epoch seconds)
+        self.invalidated_at: Dict[str, float] = {}
+        # Computations answering a miss, and background refreshes, by key
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        # Requests waiting on each computation answering a miss
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+        # Metrics
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        self.invalidations = 0
+        self.redis_errors = 0
+        self._redis_down_until = 0.0
+
+    @staticmethod
+    def make_key(endpoint: str, restaurant_id: str, params: Dict[str, Any]) -> str:
+        normalized = json.dumps(jsonable_encoder(params), sort_keys=True, separators=(",", ":"))
+        return f"{restaurant_id}:{endpoint}:{hashlib.sha1(normalized.encode()).hexdigest()[:16]}"
+
+    async def get(self, endpoint: str, restaurant_id, params: Dict[str, Any], compute: Compute) -> Any:
+        """
+        Return the result of compute(db) for these parameters, from cache when possible
+
+        The result is JSON-compatible (passed through jsonable_encoder).
+        """
+        restaurant_id = str(restaurant_id)
+        key = self.make_key(endpoint, restaurant_id, params)
+        stats = self.stats[endpoint]
+        stats["requests"] += 1
+        now = self.clock()
+
+        entry = self._local_get(key)
+        counter = "hits"
+        if entry is None or not self._is_fresh(restaurant_id, entry, now):
+            shared = await self._redis_get(restaurant_id, key)
+            if shared and (entry is None or shared.computed_at > entry.computed_at):
+                entry = shared
+                counter = "redis_hits"
+                self._local_put(key, entry)
+
+        if entry and self._is_fresh(restaurant_id, entry, now):
+            stats[counter] += 1
+            return entry.value
+
+        if entry and now - entry.computed_at < ANALYTICS_CACHE_MAX_STALE_SECONDS:
+            stats["stale_served"] += 1
+            self._refresh_in_background(endpoint, restaurant_id, key, compute)
+            return entry.value
+
+        stats["misses"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start(endpoint, restaurant_id, key, compute, background=False)
+        # A disconnecting client must not cancel a computation others wait
+        # for, but the last one to leave cancels it (and its query)
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(task) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            remaining = self._waiters.pop(task, 1) - 1
+            if remaining > 0:
+                self._waiters[task] = remaining
+
+    def invalidate(self, restaurant_id: str):
+        """Mark every cached result of a restaurant stale"""
+        restaurant_id = str(restaurant_id)
+        now = self.clock()
+        self.invalidated_at[restaurant_id] = now
+        self.invalidations += 1
+        if self._redis_usable():
+            # Replicas that were not running when the event arrived still see it
+            asyncio.create_task(self._redis_set(
+                f"{REDIS_KEY_PREFIX}invalidated:{restaurant_id}", str(now), ANALYTICS_CACHE_MAX_STALE_SECONDS
+            ))
+
+    def invalidate_all(self):
+        """Mark every result stale, e.g. after order events may have been missed"""
+        now = self.clock()
+        for entry in self.entries.values():
+            entry.computed_at = min(entry.computed_at, now - ANALYTICS_CACHE_TTL_SECONDS)
+
+    def _is_fresh(self, restaurant_id: str, entry: CacheEntry, now: float) -> bool:
+        return (
+            now - entry.computed_at < ANALYTICS_CACHE_TTL_SECONDS
+            and entry.computed_at >= self.invalidated_at.get(restaurant_id, 0.0)
+        )
+
+    def _refresh_in_background(self, endpoint: str, restaurant_id: str, key: str, compute: Compute):
+        if key not in self._inflight and key not in self._refreshing:
+            self._start(endpoint, restaurant_id, key, compute, background=True)
+
+    def _start(self, endpoint: str, restaurant_id: str, key: str, compute: Compute, background: bool) -> asyncio.Task:
+        running = self._refreshing if background else self._inflight
+        task = asyncio.create_task(self._compute(endpoint, restaurant_id, key, compute, background))
+        running[key] = task
+
+        def done(finished: asyncio.Task):
+            if running.get(key) is finished:
+                del running[key]
+        task.add_done_callback(done)
+        return task
+
+    async def _compute(self, endpoint: str, restaurant_id: str, key: str, compute: Compute, background: bool):
+        stats = self.stats[endpoint]
+        if background:
+            # Another replica is already refreshing this result
+            if not await self._redis_lock(key):
+                return None
+            stats["refreshes"] += 1
+
+        started = self.clock()
+        try:
+            session_factory = self.session_factory
+            if session_factory is None:
+                from ..database import analytics_session_maker
+                session_factory = analytics_session_maker
+            async with session_factory() as db:
+                value = jsonable_encoder(await compute(db))
+        except Exception as e:
+            stats["errors"] += 1
+            if not background:
+                raise
+            logger.warning(f"Background refresh of {endpoint} for restaurant {restaurant_id} failed: {e}")
+            return None
+
+        entry = CacheEntry(value, started)
+        self._local_put(key, entry)
+        await self._redis_set(
+            REDIS_KEY_PREFIX + key,
+            json.dumps({"value": value, "computed_at": started}),
+            ANALYTICS_CACHE_MAX_STALE_SECONDS
+        )
+        return value
+
+    def _local_get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def _local_put(self, key: str, entry: CacheEntry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > ANALYTICS_CACHE_LRU_SIZE:
+            self.entries.popitem(last=False)
+
+    def _redis_usable(self) -> bool:
+        return REDIS_AVAILABLE and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, action: str, error: Exception):
+        self.redis_errors += 1
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        logger.warning(f"Analytics cache {action} failed, using memory only for {REDIS_RETRY_SECONDS:.0f}s: {error}")
+
+    async def _redis_get(self, restaurant_id: str, key: str) -> Optional[CacheEntry]:
+        if not self._redis_usable():
+            return None
+        try:
+            cached, invalidated = await redis_client.mget(
+                REDIS_KEY_PREFIX + key, f"{REDIS_KEY_PREFIX}invalidated:{restaurant_id}"
+            )
+        except Exception as e:
+            self._redis_failed("read", e)
+            return None
+
+        if invalidated:
+            self.invalidated_at[restaurant_id] = max(self.invalidated_at.get(restaurant_id, 0.0), float(invalidated))
+        if not cached:
+            return None
+        cached = json.loads(cached)
+        return CacheEntry(cached["value"], cached["computed_at"])
+
+    async def _redis_set(self, key: str, value: str, ttl: float):
+        if not self._redis_usable():
+            return
+        try:
+            await redis_client.set(key, value, ex=int(ttl))
+        except Exception as e:
+            self._redis_failed("write", e)
+
+    async def _redis_lock(self, key: str) -> bool:
+        if not self._redis_usable():
+            return True
+        try:
+            return bool(await redis_client.set(
+                f"{REDIS_KEY_PREFIX}refresh:{key}", "1", nx=True, ex=REFRESH_LOCK_SECONDS
+            ))
+        except Exception as e:
+            self._redis_failed("lock", e)
+            return True
+
+    def get_stats(self) -> dict:
+        endpoints = {}
+        for endpoint, counts in sorted(self.stats.items()):
+            served = counts["hits"] + counts["redis_hits"] + counts["stale_served"]
+            endpoints[endpoint] = {
+                **counts,
+                "hit_rate": round(served / counts["requests"], 3) if counts["requests"] else None
+            }
+        return {
+            "redis": self._redis_usable(),
+            "entries": len(self.entries),
+            "computing": len(self._inflight),
+            "refreshing": len(self._refreshing),
+            "invalidations": self.invalidations,
+            "redis_errors": self.redis_errors,
+            "endpoints": endpoints
+        }
+
+
+class AnalyticsInvalidationConsumer:
+    """
+    Invalidates cached analytics when order events arrive
+
+    Every replica listens to all restaurants on its own exclusive queue,
+    since any of them may hold cached results for any restaurant. Decoded
+    events are also passed to listeners (e.g. the trending items tracker).
+    """
+
+    ROUTING_KEY = "order.*.*"
+
+    def __init__(self, cache: AnalyticsCache):
+        self.cache = cache
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq-service")
+        self.rabbitmq_user = os.getenv("RABBITMQ_USER", "guest")
+        self.rabbitmq_password = os.getenv("RABBITMQ_PASSWORD", "guest")
+        self._task: Optional[asyncio.Task] = None
+        self.events_received = 0
+        self.listeners: List[Callable[[dict], None]] = []
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        try:
+            if self.connection:
+                await self.connection.close()
+        except Exception as e:
+            logger.error(f"Error closing analytics invalidation connection: {e}")
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            started = time.monotonic()
+            try:
+                await self._consume()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics invalidation consumer stopped: {e}")
+            if time.monotonic() - started > 60:
+                backoff = 1.0
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+            backoff = min(backoff * 2, 60.0)
+
+    async def _consume(self):
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+        self.connection = await aio_pika.connect_robust(
+            f"amqp://{self.rabbitmq_user}:{self.rabbitmq_password}@{self.rabbitmq_host}/"
+        )
+        # Events were missed while the connection was down
+        self.connection.reconnect_callbacks.add(lambda *args: self.cache.invalidate_all())
+        channel = await self.connection.channel()
+        exchange = await channel.declare_exchange("orders", aio_pika.ExchangeType.TOPIC, durable=True)
+        queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(exchange, routing_key=self.ROUTING_KEY)
+        await queue.consume(self._on_message, no_ack=True)
+        self.cache.invalidate_all()
+        logger.info("Analytics cache listening for order events")
+
+        while not self.connection.is_closed:
+            await asyncio.sleep(1)
+
+    async def _on_message(self, message: aio_pika.IncomingMessage):
+        self.events_received += 1
+        # Routing key: order.<event>.<restaurant_id>
+        parts = (message.routing_key or "").split(".")
+        if len(parts) == 3 and ".".join(parts[:2]) not in IGNORED_EVENTS:
+            self.cache.invalidate(parts[2])
+        if not self.listeners:
+            return
+        try:
+            event = json.loads(message.body)
+        except ValueError:
+            logger.warning(f"Undecodable order event on {message.routing_key}")
+            return
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Order event listener failed: {e}")
+
+
+# Global cache instance
+analytics_cache = AnalyticsCache()
+invalidation_consumer = AnalyticsInvalidationConsumer(analytics_cache)
@@ -0,0 +1,316 @@
+"""
+Multi-metric analytics engine for Order Service
+Computes several dashboard metrics from shared scans instead of one query
+per metric. Metrics that read the same rollup table are answered by a
+single GROUPING SETS query, and the scans of different tables run
+concurrently on their own pooled connections, so a dashboard takes about
+as long as its slowest scan.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared.utils.logger import setup_logger
+from .analytics_rollups import day_range
+from . import analytics_service
+
+logger = setup_logger("analytics-engine")
+
+REVENUE = "revenue"
+VOLUME = "volume"
+POPULAR_ITEMS = "popular_items"
+DAY_PATTERNS = "day_patterns"
+CUSTOMER_BEHAVIOR = "customer_behavior"
+METRICS = (REVENUE, VOLUME, POPULAR_ITEMS, DAY_PATTERNS, CUSTOMER_BEHAVIOR)
+
+DAY_NAMES = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+TRUNC_FORMATS = {
+    "daily": "day",
+    "weekly": "week",
+    "monthly": "month"
+}
+
+# Period series (revenue, volume) and day-of-week totals in one pass
+RESTAURANT_SCAN_SQL = """
+    SELECT
+        GROUPING(DATE_TRUNC(:trunc_format, r.bucket)) as by_day_of_week,
+        DATE_TRUNC(:trunc_format, r.bucket) as period,
+        EXTRACT(DOW FROM r.bucket) as day_number,
+        SUM(r.order_count) FILTER (WHERE r.bucket >= :start_ts) as order_count,
+        SUM(r.revenue) FILTER (WHERE r.bucket >= :start_ts) as revenue,
+        SUM(r.order_count) FILTER (WHERE r.bucket >= {weeks_since}) as week_orders,
+        SUM(r.revenue) FILTER (WHERE r.bucket >= {weeks_since}) as week_revenue
+    FROM analytics_hourly_restaurant r
+    WHERE r.restaurant_id = :restaurant_id
+        AND r.bucket >= LEAST(CAST(:start_ts AS TIMESTAMP), {weeks_since})
+        AND r.bucket < :end_ts
+    GROUP BY GROUPING SETS (
+        (DATE_TRUNC(:trunc_format, r.bucket)),
+        (EXTRACT(DOW FROM r.bucket))
+    )
+"""
+
+# Item totals for the recent and previous halves (popular items) and
+# per-day-of-week item quantities (day patterns) in one pass
+ITEM_SCAN_SQL = """
+    SELECT
+        GROUPING(i.menu_item_id) as by_day_of_week,
+        i.menu_item_id,
+        EXTRACT(DOW FROM i.bucket) as day_number,
+        i.item_name,
+        (ARRAY_AGG(i.item_name ORDER BY i.bucket DESC) FILTER (WHERE i.bucket >= {days_since}))[1] as latest_name,
+        COUNT(*) FILTER (WHERE i.bucket >= {days_since}) as recent_buckets,
+        SUM(i.quantity) FILTER (WHERE i.bucket >= {days_since}) as quantity_sold,
+        SUM(i.order_count) FILTER (WHERE i.bucket >= {days_since}) as order_count,
+        SUM(i.revenue) FILTER (WHERE i.bucket >= {days_since}) as revenue,
+        SUM(i.quantity) FILTER (WHERE i.bucket >= {days_since} AND i.bucket < {half_days_since}) as previous_quantity,
+        SUM(i.quantity) FILTER (WHERE i.bucket >= {weeks_since}) as week_quantity
+    FROM analytics_hourly_item i
+    WHERE i.restaurant_id = :restaurant_id
+        AND i.bucket >= LEAST({days_since}, {weeks_since})
+    GROUP BY GROUPING SETS (
+        (i.menu_item_id),
+        (EXTRACT(DOW FROM i.bucket), i.item_name)
+    )
+"""
+
+WINDOWS = {
+    "days_since": "DATE_TRUNC('hour', NOW() - make_interval(days => :days))",
+    "half_days_since": "DATE_TRUNC('hour', NOW() - make_interval(days => :half_days))",
+    "weeks_since": "DATE_TRUNC('hour', NOW() - make_interval(weeks => :weeks))",
+}
+
+
+async def _scan_restaurant(
+    db: AsyncSession,
+    restaurant_id: UUID,
+    start_date: date,
+    end_date: date,
+    weeks: int,
+    group_by: str
+) -> Dict[str, Any]:
+    start_ts, end_ts = day_range(start_date, end_date)
+    result = await db.execute(text(RESTAURANT_SCAN_SQL.format(**WINDOWS)), {
+        "restaurant_id": str(restaurant_id),
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+        "weeks": weeks,
+        "trunc_format": TRUNC_FORMATS.get(group_by, "day")
+    })
+
+    periods = []
+    days_of_week = []
+    for row in result.fetchall():
+        if row.by_day_of_week:
+            if row.week_orders:
+                days_of_week.append(row)
+        elif row.order_count:
+            periods.append(row)
+    periods.sort(key=lambda row: row.period)
+    days_of_week.sort(key=lambda row: row.day_number)
+    return {"periods": periods, "days_of_week": days_of_week}
+
+
+async def _scan_items(
+    db: AsyncSession,
+    restaurant_id: UUID,
+    days: int,
+    weeks: int
+) -> Dict[str, Any]:
+    result = await db.execute(text(ITEM_SCAN_SQL.format(**WINDOWS)), {
+        "restaurant_id": str(restaurant_id),
+        "days": days,
+        "half_days": days // 2,
+        "weeks": weeks
+    })
+
+    items = []
+    by_day_of_week: Dict[int, List[Any]] = defaultdict(list)
+    for row in result.fetchall():
+        if row.by_day_of_week:
+            if row.week_quantity is not None:
+                by_day_of_week[int(row.day_number)].append(row)
+        elif row.recent_buckets:
+            items.append(row)
+    items.sort(key=lambda row: row.quantity_sold, reverse=True)
+    return {"items": items, "by_day_of_week": by_day_of_week}
+
+
+async def _customer_behavior(
+    db: AsyncSession,
+    restaurant_id: UUID,
+    start_date: date,
+    end_date: date
+) -> Dict[str, Any]:
+    return await analytics_service.get_customer_behavior(db, restaurant_id, start_date, end_date)
+
+
+def _revenue(scan: Dict[str, Any], start_date: date, end_date: date, group_by: str) -> Dict[str, Any]:
+    metrics = []
+    total_revenue = 0.0
+    total_orders = 0
+    for row in scan["periods"]:
+        period_revenue = float(row.revenue or 0)
+        period_orders = int(row.order_count or 0)
+        metrics.append({
+            "period": row.period.date().isoformat() if row.period else "",
+            "total_revenue": round(period_revenue, 2),
+            "order_count": period_orders,
+            "avg_order_value": round(period_revenue / period_orders, 2) if period_orders else 0.0
+        })
+        total_revenue += period_revenue
+        total_orders += period_orders
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "group_by": group_by,
+        "metrics": metrics,
+        "total_revenue": round(total_revenue, 2),
+        "total_orders": total_orders,
+        "overall_avg_order_value": round(total_revenue / total_orders, 2) if total_orders > 0 else 0.0
+    }
+
+
+def _volume(scan: Dict[str, Any], start_date: date, end_date: date, group_by: str) -> Dict[str, Any]:
+    metrics = []
+    previous_count = None
+    for row in scan["periods"]:
+        current_count = int(row.order_count or 0)
+        growth_rate = None
+        if previous_count is not None and previous_count > 0:
+            growth_rate = round(((current_count - previous_count) / previous_count) * 100, 2)
+        metrics.append({
+            "period": row.period.isoformat() if row.period else "",
+            "order_count": current_count,
+            "avg_order_value": round(float(row.revenue or 0) / current_count, 2) if current_count else 0.0,
+            "growth_rate": growth_rate
+        })
+        previous_count = current_count
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "group_by": group_by,
+        "metrics": metrics
+    }
+
+
+def _popular_items(scan: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+    items = []
+    for row in scan["items"][:limit]:
+        quantity_sold = int(row.quantity_sold or 0)
+        revenue = float(row.revenue or 0)
+        previous = int(row.previous_quantity or 0)
+
+        if not previous:
+            trend = "new"
+        elif quantity_sold > previous * 1.1:
+            trend = "up"
+        elif quantity_sold < previous * 0.9:
+            trend = "down"
+        else:
+            trend = "stable"
+
+        items.append({
+            "menu_item_id": row.menu_item_id,
+            "item_name": row.latest_name,
+            "order_count": int(row.order_count or 0),
+            "quantity_sold": quantity_sold,
+            "revenue": round(revenue, 2),
+            "avg_price": round(revenue / quantity_sold, 2) if quantity_sold else 0.0,
+            "trend": trend,
+            "trend_percentage": round((quantity_sold - previous) / previous * 100, 2) if previous else None
+        })
+    return items
+
+
+def _day_patterns(restaurant_scan: Dict[str, Any], item_scan: Dict[str, Any], weeks: int) -> List[Dict[str, Any]]:
+    patterns = []
+    for row in restaurant_scan["days_of_week"]:
+        day_number = int(row.day_number)
+        ranked = sorted(
+            item_scan["by_day_of_week"].get(day_number, []),
+            key=lambda item: item.week_quantity,
+            reverse=True
+        )
+        patterns.append({
+            "day_of_week": DAY_NAMES[day_number],
+            "day_number": day_number,
+            "avg_orders": round(float(row.week_orders or 0) / weeks, 2),
+            "avg_revenue": round(float(row.week_revenue or 0) / weeks, 2),
+            "popular_items": [item.item_name for item in ranked[:3]]
+        })
+    return patterns
+
+
+async def compute_metrics(
+    restaurant_id: UUID,
+    metrics: Iterable[str],
+    start_date: date,
+    end_date: date,
+    days: int,
+    weeks: int,
+    group_by: str = "daily",
+    limit: int = 10,
+    session_factory: Callable[[], AsyncSession] = None
+) -> Dict[str, Any]:
+    """
+    Compute several analytics metrics with as few scans as possible
+
+    Args:
+        restaurant_id: Restaurant UUID
+        metrics: Any of METRICS
+        start_date: Start date for the revenue, volume and customer metrics
+        end_date: End date for the revenue, volume and customer metrics
+        days: Window of the popular items (and their trend halves)
+        weeks: Window of the day-of-week patterns
+        group_by: Period of the revenue and volume series (daily, weekly, monthly)
+        limit: Maximum number of popular items
+        session_factory: Opens a session per scan (defaults to the analytics pool)
+
+    Returns:
+        Dictionary keyed by metric, each shaped like the matching
+        analytics_service function's result
+    """
+    metrics = set(metrics)
+    unknown = metrics.difference(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown analytics metrics: {', '.join(sorted(unknown))}")
+    if session_factory is None:
+        from ..database import analytics_session_maker
+        session_factory = analytics_session_maker
+    weeks = max(weeks, 1)
+
+    scans = {}
+    if metrics & {REVENUE, VOLUME, DAY_PATTERNS}:
+        scans["restaurant"] = (_scan_restaurant, (restaurant_id, start_date, end_date, weeks, group_by))
+    if metrics & {POPULAR_ITEMS, DAY_PATTERNS}:
+        scans["items"] = (_scan_items, (restaurant_id, days, weeks))
+    if CUSTOMER_BEHAVIOR in metrics:
+        scans["customers"] = (_customer_behavior, (restaurant_id, start_date, end_date))
+
+    async def run(scan, args):
+        # Its own session, so each scan runs on a separate connection
+        async with session_factory() as db:
+            return await scan(db, *args)
+
+    results = await asyncio.gather(*(run(scan, args) for scan, args in scans.values()))
+    scanned = dict(zip(scans, results))
+
+    computed: Dict[str, Any] = {}
+    if REVENUE in metrics:
+        computed[REVENUE] = _revenue(scanned["restaurant"], start_date, end_date, group_by)
+    if VOLUME in metrics:
+        computed[VOLUME] = _volume(scanned["restaurant"], start_date, end_date, group_by)
+    if POPULAR_ITEMS in metrics:
+        computed[POPULAR_ITEMS] = _popular_items(scanned["items"], limit)
+    if DAY_PATTERNS in metrics:
+        computed[DAY_PATTERNS] = _day_patterns(scanned["restaurant"], scanned["items"], weeks)
+    if CUSTOMER_BEHAVIOR in metrics:
+        computed[CUSTOMER_BEHAVIOR] = scanned["customers"]
+    return computed
@@ -0,0 +1,269 @@
+"""
+Hourly analytics rollups for Order Service
+Order writes apply their deltas to analytics_hourly_restaurant and
+analytics_hourly_item in the same transaction, so the rollups never drift
+from the orders they summarise. backfill() rebuilds buckets from the raw
+tables, e.g. after the rollups are first deployed:
+
+    python -m app.services.analytics_rollups backfill [--restaurant-id ID] [--start DATE] [--end DATE]
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, Optional
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared.models.enums import OrderStatus
+from shared.utils.logger import setup_logger
+from ..models import HourlyRestaurantRollup, HourlyItemRollup
+
+logger = setup_logger("analytics-rollups")
+
+RESTAURANT_KEYS = ["restaurant_id", "bucket", "order_type"]
+ITEM_KEYS = ["restaurant_id", "bucket", "menu_item_id", "order_type"]
+
+
+def hour_bucket(ts: datetime) -> datetime:
+    """Start of the hour a timestamp falls in"""
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def day_range(start_date: date, end_date: date):
+    """Half-open [start, end) timestamps covering whole days start_date..end_date"""
+    return datetime.combine(start_date, time.min), datetime.combine(end_date + timedelta(days=1), time.min)
+
+
+def _order_type(order) -> str:
+    return getattr(order.order_type, "name", order.order_type) or "TABLE"
+
+
+async def _apply(
+    db: AsyncSession,
+    order,
+    items: Iterable[Any],
+    sign: int,
+    completed: int = 0,
+    cancelled: int = 0
+):
+    """Add sign x the order (and its items) to its buckets, plus status counters"""
+    items = list(items)
+    bucket = hour_bucket(order.created_at)
+    order_type = _order_type(order)
+
+    restaurant_row = pg_insert(HourlyRestaurantRollup).values(
+        restaurant_id=order.restaurant_id,
+        bucket=bucket,
+        order_type=order_type,
+        order_count=sign,
+        revenue=sign * float(order.total or 0),
+        item_quantity=sign * sum(item.quantity for item in items),
+        completed_count=completed,
+        cancelled_count=cancelled
+    )
+    table = HourlyRestaurantRollup.__table__.c
+    await db.execute(restaurant_row.on_conflict_do_update(
+        index_elements=RESTAURANT_KEYS,
+        set_={
+            column: table[column] + restaurant_row.excluded[column]
+            for column in ("order_count", "revenue", "item_quantity", "completed_count", "cancelled_count")
+        }
+    ))
+
+    if not sign or not items:
+        return
+
+    # One row per menu item even if it appears on several order lines
+    per_item: Dict[UUID, Dict[str, Any]] = defaultdict(lambda: {"quantity": 0, "revenue": 0.0})
+    for item in items:
+        entry = per_item[item.menu_item_id]
+        entry["item_name"] = item.item_name
+        entry["quantity"] += item.quantity
+        entry["revenue"] += float(item.item_price) * item.quantity
+
+    # Sorted so concurrent orders lock rows in the same order
+    rows = [
+        {
+            "restaurant_id": order.restaurant_id,
+            "bucket": bucket,
+            "menu_item_id": menu_item_id,
+            "order_type": order_type,
+            "item_name": entry["item_name"],
+            "quantity": sign * entry["quantity"],
+            "revenue": sign * entry["revenue"],
+            "order_count": sign
+        }
+        for menu_item_id, entry in sorted(per_item.items(), key=lambda kv: str(kv[0]))
+    ]
+    item_rows = pg_insert(HourlyItemRollup).values(rows)
+    table = HourlyItemRollup.__table__.c
+    await db.execute(item_rows.on_conflict_do_update(
+        index_elements=ITEM_KEYS,
+        set_={
+            "item_name": item_rows.excluded.item_name,
+            **{
+                column: table[column] + item_rows.excluded[column]
+                for column in ("quantity", "revenue", "order_count")
+            }
+        }
+    ))
+
+
+async def record_order_created(db: AsyncSession, order, items: Iterable[Any]):
+    """Count a new order; call before committing the order"""
+    await _apply(db, order, items, 1)
+
+
+async def record_status_change(db: AsyncSession, order, previous_status, items: Iterable[Any] = ()):
+    """
+    Adjust the rollups for a status transition; call before committing it
+
+    Cancelling takes the order out of the counts and revenue; completing
+    only bumps completed_count. items must be the order's items when the
+    transition is into or out of CANCELLED.
+    """
+    was_cancelled = previous_status == OrderStatus.CANCELLED
+    is_cancelled = order.status == OrderStatus.CANCELLED
+    sign = 0
+    cancelled = 0
+    if is_cancelled and not was_cancelled:
+        sign, cancelled = -1, 1
+    elif was_cancelled and not is_cancelled:
+        sign, cancelled = 1, -1
+
+    completed = int(order.status == OrderStatus.COMPLETED) - int(previous_status == OrderStatus.COMPLETED)
+    if sign or completed:
+        await _apply(db, order, items if sign else (), sign, completed, cancelled)
+
+
+# ============================================================================
+# Backfill
+# ============================================================================
+
+BACKFILL_RESTAURANT_SQL = """
+    INSERT INTO analytics_hourly_restaurant
+        (restaurant_id, bucket, order_type, order_count, revenue, item_quantity, completed_count, cancelled_count)
+    SELECT
+        o.restaurant_id,
+        DATE_TRUNC('hour', o.created_at),
+        o.order_type::text,
+        COUNT(*) FILTER (WHERE o.status <> 'CANCELLED'),
+        COALESCE(SUM(o.total) FILTER (WHERE o.status <> 'CANCELLED'), 0),
+        COALESCE(SUM(q.quantity) FILTER (WHERE o.status <> 'CANCELLED'), 0),
+        COUNT(*) FILTER (WHERE o.status = 'COMPLETED'),
+        COUNT(*) FILTER (WHERE o.status = 'CANCELLED')
+    FROM orders o
+    LEFT JOIN LATERAL (
+        SELECT SUM(oi.quantity) AS quantity FROM order_items oi WHERE oi.order_id = o.id
+    ) q ON TRUE
+    WHERE o.created_at >= :start_ts AND o.created_at < :end_ts {restaurant_filter}
+    GROUP BY 1, 2, 3
+"""
+
+BACKFILL_ITEM_SQL = """
+    INSERT INTO analytics_hourly_item
+        (restaurant_id, bucket, menu_item_id, order_type, item_name, quantity, revenue, order_count)
+    SELECT
+        o.restaurant_id,
+        DATE_TRUNC('hour', o.created_at),
+        oi.menu_item_id,
+        o.order_type::text,
+        (ARRAY_AGG(oi.item_name ORDER BY o.created_at DESC))[1],
+        SUM(oi.quantity),
+        SUM(oi.item_price * oi.quantity),
+        COUNT(DISTINCT o.id)
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.id
+    WHERE o.created_at >= :start_ts AND o.created_at < :end_ts
+        AND o.status <> 'CANCELLED' {restaurant_filter}
+    GROUP BY 1, 2, 3, 4
+"""
+
+
+async def backfill_range(
+    db: AsyncSession,
+    start_ts: datetime,
+    end_ts: datetime,
+    restaurant_id: Optional[UUID] = None
+):
+    """
+    Rebuild the buckets in [start_ts, end_ts) from orders, in one transaction
+
+    The rollup tables are locked against concurrent writers first, so order
+    transactions either finish before the rebuild reads orders or apply
+    their deltas after it commits; none is lost or counted twice.
+    """
+    params: Dict[str, Any] = {"start_ts": start_ts, "end_ts": end_ts}
+    rollup_filter = ""
+    order_filter = ""
+    if restaurant_id:
+        params["restaurant_id"] = str(restaurant_id)
+        rollup_filter = "AND restaurant_id = :restaurant_id"
+        order_filter = "AND o.restaurant_id = :restaurant_id"
+
+    await db.execute(text(
+        "LOCK TABLE analytics_hourly_restaurant, analytics_hourly_item IN SHARE ROW EXCLUSIVE MODE"
+    ))
+    for table in ("analytics_hourly_restaurant", "analytics_hourly_item"):
+        await db.execute(text(
+            f"DELETE FROM {table} WHERE bucket >= :start_ts AND bucket < :end_ts {rollup_filter}"
+        ), params)
+    await db.execute(text(BACKFILL_RESTAURANT_SQL.format(restaurant_filter=order_filter)), params)
+    await db.execute(text(BACKFILL_ITEM_SQL.format(restaurant_filter=order_filter)), params)
+
+
+async def backfill(
+    restaurant_id: Optional[UUID] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> int:
+    """Rebuild rollups day by day (one short transaction per day); returns days processed"""
+    from ..database import async_session_maker
+
+    async with async_session_maker() as db:
+        if start_date is None:
+            first = (await db.execute(text("SELECT MIN(created_at) FROM orders"))).scalar()
+            if first is None:
+                return 0
+            start_date = first.date()
+    end_date = end_date or datetime.utcnow().date()
+
+    days = 0
+    day = start_date
+    while day <= end_date:
+        start_ts, end_ts = day_range(day, day)
+        async with async_session_maker() as db:
+            async with db.begin():
+                await backfill_range(db, start_ts, end_ts, restaurant_id)
+        days += 1
+        if days % 30 == 0:
+            logger.info(f"Backfilled rollups through {day}")
+        day += timedelta(days=1)
+
+    logger.info(f"Backfilled rollups for {days} days ({start_date} to {end_date})")
+    return days
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain hourly analytics rollups")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subcommands.add_parser("backfill", help="Rebuild rollups from orders")
+    backfill_parser.add_argument("--restaurant-id", type=UUID, default=None)
+    backfill_parser.add_argument("--start", type=date.fromisoformat, default=None, help="First day (default: first order)")
+    backfill_parser.add_argument("--end", type=date.fromisoformat, default=None, help="Last day (default: today)")
+    args = parser.parse_args()
+
+    async def run():
+        from ..database import close_db
+        try:
+            await backfill(args.restaurant_id, args.start, args.end)
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 """
 Analytics Service for Order Service
 Business logic for analytics queries with optimized SQL
+
+Revenue, volume, timing and item metrics read the hourly rollup tables
+(analytics_hourly_restaurant / analytics_hourly_item, see
+analytics_rollups.py), so their cost depends on the number of hourly
+buckets in the range rather than the number of orders.
 """
 from datetime import datetime, timedelta, date
 from typing import List, Optional, Dict, Any
@@ -8,6 +13,7 @@ from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text, and_, func
 from shared.utils.logger import setup_logger
+from .analytics_rollups import day_range
 
 logger = setup_logger("analytics-service")
 
@@ -45,23 +51,24 @@ async def get_revenue_analytics(
 
     query = text("""
         SELECT
-            DATE_TRUNC(:trunc_format, o.created_at) as period,
-            SUM(o.total) as total_revenue,
-            COUNT(o.id) as order_count,
-            AVG(o.total) as avg_order_value
-        FROM orders o
-        WHERE o.restaurant_id = :restaurant_id
-            AND DATE(o.created_at) >= CAST(:start_date AS DATE)
-            AND DATE(o.created_at) <= :end_date
-            AND o.status NOT IN ('CANCELLED')
-        GROUP BY DATE_TRUNC(:trunc_format, o.created_at)
+            DATE_TRUNC(:trunc_format, r.bucket) as period,
+            SUM(r.revenue) as total_revenue,
+            SUM(r.order_count) as order_count,
+            SUM(r.revenue) / NULLIF(SUM(r.order_count), 0) as avg_order_value
+        FROM analytics_hourly_restaurant r
+        WHERE r.restaurant_id = :restaurant_id
+            AND r.bucket >= :start_ts
+            AND r.bucket < :end_ts
+        GROUP BY DATE_TRUNC(:trunc_format, r.bucket)
+        HAVING SUM(r.order_count) > 0
         ORDER BY period ASC
     """)
 
+    start_ts, end_ts = day_range(start_date, end_date)
     result = await db.execute(query, {
         "restaurant_id": str(restaurant_id),
-        "start_date": start_date,
-        "end_date": end_date,
+        "start_ts": start_ts,
+        "end_ts": end_ts,
         "trunc_format": trunc_format
     })
 
@@ -122,30 +129,26 @@ async def get_popular_items(
     query = text("""
         WITH recent_period AS (
             SELECT
-                oi.menu_item_id,
-                oi.item_name,
-                SUM(oi.quantity) as quantity_sold,
-                COUNT(DISTINCT oi.order_id) as order_count,
-                SUM(oi.item_price * oi.quantity) as revenue,
-                AVG(oi.item_price) as avg_price
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            WHERE o.restaurant_id = :restaurant_id
-                AND o.created_at >= NOW() - make_interval(days => :days)
-                AND o.status NOT IN ('CANCELLED')
-            GROUP BY oi.menu_item_id, oi.item_name
+                i.menu_item_id,
+                (ARRAY_AGG(i.item_name ORDER BY i.bucket DESC))[1] as item_name,
+                SUM(i.quantity) as quantity_sold,
+                SUM(i.order_count) as order_count,
+                SUM(i.revenue) as revenue,
+                SUM(i.revenue) / NULLIF(SUM(i.quantity), 0) as avg_price
+            FROM analytics_hourly_item i
+            WHERE i.restaurant_id = :restaurant_id
+                AND i.bucket >= DATE_TRUNC('hour', NOW() - make_interval(days => :days))
+            GROUP BY i.menu_item_id
         ),
         previous_period AS (
             SELECT
-                oi.menu_item_id,
-                SUM(oi.quantity) as quantity_sold
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            WHERE o.restaurant_id = :restaurant_id
-                AND o.created_at >= NOW() - make_interval(days => :days)
-                AND o.created_at < NOW() - make_interval(days => :half_days)
-                AND o.status NOT IN ('CANCELLED')
-            GROUP BY oi.menu_item_id
+                i.menu_item_id,
+                SUM(i.quantity) as quantity_sold
+            FROM analytics_hourly_item i
+            WHERE i.restaurant_id = :restaurant_id
+                AND i.bucket >= DATE_TRUNC('hour', NOW() - make_interval(days => :days))
+                AND i.bucket < DATE_TRUNC('hour', NOW() - make_interval(days => :half_days))
+            GROUP BY i.menu_item_id
         )
         SELECT
             r.menu_item_id,
@@ -217,28 +220,26 @@ async def get_day_patterns(
     query = text("""
         WITH day_sales AS (
             SELECT
-                EXTRACT(DOW FROM o.created_at) as day_number,
-                TO_CHAR(o.created_at, 'Day') as day_name,
-                COUNT(o.id) as orders,
-                SUM(o.total) as revenue
-            FROM orders o
-            WHERE o.restaurant_id = :restaurant_id
-                AND o.created_at >= NOW() - make_interval(weeks => :weeks)
-                AND o.status NOT IN ('CANCELLED')
-            GROUP BY EXTRACT(DOW FROM o.created_at), TO_CHAR(o.created_at, 'Day')
+                EXTRACT(DOW FROM r.bucket) as day_number,
+                TO_CHAR(r.bucket, 'Day') as day_name,
+                SUM(r.order_count) as orders,
+                SUM(r.revenue) as revenue
+            FROM analytics_hourly_restaurant r
+            WHERE r.restaurant_id = :restaurant_id
+                AND r.bucket >= DATE_TRUNC('hour', NOW() - make_interval(weeks => :weeks))
+            GROUP BY EXTRACT(DOW FROM r.bucket), TO_CHAR(r.bucket, 'Day')
+            HAVING SUM(r.order_count) > 0
         ),
         popular_by_day AS (
             SELECT
-                EXTRACT(DOW FROM o.created_at) as day_number,
-                oi.item_name,
-                SUM(oi.quantity) as quantity,
-                ROW_NUMBER() OVER (PARTITION BY EXTRACT(DOW FROM o.created_at) ORDER BY SUM(oi.quantity) DESC) as rank
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            WHERE o.restaurant_id = :restaurant_id
-                AND o.created_at >= NOW() - make_interval(weeks => :weeks)
-                AND o.status NOT IN ('CANCELLED')
-            GROUP BY EXTRACT(DOW FROM o.created_at), oi.item_name
+                EXTRACT(DOW FROM i.bucket) as day_number,
+                i.item_name,
+                SUM(i.quantity) as quantity,
+                ROW_NUMBER() OVER (PARTITION BY EXTRACT(DOW FROM i.bucket) ORDER BY SUM(i.quantity) DESC) as rank
+            FROM analytics_hourly_item i
+            WHERE i.restaurant_id = :restaurant_id
+                AND i.bucket >= DATE_TRUNC('hour', NOW() - make_interval(weeks => :weeks))
+            GROUP BY EXTRACT(DOW FROM i.bucket), i.item_name
         )
         SELECT
             ds.day_number,
@@ -295,22 +296,23 @@ async def get_order_volume(
 
     query = text("""
         SELECT
-            DATE_TRUNC(:trunc_format, o.created_at) as period,
-            COUNT(o.id) as order_count,
-            AVG(o.total) as avg_order_value
-        FROM orders o
-        WHERE o.restaurant_id = :restaurant_id
-            AND DATE(o.created_at) >= CAST(:start_date AS DATE)
-            AND DATE(o.created_at) <= CAST(:end_date AS DATE)
-            AND o.status NOT IN ('CANCELLED')
-        GROUP BY DATE_TRUNC(:trunc_format, o.created_at)
+            DATE_TRUNC(:trunc_format, r.bucket) as period,
+            SUM(r.order_count) as order_count,
+            SUM(r.revenue) / NULLIF(SUM(r.order_count), 0) as avg_order_value
+        FROM analytics_hourly_restaurant r
+        WHERE r.restaurant_id = :restaurant_id
+            AND r.bucket >= :start_ts
+            AND r.bucket < :end_ts
+        GROUP BY DATE_TRUNC(:trunc_format, r.bucket)
+        HAVING SUM(r.order_count) > 0
         ORDER BY period ASC
     """)
 
+    start_ts, end_ts = day_range(start_date, end_date)
     result = await db.execute(query, {
         "restaurant_id": str(restaurant_id),
-        "start_date": start_date,
-        "end_date": end_date,
+        "start_ts": start_ts,
+        "end_ts": end_ts,
         "trunc_format": trunc_format
     })
 
@@ -368,17 +370,18 @@ async def get_category_performance(
         FROM order_items oi
         JOIN orders o ON oi.order_id = o.id
         WHERE o.restaurant_id = :restaurant_id
-            AND DATE(o.created_at) >= CAST(:start_date AS DATE)
-            AND DATE(o.created_at) <= CAST(:end_date AS DATE)
+            AND o.created_at >= :start_ts
+            AND o.created_at < :end_ts
             AND o.status NOT IN ('CANCELLED')
         GROUP BY category
     """)
 
+    start_ts, end_ts = day_range(start_date, end_date)
     try:
         result = await db.execute(query, {
             "restaurant_id": str(restaurant_id),
-            "start_date": start_date,
-            "end_date": end_date
+            "start_ts": start_ts,
+            "end_ts": end_ts
         })
 
         categories = []
@@ -412,22 +415,23 @@ async def get_peak_hours(
     """
     query = text("""
         SELECT
-            EXTRACT(HOUR FROM o.created_at) as hour,
-            COUNT(o.id) as orders,
-            SUM(o.total) as revenue
-        FROM orders o
-        WHERE o.restaurant_id = :restaurant_id
-            AND DATE(o.created_at) >= CAST(:start_date AS DATE)
-            AND DATE(o.created_at) <= CAST(:end_date AS DATE)
-            AND o.status NOT IN ('CANCELLED')
-        GROUP BY EXTRACT(HOUR FROM o.created_at)
+            EXTRACT(HOUR FROM r.bucket) as hour,
+            SUM(r.order_count) as orders,
+            SUM(r.revenue) as revenue
+        FROM analytics_hourly_restaurant r
+        WHERE r.restaurant_id = :restaurant_id
+            AND r.bucket >= :start_ts
+            AND r.bucket < :end_ts
+        GROUP BY EXTRACT(HOUR FROM r.bucket)
+        HAVING SUM(r.order_count) > 0
         ORDER BY hour
     """)
 
+    start_ts, end_ts = day_range(start_date, end_date)
     result = await db.execute(query, {
         "restaurant_id": str(restaurant_id),
-        "start_date": start_date,
-        "end_date": end_date
+        "start_ts": start_ts,
+        "end_ts": end_ts
     })
 
     # Calculate number of days for averaging
@@ -494,24 +498,22 @@ async def get_sales_comparison(
     query = text(f"""
         WITH current_period AS (
             SELECT
-                SUM(total) as revenue,
-                COUNT(id) as orders,
-                AVG(total) as avg_order_value
-            FROM orders
+                SUM(revenue) as revenue,
+                SUM(order_count) as orders,
+                SUM(revenue) / NULLIF(SUM(order_count), 0) as avg_order_value
+            FROM analytics_hourly_restaurant
             WHERE restaurant_id = :restaurant_id
-                AND created_at >= NOW() - INTERVAL '{interval}'
-                AND status NOT IN ('CANCELLED')
+                AND bucket >= DATE_TRUNC('hour', NOW() - INTERVAL '{interval}')
         ),
         previous_period AS (
             SELECT
-                SUM(total) as revenue,
-                COUNT(id) as orders,
-                AVG(total) as avg_order_value
-            FROM orders
+                SUM(revenue) as revenue,
+                SUM(order_count) as orders,
+                SUM(revenue) / NULLIF(SUM(order_count), 0) as avg_order_value
+            FROM analytics_hourly_restaurant
             WHERE restaurant_id = :restaurant_id
-                AND created_at >= NOW() - INTERVAL '{interval}' - INTERVAL '{interval}'
-                AND created_at < NOW() - INTERVAL '{interval}'
-                AND status NOT IN ('CANCELLED')
+                AND bucket >= DATE_TRUNC('hour', NOW() - INTERVAL '{interval}' - INTERVAL '{interval}')
+                AND bucket < DATE_TRUNC('hour', NOW() - INTERVAL '{interval}')
         )
         SELECT
             c.revenue as current_revenue,
@@ -582,27 +584,26 @@ async def get_top_performers(
 
     query = text(f"""
         SELECT
-            oi.menu_item_id,
-            oi.item_name,
-            SUM(oi.quantity) as quantity_sold,
-            COUNT(DISTINCT oi.order_id) as order_count,
-            SUM(oi.item_price * oi.quantity) as revenue,
-            AVG(oi.item_price) as avg_price
-        FROM order_items oi
-        JOIN orders o ON oi.order_id = o.id
-        WHERE o.restaurant_id = :restaurant_id
-            AND DATE(o.created_at) >= CAST(:start_date AS DATE)
-            AND DATE(o.created_at) <= CAST(:end_date AS DATE)
-            AND o.status NOT IN ('CANCELLED')
-        GROUP BY oi.menu_item_id, oi.item_name
+            i.menu_item_id,
+            (ARRAY_AGG(i.item_name ORDER BY i.bucket DESC))[1] as item_name,
+            SUM(i.quantity) as quantity_sold,
+            SUM(i.order_count) as order_count,
+            SUM(i.revenue) as revenue,
+            SUM(i.revenue) / NULLIF(SUM(i.quantity), 0) as avg_price
+        FROM analytics_hourly_item i
+        WHERE i.restaurant_id = :restaurant_id
+            AND i.bucket >= :start_ts
+            AND i.bucket < :end_ts
+        GROUP BY i.menu_item_id
         ORDER BY {order_by}
         LIMIT :limit
     """)
 
+    start_ts, end_ts = day_range(start_date, end_date)
     result = await db.execute(query, {
         "restaurant_id": str(restaurant_id),
-        "start_date": start_date,
-        "end_date": end_date,
+        "start_ts": start_ts,
+        "end_ts": end_ts,
         "limit": limit
     })
 
@@ -640,34 +641,25 @@ async def get_order_type_breakdown(
     Analyze orders by type (table vs online)
     """
     query = text("""
-        WITH totals AS (
-            SELECT
-                SUM(total) as total_revenue,
-                COUNT(id) as total_orders
-            FROM orders
-            WHERE restaurant_id = :restaurant_id
-                AND created_at >= CAST(:start_date AS DATE)
-                AND created_at <= CAST(:end_date AS DATE)
-                AND status NOT IN ('CANCELLED')
-        )
         SELECT
-            o.order_type,
-            SUM(o.total) as revenue,
-            COUNT(o.id) as order_count,
-            AVG(o.total) as avg_order_value,
-            (SUM(o.total) / t.total_revenue * 100) as percentage
-        FROM orders o, totals t
-        WHERE o.restaurant_id = :restaurant_id
-            AND DATE(o.created_at) >= CAST(:start_date AS DATE)
-            AND DATE(o.created_at) <= CAST(:end_date AS DATE)
-            AND o.status NOT IN ('CANCELLED')
-        GROUP BY o.order_type, t.total_revenue
+            r.order_type,
+            SUM(r.revenue) as revenue,
+            SUM(r.order_count) as order_count,
+            SUM(r.revenue) / NULLIF(SUM(r.order_count), 0) as avg_order_value,
+            SUM(r.revenue) / NULLIF(SUM(SUM(r.revenue)) OVER (), 0) * 100 as percentage
+        FROM analytics_hourly_restaurant r
+        WHERE r.restaurant_id = :restaurant_id
+            AND r.bucket >= :start_ts
+            AND r.bucket < :end_ts
+        GROUP BY r.order_type
+        HAVING SUM(r.order_count) > 0
     """)
 
+    start_ts, end_ts = day_range(start_date, end_date)
     result = await db.execute(query, {
         "restaurant_id": str(restaurant_id),
-        "start_date": start_date,
-        "end_date": end_date
+        "start_ts": start_ts,
+        "end_ts": end_ts
     })
 
     breakdown = []
@@ -705,25 +697,26 @@ async def get_customer_behavior(
                 MIN(created_at) as first_order
             FROM orders
             WHERE restaurant_id = :restaurant_id
-                AND created_at >= CAST(:start_date AS DATE)
-                AND created_at <= CAST(:end_date AS DATE)
+                AND created_at >= :start_ts
+                AND created_at < :end_ts
                 AND status NOT IN ('CANCELLED')
                 AND (customer_id IS NOT NULL OR customer_email IS NOT NULL OR customer_phone IS NOT NULL)
             GROUP BY COALESCE(customer_id::text, customer_email, customer_phone)
         )
         SELECT
             COUNT(DISTINCT customer_identifier) as total_customers,
-            COUNT(CASE WHEN first_order >= CAST(:start_date AS DATE) THEN 1 END) as new_customers,
-            COUNT(CASE WHEN first_order < :start_date THEN 1 END) as returning_customers,
+            COUNT(CASE WHEN first_order >= :start_ts THEN 1 END) as new_customers,
+            COUNT(CASE WHEN first_order < :start_ts THEN 1 END) as returning_customers,
             AVG(order_count) as avg_orders_per_customer,
             AVG(total_spent) as avg_lifetime_value
         FROM customer_orders
     """)
 
+    start_ts, end_ts = day_range(start_date, end_date)
     result = await db.execute(query, {
         "restaurant_id": str(restaurant_id),
-        "start_date": start_date,
-        "end_date": end_date
+        "start_ts": start_ts,
+        "end_ts": end_ts
     })
 
     row = result.fetchone()
@@ -740,6 +733,7 @@ async def get_customer_behavior(
         repeat_rate = (returning_customers / total_customers) * 100
 
     return {
+        "total_customers": total_customers,
         "new_customers": new_customers,
         "returning_customers": returning_customers,
         "repeat_rate": round(repeat_rate, 2),
@@ -800,7 +794,7 @@ async def get_demand_predictions(
                 JOIN menu_items mi ON oi.menu_item_id = mi.id
                 WHERE o.restaurant_id = :restaurant_id
                     AND o.status IN ('SERVED', 'PREPARING', 'COMPLETED')
-                    AND DATE(o.created_at) >= CURRENT_DATE - INTERVAL '90 days'
+                    AND o.created_at >= CURRENT_DATE - INTERVAL '90 days'
                 GROUP BY oi.menu_item_id, mi.name
                 HAVING SUM(oi.quantity) >= 2  -- Lowered threshold for sparse test data
                 ORDER BY total_quantity DESC
@@ -815,6 +809,7 @@ async def get_demand_predictions(
                 JOIN orders o ON oi.order_id = o.id
                 WHERE o.restaurant_id = :restaurant_id
                     AND o.status IN ('SERVED', 'PREPARING', 'COMPLETED')
+                    AND o.created_at >= CURRENT_DATE - INTERVAL '90 days'
                     AND oi.menu_item_id IN (SELECT menu_item_id FROM top_items)
                 GROUP BY oi.menu_item_id, DATE(o.created_at)
             )
@@ -0,0 +1,553 @@
+"""
+Approximate analytics from daily sketches for Order Service
+Each closed day of a restaurant is summarised once in analytics_daily_sketches:
+a HyperLogLog of customer identities plus exact order and revenue totals,
+and the day's top items with the largest quantity left out. Approximate
+(approx=true) queries merge one small row per day instead of aggregating
+every order, so their latency hardly grows with the range; the current
+day is summarised live with the same SQL.
+
+Register hashes are computed by Postgres (hashtextextended), so sketches
+built in the database and live ones always agree.
+
+    python -m app.services.analytics_sketches build
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("analytics-sketches")
+
+# Items kept per restaurant and day
+ANALYTICS_SKETCH_TOP_K = int(os.getenv("ANALYTICS_SKETCH_TOP_K", "50"))
+# Seconds between sketch refreshes in the service (0 disables; use the CLI)
+ANALYTICS_SKETCH_REFRESH_SECONDS = float(os.getenv("ANALYTICS_SKETCH_REFRESH_SECONDS", "3600"))
+# Closed days re-checked for changed orders on a regular refresh
+ANALYTICS_SKETCH_RECHECK_DAYS = int(os.getenv("ANALYTICS_SKETCH_RECHECK_DAYS", "7"))
+# Seconds between refreshes that check every day of history
+ANALYTICS_SKETCH_FULL_SWEEP_SECONDS = float(os.getenv("ANALYTICS_SKETCH_FULL_SWEEP_SECONDS", "86400"))
+# Postgres aborts a single day's build running longer than this
+ANALYTICS_SKETCH_BUILD_TIMEOUT_MS = int(os.getenv("ANALYTICS_SKETCH_BUILD_TIMEOUT_MS", "60000"))
+
+# Days compared per statement during a full sweep
+SWEEP_CHUNK_DAYS = 31
+
+# 2^12 registers: 4 KB per restaurant-day, 1.6% relative standard error
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_RELATIVE_ERROR = 1.04 / math.sqrt(HLL_REGISTERS)
+# Two-sided 95% interval
+Z_95 = 1.96
+
+IDENTIFIED = """
+    status <> 'CANCELLED'
+    AND (customer_id IS NOT NULL OR customer_email IS NOT NULL OR customer_phone IS NOT NULL)
+"""
+
+# Register index from the low bits of the hash, rank (leading zeros + 1)
+# from the remaining 52 bits
+HLL_SQL = f"""
+    SELECT
+        restaurant_id::text as restaurant_id,
+        created_at::date as day,
+        (h & {HLL_REGISTERS - 1}) as register,
+        MAX({65 - HLL_PRECISION} - LENGTH(LTRIM(
+            ((h >> {HLL_PRECISION}) & {(1 << (64 - HLL_PRECISION)) - 1})::bit(64)::text, '0'
+        ))) as rank
+    FROM (
+        SELECT
+            restaurant_id,
+            created_at,
+            hashtextextended(COALESCE(customer_id::text, customer_email, customer_phone), 0) as h
+        FROM orders
+        WHERE created_at >= :start_ts AND created_at < :end_ts {{restaurant_filter}}
+            AND {IDENTIFIED}
+    ) hashed
+    GROUP BY 1, 2, 3
+"""
+
+DAY_TOTALS_SQL = f"""
+    SELECT
+        restaurant_id::text as restaurant_id,
+        created_at::date as day,
+        COUNT(*) as source_orders,
+        MAX(updated_at) as source_updated_at,
+        COUNT(*) FILTER (WHERE {IDENTIFIED}) as identified_orders,
+        COALESCE(SUM(total) FILTER (WHERE {IDENTIFIED}), 0) as identified_revenue
+    FROM orders
+    WHERE created_at >= :start_ts AND created_at < :end_ts {{restaurant_filter}}
+    GROUP BY 1, 2
+"""
+
+# Top K + 1 items per day: the extra one bounds everything left out
+TOP_ITEMS_SQL = """
+    SELECT restaurant_id, day, menu_item_id, item_name, quantity, revenue, order_count, item_rank
+    FROM (
+        SELECT
+            i.restaurant_id::text as restaurant_id,
+            i.bucket::date as day,
+            i.menu_item_id::text as menu_item_id,
+            (ARRAY_AGG(i.item_name ORDER BY i.bucket DESC))[1] as item_name,
+            SUM(i.quantity) as quantity,
+            SUM(i.revenue) as revenue,
+            SUM(i.order_count) as order_count,
+            ROW_NUMBER() OVER (
+                PARTITION BY i.restaurant_id, i.bucket::date
+                ORDER BY SUM(i.quantity) DESC, i.menu_item_id
+            ) as item_rank
+        FROM analytics_hourly_item i
+        WHERE i.bucket >= :start_ts AND i.bucket < :end_ts {restaurant_filter}
+        GROUP BY i.restaurant_id, i.bucket::date, i.menu_item_id
+        HAVING SUM(i.quantity) > 0
+    ) ranked
+    WHERE item_rank <= :top_k + 1
+"""
+
+SOURCE_STATE_SQL = """
+    SELECT restaurant_id::text as restaurant_id, created_at::date as day,
+        COUNT(*) as source_orders, MAX(updated_at) as source_updated_at
+    FROM orders
+    WHERE created_at >= :start_ts AND created_at < :end_ts
+    GROUP BY 1, 2
+"""
+
+STORED_STATE_SQL = """
+    SELECT restaurant_id::text as restaurant_id, day, source_orders, source_updated_at
+    FROM analytics_daily_sketches
+    WHERE day >= :start_day AND day < :end_day
+"""
+
+FIRST_DAY_SQL = """
+    SELECT LEAST(
+        (SELECT MIN(created_at)::date FROM orders),
+        (SELECT MIN(day) FROM analytics_daily_sketches)
+    )
+"""
+
+
+@dataclass
+class DaySketch:
+    """One restaurant-day: customer registers, identified totals and top items"""
+    registers: np.ndarray = field(default_factory=lambda: np.zeros(HLL_REGISTERS, dtype=np.uint8))
+    identified_orders: int = 0
+    identified_revenue: float = 0.0
+    # [menu_item_id, item_name, quantity, revenue, order_count], by quantity
+    top_items: List[list] = field(default_factory=list)
+    # Quantity of the best item left out (0 if none was)
+    top_items_threshold: int = 0
+    source_orders: int = 0
+    source_updated_at: Optional[datetime] = None
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    """HyperLogLog cardinality estimate with the small-range correction"""
+    m = float(len(registers))
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / float(np.sum(np.power(2.0, -registers.astype(np.float64))))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate for small sets
+        estimate = m * math.log(m / zeros)
+    return estimate
+
+
+async def summarise(
+    db: AsyncSession,
+    start_ts: datetime,
+    end_ts: datetime,
+    restaurant_id: Optional[str] = None
+) -> Dict[Tuple[str, date], DaySketch]:
+    """Sketches of every restaurant-day with orders in [start_ts, end_ts)"""
+    params: Dict[str, Any] = {"start_ts": start_ts, "end_ts": end_ts, "top_k": ANALYTICS_SKETCH_TOP_K}
+    order_filter = ""
+    item_filter = ""
+    if restaurant_id:
+        params["restaurant_id"] = restaurant_id
+        order_filter = "AND restaurant_id = :restaurant_id"
+        item_filter = "AND i.restaurant_id = :restaurant_id"
+
+    sketches: Dict[Tuple[str, date], DaySketch] = {}
+    for row in (await db.execute(text(DAY_TOTALS_SQL.format(restaurant_filter=order_filter)), params)).fetchall():
+        sketches[(row.restaurant_id, row.day)] = DaySketch(
+            identified_orders=int(row.identified_orders),
+            identified_revenue=float(row.identified_revenue),
+            source_orders=int(row.source_orders),
+            source_updated_at=row.source_updated_at
+        )
+
+    for row in (await db.execute(text(HLL_SQL.format(restaurant_filter=order_filter)), params)).fetchall():
+        sketch = sketches.get((row.restaurant_id, row.day))
+        if sketch is not None:
+            sketch.registers[row.register] = row.rank
+
+    for row in (await db.execute(text(TOP_ITEMS_SQL.format(restaurant_filter=item_filter)), params)).fetchall():
+        sketch = sketches.get((row.restaurant_id, row.day))
+        if sketch is None:
+            continue
+        if row.item_rank > ANALYTICS_SKETCH_TOP_K:
+            sketch.top_items_threshold = int(row.quantity)
+        else:
+            sketch.top_items.append([
+                row.menu_item_id, row.item_name, int(row.quantity), float(row.revenue), int(row.order_count)
+            ])
+
+    for sketch in sketches.values():
+        sketch.top_items.sort(key=lambda item: item[2], reverse=True)
+    return sketches
+
+
+# ============================================================================
+# Building
+# ============================================================================
+
+async def build_day(db: AsyncSession, day: date):
+    """Replace the sketches of one day (all restaurants), in the caller's transaction"""
+    start_ts = datetime.combine(day, dt_time.min)
+    sketches = await summarise(db, start_ts, start_ts + timedelta(days=1))
+    await db.execute(text("DELETE FROM analytics_daily_sketches WHERE day = :day"), {"day": day})
+    if not sketches:
+        return
+    await db.execute(
+        text("""
+            INSERT INTO analytics_daily_sketches (
+                restaurant_id, day, customers_hll, identified_orders, identified_revenue,
+                top_items, top_items_threshold, source_orders, source_updated_at
+            ) VALUES (
+                CAST(:restaurant_id AS UUID), :day, :customers_hll, :identified_orders, :identified_revenue,
+                CAST(:top_items AS JSONB), :top_items_threshold, :source_orders, :source_updated_at
+            )
+        """),
+        [
+            {
+                "restaurant_id": restaurant_id,
+                "day": sketch_day,
+                "customers_hll": sketch.registers.tobytes(),
+                "identified_orders": sketch.identified_orders,
+                "identified_revenue": sketch.identified_revenue,
+                "top_items": json.dumps(sketch.top_items),
+                "top_items_threshold": sketch.top_items_threshold,
+                "source_orders": sketch.source_orders,
+                "source_updated_at": sketch.source_updated_at
+            }
+            for (restaurant_id, sketch_day), sketch in sketches.items()
+        ]
+    )
+
+
+async def find_stale_days(db: AsyncSession, start_day: date, end_day: date) -> List[date]:
+    """Days in [start_day, end_day) whose orders no longer match their sketches"""
+    current = {
+        (row.restaurant_id, row.day): (int(row.source_orders), row.source_updated_at)
+        for row in (await db.execute(text(SOURCE_STATE_SQL), {
+            "start_ts": datetime.combine(start_day, dt_time.min),
+            "end_ts": datetime.combine(end_day, dt_time.min)
+        })).fetchall()
+    }
+    stored = {
+        (row.restaurant_id, row.day): (int(row.source_orders), row.source_updated_at)
+        for row in (await db.execute(
+            text(STORED_STATE_SQL), {"start_day": start_day, "end_day": end_day}
+        )).fetchall()
+    }
+    return sorted(
+        {key[1] for key, state in current.items() if stored.get(key) != state}
+        | {key[1] for key in stored.keys() - current.keys()}
+    )
+
+
+async def refresh(
+    session_factory: Callable[[], AsyncSession] = None,
+    today: Optional[date] = None,
+    days: Optional[int] = None,
+    read_session_factory: Callable[[], AsyncSession] = None
+) -> int:
+    """
+    Rebuild the sketches of closed days whose orders changed (or that have none yet)
+
+    Only the last `days` closed days are checked, or all of history, a month
+    per statement, when days is None. Changes are found on the analytics
+    pool (statement timeout) and days are rebuilt on the primary. Returns the
+    number of days rebuilt.
+    """
+    if session_factory is None:
+        from ..database import async_session_maker
+        session_factory = async_session_maker
+    if read_session_factory is None:
+        from ..database import analytics_session_maker
+        read_session_factory = analytics_session_maker
+    today = today or datetime.utcnow().date()
+
+    if days is None:
+        async with read_session_factory() as db:
+            start_day = (await db.execute(text(FIRST_DAY_SQL))).scalar() or today
+    else:
+        start_day = today - timedelta(days=days)
+
+    stale_days: List[date] = []
+    while start_day < today:
+        end_day = min(start_day + timedelta(days=SWEEP_CHUNK_DAYS), today)
+        async with read_session_factory() as db:
+            stale_days += await find_stale_days(db, start_day, end_day)
+        start_day = end_day
+
+    for number, day in enumerate(stale_days, 1):
+        async with session_factory() as db:
+            async with db.begin():
+                await db.execute(text(f"SET LOCAL statement_timeout = {ANALYTICS_SKETCH_BUILD_TIMEOUT_MS}"))
+                await build_day(db, day)
+        if number % 30 == 0:
+            logger.info(f"Built analytics sketches for {number}/{len(stale_days)} days")
+
+    if stale_days:
+        logger.info(f"Rebuilt analytics sketches for {len(stale_days)} days")
+    return len(stale_days)
+
+
+# ============================================================================
+# Approximate queries
+# ============================================================================
+
+async def load_sketches(db: AsyncSession, restaurant_id: UUID, start_day: date, end_day: date) -> Dict[date, DaySketch]:
+    """Sketches of the restaurant for days start_day..end_day; days not built yet are summarised live"""
+    result = await db.execute(
+        text("""
+            SELECT day, customers_hll, identified_orders, identified_revenue, top_items, top_items_threshold
+            FROM analytics_daily_sketches
+            WHERE restaurant_id = :restaurant_id AND day >= :start_day AND day <= :end_day
+        """),
+        {"restaurant_id": str(restaurant_id), "start_day": start_day, "end_day": end_day}
+    )
+    sketches = {}
+    for row in result.fetchall():
+        top_items = row.top_items if isinstance(row.top_items, list) else json.loads(row.top_items)
+        sketches[row.day] = DaySketch(
+            registers=np.frombuffer(row.customers_hll, dtype=np.uint8),
+            identified_orders=row.identified_orders,
+            identified_revenue=row.identified_revenue,
+            top_items=top_items,
+            top_items_threshold=row.top_items_threshold
+        )
+
+    # Days after the last build (today, or more if the builder is behind)
+    built_through = (await db.execute(text("SELECT MAX(day) FROM analytics_daily_sketches"))).scalar()
+    live_start = max(start_day, built_through + timedelta(days=1)) if built_through else start_day
+    if live_start <= end_day:
+        live = await summarise(
+            db,
+            datetime.combine(live_start, dt_time.min),
+            datetime.combine(end_day + timedelta(days=1), dt_time.min),
+            str(restaurant_id)
+        )
+        sketches.update({day: sketch for (_, day), sketch in live.items()})
+    return sketches
+
+
+async def get_customer_behavior(
+    db: AsyncSession,
+    restaurant_id: UUID,
+    start_date: date,
+    end_date: date
+) -> Dict[str, Any]:
+    """
+    Approximate analytics_service.get_customer_behavior from the daily sketches
+
+    Distinct customers come from the merged HyperLogLog; order and revenue
+    totals are exact, so the per-customer averages carry the same relative
+    error. error_bounds holds 95% intervals.
+    """
+    sketches = list((await load_sketches(db, restaurant_id, start_date, end_date)).values())
+    registers = np.maximum.reduce([sketch.registers for sketch in sketches]) if sketches else np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    customers = hll_estimate(registers)
+    orders = sum(sketch.identified_orders for sketch in sketches)
+    revenue = sum(sketch.identified_revenue for sketch in sketches)
+
+    total_customers = int(round(customers))
+    low = max(customers * (1 - Z_95 * HLL_RELATIVE_ERROR), 0.0)
+    high = customers * (1 + Z_95 * HLL_RELATIVE_ERROR)
+
+    def per_customer(amount: float) -> Tuple[float, List[float]]:
+        if not total_customers:
+            return 0.0, [0.0, 0.0]
+        return round(amount / customers, 2), [round(amount / high, 2), round(amount / max(low, 1.0), 2)]
+
+    avg_orders, avg_orders_interval = per_customer(orders)
+    avg_value, avg_value_interval = per_customer(revenue)
+
+    # Same definitions as the exact query, where first_order is taken within the range
+    return {
+        "total_customers": total_customers,
+        "new_customers": total_customers,
+        "returning_customers": 0,
+        "repeat_rate": 0.0,
+        "avg_orders_per_customer": avg_orders,
+        "avg_customer_lifetime_value": avg_value,
+        "approximate": True,
+        "error_bounds": {
+            "method": "hyperloglog",
+            "relative_standard_error": round(HLL_RELATIVE_ERROR, 4),
+            "confidence": 0.95,
+            "intervals": {
+                "total_customers": [int(math.floor(low)), int(math.ceil(high))],
+                "new_customers": [int(math.floor(low)), int(math.ceil(high))],
+                "avg_orders_per_customer": avg_orders_interval,
+                "avg_customer_lifetime_value": avg_value_interval
+            }
+        }
+    }
+
+
+async def get_popular_items(
+    db: AsyncSession,
+    restaurant_id: UUID,
+    days: int = 30,
+    limit: int = 10
+) -> Dict[str, Any]:
+    """
+    Approximate analytics_service.get_popular_items from the daily top items
+
+    Windows are whole days. An item missing from a day's summary sold at most
+    that day's threshold there, so quantity_sold is a lower bound and
+    quantity_error the most it can be short by; both are 0 apart when no
+    summary in the window was truncated.
+    """
+    today = datetime.utcnow().date()
+    start_day = today - timedelta(days=days)
+    previous_end = today - timedelta(days=days // 2)
+    sketches = await load_sketches(db, restaurant_id, start_day, today)
+
+    items: Dict[str, Dict[str, Any]] = {}
+    total_threshold = 0
+    for day in sorted(sketches):
+        sketch = sketches[day]
+        total_threshold += sketch.top_items_threshold
+        for menu_item_id, item_name, quantity, revenue, order_count in sketch.top_items:
+            item = items.setdefault(menu_item_id, {
+                "item_name": item_name, "quantity": 0, "revenue": 0.0, "orders": 0, "previous": 0, "covered": 0
+            })
+            item["item_name"] = item_name
+            item["quantity"] += quantity
+            item["revenue"] += revenue
+            item["orders"] += order_count
+            item["covered"] += sketch.top_items_threshold
+            if day < previous_end:
+                item["previous"] += quantity
+
+    ranked = sorted(items.items(), key=lambda kv: kv[1]["quantity"], reverse=True)[:limit]
+    results = []
+    for menu_item_id, item in ranked:
+        quantity_sold = item["quantity"]
+        previous = item["previous"]
+        if not previous:
+            trend = "new"
+        elif quantity_sold > previous * 1.1:
+            trend = "up"
+        elif quantity_sold < previous * 0.9:
+            trend = "down"
+        else:
+            trend = "stable"
+        results.append({
+            "menu_item_id": menu_item_id,
+            "item_name": item["item_name"],
+            "order_count": item["orders"],
+            "quantity_sold": quantity_sold,
+            "revenue": round(item["revenue"], 2),
+            "avg_price": round(item["revenue"] / quantity_sold, 2) if quantity_sold else 0.0,
+            "trend": trend,
+            "trend_percentage": round((quantity_sold - previous) / previous * 100, 2) if previous else None,
+            # Thresholds of the days this item was left out of
+            "quantity_error": total_threshold - item["covered"]
+        })
+
+    return {
+        "items": results,
+        "approximate": True,
+        "error_bounds": {
+            "method": "daily top-k summaries",
+            "top_k": ANALYTICS_SKETCH_TOP_K,
+            "max_quantity_error": max((item["quantity_error"] for item in results), default=0),
+            # Items not listed sold at most this much over the window
+            "unlisted_quantity_max": (ranked[-1][1]["quantity"] if len(ranked) == limit else 0) + total_threshold,
+            "window": f"{start_day.isoformat()} to {today.isoformat()} (whole days)"
+        }
+    }
+
+
+class SketchBuilder:
+    """Refreshes the daily sketches in the background"""
+
+    def __init__(
+        self,
+        interval: float = ANALYTICS_SKETCH_REFRESH_SECONDS,
+        full_sweep_interval: float = ANALYTICS_SKETCH_FULL_SWEEP_SECONDS
+    ):
+        self.interval = interval
+        self.full_sweep_interval = full_sweep_interval
+        self.days_rebuilt = 0
+        self._last_full_sweep: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.interval <= 0:
+            logger.info("Analytics sketch refreshes disabled")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            # The first pass also builds days missed while the service was down
+            full_sweep = self._last_full_sweep is None or started - self._last_full_sweep >= self.full_sweep_interval
+            try:
+                self.days_rebuilt += await refresh(days=None if full_sweep else ANALYTICS_SKETCH_RECHECK_DAYS)
+                if full_sweep:
+                    self._last_full_sweep = started
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics sketch refresh failed: {e}")
+            await asyncio.sleep(max(self.interval - (time.monotonic() - started), 1.0))
+
+
+# Global sketch builder
+sketch_builder = SketchBuilder()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain daily sketches for approximate analytics")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="Build sketches for closed days that are missing or changed")
+    build.add_argument("--days", type=int, default=None, help="Only check the last N closed days (default: all)")
+    args = parser.parse_args()
+
+    async def run():
+        from ..database import close_db
+        try:
+            await refresh(days=args.days)
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
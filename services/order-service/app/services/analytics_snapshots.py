@@ -0,0 +1,614 @@
+"""
+Columnar analytics snapshots for Order Service
+Closed months of orders and order_items are exported to Parquet files
+partitioned by restaurant and month, and long-range revenue, day-pattern and
+customer-behaviour queries are answered from them by an embedded DuckDB
+engine. The current month (everything after the snapshot horizon) is read
+from Postgres and combined with the files, so results match the Postgres
+path. Short ranges keep using Postgres directly.
+
+Exports are incremental: a partition is rewritten only when its order count
+or latest updated_at changed since the last export.
+
+    python -m app.services.analytics_snapshots export
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared.utils.logger import setup_logger
+from .analytics_rollups import day_range
+from . import analytics_service
+
+logger = setup_logger("analytics-snapshots")
+
+# Directory holding the Parquet partitions and their manifest
+ANALYTICS_SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "/app/analytics_snapshots")
+# Ranges at least this long are answered from the snapshots
+ANALYTICS_SNAPSHOT_MIN_DAYS = int(os.getenv("ANALYTICS_SNAPSHOT_MIN_DAYS", "90"))
+# Seconds between incremental exports in the service (0 disables; use the CLI)
+ANALYTICS_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("ANALYTICS_SNAPSHOT_REFRESH_SECONDS", "3600"))
+# Exports scan all closed months, which can outlast the analytics statement timeout
+EXPORT_STATEMENT_TIMEOUT = "10min"
+
+MANIFEST = "manifest.json"
+
+# Columnar engine (optional - analytics fall back to Postgres)
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    ORDERS_SCHEMA = pa.schema([
+        ("id", pa.string()),
+        ("customer_id", pa.string()),
+        ("customer_email", pa.string()),
+        ("customer_phone", pa.string()),
+        ("status", pa.string()),
+        ("order_type", pa.string()),
+        ("subtotal", pa.float64()),
+        ("tax", pa.float64()),
+        ("total", pa.float64()),
+        ("created_at", pa.timestamp("us")),
+        ("updated_at", pa.timestamp("us")),
+    ])
+    # Items carry their order's status and created_at so queries need no join
+    ITEMS_SCHEMA = pa.schema([
+        ("order_id", pa.string()),
+        ("menu_item_id", pa.string()),
+        ("item_name", pa.string()),
+        ("item_price", pa.float64()),
+        ("quantity", pa.int32()),
+        ("status", pa.string()),
+        ("order_type", pa.string()),
+        ("created_at", pa.timestamp("us")),
+    ])
+    COLUMNAR_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"Columnar analytics not available: {e}")
+    duckdb = None
+    pa = None
+    pq = None
+    COLUMNAR_AVAILABLE = False
+
+PARTITIONS_SQL = """
+    SELECT
+        restaurant_id::text as restaurant_id,
+        TO_CHAR(created_at, 'YYYY-MM') as month,
+        COUNT(*) as orders,
+        MAX(updated_at) as updated_at
+    FROM orders
+    WHERE created_at < :horizon
+    GROUP BY 1, 2
+"""
+
+ORDERS_SQL = """
+    SELECT
+        id::text as id,
+        customer_id::text as customer_id,
+        customer_email,
+        customer_phone,
+        status::text as status,
+        order_type::text as order_type,
+        subtotal,
+        tax,
+        total,
+        created_at,
+        updated_at
+    FROM orders
+    WHERE restaurant_id = :restaurant_id
+        AND created_at >= :start_ts
+        AND created_at < :end_ts
+"""
+
+ITEMS_SQL = """
+    SELECT
+        oi.order_id::text as order_id,
+        oi.menu_item_id::text as menu_item_id,
+        oi.item_name,
+        oi.item_price,
+        oi.quantity,
+        o.status::text as status,
+        o.order_type::text as order_type,
+        o.created_at
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.id
+    WHERE o.restaurant_id = :restaurant_id
+        AND o.created_at >= :start_ts
+        AND o.created_at < :end_ts
+"""
+
+# DuckDB queries over the orders / items views (snapshot files plus the live tail)
+REVENUE_SQL = """
+    SELECT
+        CAST(DATE_TRUNC('{trunc_format}', created_at) AS DATE) as period,
+        SUM(total) as total_revenue,
+        COUNT(*) as order_count
+    FROM orders
+    WHERE created_at >= ? AND created_at < ? AND status <> 'CANCELLED'
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+DAY_TOTALS_SQL = """
+    SELECT EXTRACT(DOW FROM created_at) as day_number, COUNT(*) as orders, SUM(total) as revenue
+    FROM orders
+    WHERE created_at >= ? AND status <> 'CANCELLED'
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+DAY_ITEMS_SQL = """
+    SELECT day_number, item_name
+    FROM (
+        SELECT
+            EXTRACT(DOW FROM created_at) as day_number,
+            item_name,
+            ROW_NUMBER() OVER (
+                PARTITION BY EXTRACT(DOW FROM created_at) ORDER BY SUM(quantity) DESC
+            ) as rank
+        FROM items
+        WHERE created_at >= ? AND status <> 'CANCELLED'
+        GROUP BY 1, 2
+    )
+    WHERE rank <= 3
+    ORDER BY day_number, rank
+"""
+
+CUSTOMER_SQL = """
+    WITH customer_orders AS (
+        SELECT
+            COALESCE(customer_id, customer_email, customer_phone) as customer_identifier,
+            COUNT(id) as order_count,
+            SUM(total) as total_spent,
+            MIN(created_at) as first_order
+        FROM orders
+        WHERE created_at >= ? AND created_at < ?
+            AND status NOT IN ('CANCELLED')
+            AND (customer_id IS NOT NULL OR customer_email IS NOT NULL OR customer_phone IS NOT NULL)
+        GROUP BY 1
+    )
+    SELECT
+        COUNT(DISTINCT customer_identifier) as total_customers,
+        COUNT(CASE WHEN first_order >= ? THEN 1 END) as new_customers,
+        COUNT(CASE WHEN first_order < ? THEN 1 END) as returning_customers,
+        AVG(order_count) as avg_orders_per_customer,
+        AVG(total_spent) as avg_lifetime_value
+    FROM customer_orders
+"""
+
+TRUNC_FORMATS = {
+    "daily": "day",
+    "weekly": "week",
+    "monthly": "month"
+}
+
+DAY_NAMES = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _quote(path: str) -> str:
+    return "'" + path.replace("'", "''") + "'"
+
+
+class SnapshotStore:
+    """
+    Parquet partitions of closed months plus a DuckDB query path over them
+
+    Layout: <root>/<table>/restaurant_id=<id>/month=<YYYY-MM>/data.parquet and
+    <root>/manifest.json recording the horizon (first month not exported)
+    and each partition's order count and latest updated_at.
+    """
+
+    def __init__(self, root: str = ANALYTICS_SNAPSHOT_DIR):
+        self.root = root
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._manifest_mtime = 0.0
+        self.stats = {"snapshot_queries": 0, "postgres_queries": 0, "fallbacks": 0, "exports": 0}
+
+    # ------------------------------------------------------------------ files
+
+    def _partition_dir(self, table: str, restaurant_id: str, month: str) -> str:
+        return os.path.join(self.root, table, f"restaurant_id={restaurant_id}", f"month={month}")
+
+    def _partition_file(self, table: str, restaurant_id: str, month: str) -> str:
+        return os.path.join(self._partition_dir(table, restaurant_id, month), "data.parquet")
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        """Current manifest (reloaded when another process exported)"""
+        path = os.path.join(self.root, MANIFEST)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if self._manifest is None or mtime != self._manifest_mtime:
+            with open(path) as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def horizon(self) -> Optional[date]:
+        """First day not covered by the snapshots"""
+        manifest = self.manifest()
+        if not manifest or not manifest.get("horizon"):
+            return None
+        return date.fromisoformat(manifest["horizon"])
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        path = os.path.join(self.root, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+        self._manifest = manifest
+        self._manifest_mtime = os.path.getmtime(path)
+
+    def _write_partition(self, table: str, restaurant_id: str, month: str, rows: List[Dict[str, Any]], schema):
+        directory = self._partition_dir(table, restaurant_id, month)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "data.parquet")
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), path + ".tmp", compression="zstd")
+        # Readers never see a half-written file
+        os.replace(path + ".tmp", path)
+
+    def _remove_partition(self, restaurant_id: str, month: str):
+        for table in ("orders", "items"):
+            shutil.rmtree(self._partition_dir(table, restaurant_id, month), ignore_errors=True)
+
+    # ----------------------------------------------------------------- export
+
+    async def export(self, session_factory: Callable[[], AsyncSession] = None, today: Optional[date] = None) -> Dict[str, int]:
+        """
+        Bring the snapshots up to the start of the current month
+
+        Returns the number of partitions written, removed and left unchanged.
+        """
+        if not COLUMNAR_AVAILABLE:
+            raise RuntimeError("duckdb and pyarrow are required for analytics snapshots")
+        if session_factory is None:
+            from ..database import analytics_session_maker
+            session_factory = analytics_session_maker
+
+        os.makedirs(self.root, exist_ok=True)
+        horizon = month_start(today or datetime.utcnow().date())
+        manifest = self.manifest() or {"partitions": {}}
+        partitions: Dict[str, Dict[str, str]] = dict(manifest.get("partitions", {}))
+
+        async with session_factory() as db:
+            async with db.begin():
+                await db.execute(text(f"SET LOCAL statement_timeout = '{EXPORT_STATEMENT_TIMEOUT}'"))
+                result = await db.execute(text(PARTITIONS_SQL), {"horizon": datetime.combine(horizon, datetime.min.time())})
+                current = {
+                    f"{row.restaurant_id}/{row.month}": {"orders": int(row.orders), "updated_at": row.updated_at.isoformat()}
+                    for row in result.fetchall()
+                }
+
+        counts = {"written": 0, "removed": 0, "unchanged": 0}
+        for key in set(partitions) - set(current):
+            restaurant_id, month = key.split("/")
+            await asyncio.to_thread(self._remove_partition, restaurant_id, month)
+            del partitions[key]
+            counts["removed"] += 1
+
+        for key, state in sorted(current.items()):
+            if partitions.get(key) == state:
+                counts["unchanged"] += 1
+                continue
+            restaurant_id, month = key.split("/")
+            start = date.fromisoformat(f"{month}-01")
+            async with session_factory() as db:
+                orders, items = await _fetch_rows(
+                    db, restaurant_id,
+                    datetime.combine(start, datetime.min.time()),
+                    datetime.combine(next_month(start), datetime.min.time())
+                )
+            await asyncio.to_thread(self._write_partition, "orders", restaurant_id, month, orders, ORDERS_SCHEMA)
+            await asyncio.to_thread(self._write_partition, "items", restaurant_id, month, items, ITEMS_SCHEMA)
+            partitions[key] = state
+            counts["written"] += 1
+            if counts["written"] % 100 == 0:
+                # Progress survives an interrupted first export
+                self._write_manifest({**manifest, "partitions": partitions})
+                logger.info(f"Exported {counts['written']} snapshot partitions")
+
+        self._write_manifest({
+            "horizon": horizon.isoformat(),
+            "exported_at": datetime.utcnow().isoformat(),
+            "partitions": partitions
+        })
+        self.stats["exports"] += 1
+        logger.info(
+            f"Analytics snapshots up to {horizon}: {counts['written']} written, "
+            f"{counts['removed']} removed, {counts['unchanged']} unchanged"
+        )
+        return counts
+
+    # ------------------------------------------------------------------ query
+
+    def usable(self, start: date, days: int) -> bool:
+        """Whether a range starting at start and spanning days goes to the snapshots"""
+        if not COLUMNAR_AVAILABLE or days < ANALYTICS_SNAPSHOT_MIN_DAYS:
+            return False
+        horizon = self.horizon()
+        return horizon is not None and start < horizon
+
+    def _files(self, table: str, restaurant_id: str, start: date, end: date) -> List[str]:
+        """Partition files of the restaurant for months overlapping [start, end) before the horizon"""
+        partitions = self.manifest()["partitions"]
+        # Months at or after the horizon come from the tail, even if an
+        # export in progress has already written them
+        end = min(end, self.horizon())
+        files = []
+        month = month_start(start)
+        while month < end:
+            if f"{restaurant_id}/{month.strftime('%Y-%m')}" in partitions:
+                files.append(self._partition_file(table, restaurant_id, month.strftime("%Y-%m")))
+            month = next_month(month)
+        return files
+
+    def _connect(self, restaurant_id: str, start: date, end: date, tail: Tuple[list, list]):
+        """DuckDB connection with orders/items views over the files plus the tail rows"""
+        connection = duckdb.connect()
+        for table, schema, rows in (("orders", ORDERS_SCHEMA, tail[0]), ("items", ITEMS_SCHEMA, tail[1])):
+            connection.register(f"tail_{table}", pa.Table.from_pylist(rows, schema=schema))
+            files = self._files(table, restaurant_id, start, end)
+            if files:
+                paths = ", ".join(_quote(path) for path in files)
+                connection.execute(
+                    f"CREATE VIEW {table} AS SELECT * FROM read_parquet([{paths}], hive_partitioning = false) "
+                    f"UNION ALL SELECT * FROM tail_{table}"
+                )
+            else:
+                connection.execute(f"CREATE VIEW {table} AS SELECT * FROM tail_{table}")
+        return connection
+
+    async def _tail(self, db: AsyncSession, restaurant_id: str, end_ts: datetime) -> Tuple[list, list]:
+        """Rows after the horizon, straight from Postgres"""
+        horizon_ts = datetime.combine(self.horizon(), datetime.min.time())
+        if end_ts <= horizon_ts:
+            return [], []
+        return await _fetch_rows(db, restaurant_id, horizon_ts, end_ts)
+
+    async def revenue(
+        self, db: AsyncSession, restaurant_id: UUID, start_date: date, end_date: date, group_by: str
+    ) -> Dict[str, Any]:
+        start_ts, end_ts = day_range(start_date, end_date)
+        tail = await self._tail(db, str(restaurant_id), end_ts)
+        sql = REVENUE_SQL.format(trunc_format=TRUNC_FORMATS.get(group_by, "day"))
+
+        def query():
+            connection = self._connect(str(restaurant_id), start_date, end_ts.date(), tail)
+            try:
+                return connection.execute(sql, [start_ts, end_ts]).fetchall()
+            finally:
+                connection.close()
+
+        metrics = []
+        total_revenue = 0.0
+        total_orders = 0
+        for period, period_revenue, period_orders in await asyncio.to_thread(query):
+            period_revenue = float(period_revenue or 0)
+            metrics.append({
+                "period": period.isoformat(),
+                "total_revenue": round(period_revenue, 2),
+                "order_count": period_orders,
+                "avg_order_value": round(period_revenue / period_orders, 2) if period_orders else 0.0
+            })
+            total_revenue += period_revenue
+            total_orders += period_orders
+
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "group_by": group_by,
+            "metrics": metrics,
+            "total_revenue": round(total_revenue, 2),
+            "total_orders": total_orders,
+            "overall_avg_order_value": round(total_revenue / total_orders, 2) if total_orders > 0 else 0.0
+        }
+
+    async def day_patterns(self, db: AsyncSession, restaurant_id: UUID, weeks: int) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        since = (now - timedelta(weeks=weeks)).replace(minute=0, second=0, microsecond=0)
+        tail = await self._tail(db, str(restaurant_id), now + timedelta(hours=1))
+
+        def query():
+            connection = self._connect(str(restaurant_id), since.date(), now.date() + timedelta(days=1), tail)
+            try:
+                totals = connection.execute(DAY_TOTALS_SQL, [since]).fetchall()
+                items = connection.execute(DAY_ITEMS_SQL, [since]).fetchall()
+                return totals, items
+            finally:
+                connection.close()
+
+        totals, items = await asyncio.to_thread(query)
+        popular: Dict[int, List[str]] = {}
+        for day_number, item_name in items:
+            popular.setdefault(int(day_number), []).append(item_name)
+
+        return [
+            {
+                "day_of_week": DAY_NAMES[int(day_number)],
+                "day_number": int(day_number),
+                "avg_orders": round(orders / weeks, 2),
+                "avg_revenue": round(float(revenue or 0) / weeks, 2),
+                "popular_items": popular.get(int(day_number), [])
+            }
+            for day_number, orders, revenue in totals
+            if orders
+        ]
+
+    async def customer_behavior(
+        self, db: AsyncSession, restaurant_id: UUID, start_date: date, end_date: date
+    ) -> Dict[str, Any]:
+        start_ts, end_ts = day_range(start_date, end_date)
+        tail = await self._tail(db, str(restaurant_id), end_ts)
+
+        def query():
+            connection = self._connect(str(restaurant_id), start_date, end_ts.date(), tail)
+            try:
+                return connection.execute(CUSTOMER_SQL, [start_ts, end_ts, start_ts, start_ts]).fetchone()
+            finally:
+                connection.close()
+
+        total, new, returning, avg_orders, avg_value = await asyncio.to_thread(query)
+        total = int(total or 0)
+        returning = int(returning or 0)
+        return {
+            "total_customers": total,
+            "new_customers": int(new or 0),
+            "returning_customers": returning,
+            "repeat_rate": round(returning / total * 100, 2) if total else 0.0,
+            "avg_orders_per_customer": round(float(avg_orders or 0), 2),
+            "avg_customer_lifetime_value": round(float(avg_value or 0), 2)
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        manifest = self.manifest() if COLUMNAR_AVAILABLE else None
+        return {
+            "available": COLUMNAR_AVAILABLE,
+            "directory": self.root,
+            "horizon": manifest.get("horizon") if manifest else None,
+            "exported_at": manifest.get("exported_at") if manifest else None,
+            "partitions": len(manifest["partitions"]) if manifest else 0,
+            "min_days": ANALYTICS_SNAPSHOT_MIN_DAYS,
+            **self.stats
+        }
+
+
+async def _fetch_rows(
+    db: AsyncSession, restaurant_id: str, start_ts: datetime, end_ts: datetime
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    params = {"restaurant_id": restaurant_id, "start_ts": start_ts, "end_ts": end_ts}
+    orders = (await db.execute(text(ORDERS_SQL), params)).mappings().all()
+    items = (await db.execute(text(ITEMS_SQL), params)).mappings().all()
+    return [dict(row) for row in orders], [dict(row) for row in items]
+
+
+# ============================================================================
+# Routed analytics (same signatures and results as analytics_service)
+# ============================================================================
+
+async def _routed(use_snapshot: bool, snapshot_call, postgres_call):
+    if use_snapshot:
+        try:
+            result = await snapshot_call()
+            snapshot_store.stats["snapshot_queries"] += 1
+            return result
+        except Exception as e:
+            snapshot_store.stats["fallbacks"] += 1
+            logger.warning(f"Snapshot query failed, using Postgres: {e}")
+    snapshot_store.stats["postgres_queries"] += 1
+    return await postgres_call()
+
+
+async def get_revenue_analytics(
+    db: AsyncSession,
+    restaurant_id: UUID,
+    start_date: date,
+    end_date: date,
+    group_by: str = "daily"
+) -> Dict[str, Any]:
+    """Revenue analytics; long ranges are read from the snapshots"""
+    return await _routed(
+        snapshot_store.usable(start_date, (end_date - start_date).days + 1),
+        lambda: snapshot_store.revenue(db, restaurant_id, start_date, end_date, group_by),
+        lambda: analytics_service.get_revenue_analytics(db, restaurant_id, start_date, end_date, group_by)
+    )
+
+
+async def get_day_patterns(db: AsyncSession, restaurant_id: UUID, weeks: int = 8) -> List[Dict[str, Any]]:
+    """Day-of-week patterns; long windows are read from the snapshots"""
+    since = datetime.utcnow().date() - timedelta(weeks=weeks)
+    return await _routed(
+        snapshot_store.usable(since, weeks * 7),
+        lambda: snapshot_store.day_patterns(db, restaurant_id, weeks),
+        lambda: analytics_service.get_day_patterns(db, restaurant_id, weeks)
+    )
+
+
+async def get_customer_behavior(
+    db: AsyncSession,
+    restaurant_id: UUID,
+    start_date: date,
+    end_date: date
+) -> Dict[str, Any]:
+    """Customer behaviour; long ranges are read from the snapshots"""
+    return await _routed(
+        snapshot_store.usable(start_date, (end_date - start_date).days + 1),
+        lambda: snapshot_store.customer_behavior(db, restaurant_id, start_date, end_date),
+        lambda: analytics_service.get_customer_behavior(db, restaurant_id, start_date, end_date)
+    )
+
+
+class SnapshotExporter:
+    """Runs incremental exports in the background"""
+
+    def __init__(self, store: SnapshotStore, interval: float = ANALYTICS_SNAPSHOT_REFRESH_SECONDS):
+        self.store = store
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if not COLUMNAR_AVAILABLE or self.interval <= 0:
+            logger.info("Analytics snapshot exports disabled")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.store.export()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analytics snapshot export failed: {e}")
+            await asyncio.sleep(max(self.interval - (time.monotonic() - started), 1.0))
+
+
+# Global snapshot store
+snapshot_store = SnapshotStore()
+snapshot_exporter = SnapshotExporter(snapshot_store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain columnar analytics snapshots")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("export", help="Export closed months that changed since the last export")
+    parser.parse_args()
+
+    async def run():
+        from ..database import close_db
+        try:
+            await snapshot_store.export()
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
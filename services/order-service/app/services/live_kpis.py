@@ -0,0 +1,264 @@
+"""
+Live dashboard KPIs for Order Service
+Today's and this hour's order count, revenue, average order value and
+completed/cancelled counts per restaurant, kept in memory and updated from
+order lifecycle events, so the admin dashboard no longer runs analytics
+queries to show them.
+
+Counting matches the hourly rollups: an order belongs to the (UTC) hour it
+was created in, cancelled orders leave the order count and revenue, and a
+status change moves an order between counters. Today's orders are
+remembered by id, which makes every event idempotent (the same event may
+arrive from the local publish and from RabbitMQ). The state is seeded from
+today's orders on startup and re-seeded periodically to repair anything
+missed while RabbitMQ was unreachable; an order that received an event
+after a seed's query started keeps its in-memory state, which is newer than
+the row the query may have read.
+"""
+import asyncio
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("live-kpis")
+
+# Seconds between pushes to a subscribed dashboard (only sent when changed)
+KPI_PUSH_SECONDS = float(os.getenv("KPI_PUSH_SECONDS", "5"))
+# Seconds between re-seeds from the database (0 disables)
+KPI_RESEED_SECONDS = float(os.getenv("KPI_RESEED_SECONDS", "900"))
+
+CANCELLED = "cancelled"
+COMPLETED = "completed"
+
+# Events published by order-service with the order's current status (a
+# receipt completes a served order). Others, such as kitchen-service's
+# order.eta_updated with its possibly stale ticket status, are not applied.
+APPLIED_EVENTS = {"order.created", "order.status_changed", "order.cancelled", "order.receipt_generated"}
+
+# Status names are stored upper case; events carry the lower case values
+SEED_SQL = """
+    SELECT
+        id::text as order_id,
+        restaurant_id::text as restaurant_id,
+        EXTRACT(HOUR FROM created_at)::int as hour,
+        COALESCE(total, 0) as total,
+        LOWER(status::text) as status
+    FROM orders
+    WHERE created_at >= :day_start
+"""
+
+
+@dataclass
+class KpiCounters:
+    """Order counters for one restaurant and hour (or a sum of hours)"""
+    orders: int = 0
+    revenue: float = 0.0
+    completed: int = 0
+    cancelled: int = 0
+
+    def add(self, other: "KpiCounters"):
+        self.orders += other.orders
+        self.revenue += other.revenue
+        self.completed += other.completed
+        self.cancelled += other.cancelled
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "order_count": self.orders,
+            "revenue": round(self.revenue, 2),
+            "avg_order_value": round(self.revenue / self.orders, 2) if self.orders else 0.0,
+            "completed_count": self.completed,
+            "cancelled_count": self.cancelled
+        }
+
+
+@dataclass
+class TrackedOrder:
+    restaurant_id: str
+    hour: int
+    total: float
+    status: str
+
+
+class LiveKpiAggregator:
+    """Per-restaurant KPIs for the current UTC day, updated incrementally"""
+
+    def __init__(
+        self,
+        reseed_interval: float = KPI_RESEED_SECONDS,
+        clock: Callable[[], datetime] = datetime.utcnow
+    ):
+        self.reseed_interval = reseed_interval
+        self.clock = clock
+        self.day: date = clock().date()
+        self.orders: Dict[str, TrackedOrder] = {}
+        # time.monotonic() of the last event applied to each order
+        self.event_times: Dict[str, float] = {}
+        self.hours: Dict[str, Dict[int, KpiCounters]] = defaultdict(lambda: defaultdict(KpiCounters))
+        # Bumped on every change, so streams only push when something moved
+        self.versions: Dict[str, int] = defaultdict(int)
+        self.stats = {"events_applied": 0, "events_ignored": 0, "seeds": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def _roll_day(self) -> datetime:
+        now = self.clock()
+        if now.date() != self.day:
+            self.day = now.date()
+            self.orders.clear()
+            self.event_times.clear()
+            self.hours.clear()
+            for restaurant_id in list(self.versions):
+                self.versions[restaurant_id] += 1
+        return now
+
+    def _apply(self, order: TrackedOrder, sign: int):
+        counters = self.hours[order.restaurant_id][order.hour]
+        if order.status == CANCELLED:
+            counters.cancelled += sign
+            return
+        counters.orders += sign
+        counters.revenue += sign * order.total
+        if order.status == COMPLETED:
+            counters.completed += sign
+
+    def handle_event(self, event: Dict[str, Any]):
+        """Apply an order lifecycle event (local publish or RabbitMQ)"""
+        now = self._roll_day()
+        order_id = event.get("order_id")
+        status = event.get("status")
+        if not order_id or not status:
+            return
+        if event.get("event") not in APPLIED_EVENTS:
+            self.stats["events_ignored"] += 1
+            return
+
+        known = self.orders.get(order_id)
+        if event.get("event") == "order.created":
+            if known is not None:
+                self.stats["events_ignored"] += 1
+                return
+            order = TrackedOrder(event["restaurant_id"], now.hour, float(event.get("total") or 0), status)
+        else:
+            # Orders from before today (or this process) are not counted here
+            if known is None:
+                self.stats["events_ignored"] += 1
+                return
+            total = known.total if event.get("total") is None else float(event["total"])
+            if known.status == status and known.total == total:
+                self.stats["events_ignored"] += 1
+                return
+            self._apply(known, -1)
+            order = TrackedOrder(known.restaurant_id, known.hour, total, status)
+
+        self.orders[order_id] = order
+        self.event_times[order_id] = time.monotonic()
+        self._apply(order, 1)
+        self.versions[order.restaurant_id] += 1
+        self.stats["events_applied"] += 1
+
+    def version(self, restaurant_id: str) -> tuple:
+        """Changes whenever the restaurant's snapshot would"""
+        now = self._roll_day()
+        return self.day, now.hour, self.versions[restaurant_id]
+
+    def snapshot(self, restaurant_id: str) -> Dict[str, Any]:
+        """Today's and this hour's KPIs for a restaurant"""
+        now = self._roll_day()
+        hours = self.hours.get(restaurant_id, {})
+        today = KpiCounters()
+        for counters in hours.values():
+            today.add(counters)
+        return {
+            "restaurant_id": restaurant_id,
+            "day": self.day.isoformat(),
+            "hour": now.hour,
+            "today": today.to_dict(),
+            "this_hour": hours.get(now.hour, KpiCounters()).to_dict(),
+            "as_of": now.isoformat()
+        }
+
+    async def seed(self, session_factory: Callable[[], AsyncSession] = None) -> int:
+        """
+        Rebuild today's counters from the database
+        Orders that arrived or changed through events once the query had
+        started keep their in-memory state. Returns the number of orders loaded.
+        """
+        if session_factory is None:
+            # The primary: a lagging replica would undo events already applied
+            from ..database import async_session_maker
+            session_factory = async_session_maker
+
+        self._roll_day()
+        day = self.day
+        started = time.monotonic()
+        async with session_factory() as db:
+            rows = (await db.execute(
+                text(SEED_SQL), {"day_start": datetime.combine(day, dt_time.min)}
+            )).fetchall()
+        if self._roll_day().date() != day:
+            return 0
+
+        orders = {
+            row.order_id: TrackedOrder(row.restaurant_id, row.hour, float(row.total), row.status)
+            for row in rows
+        }
+        for order_id, order in self.orders.items():
+            if order_id not in orders or self.event_times.get(order_id, 0.0) >= started:
+                orders[order_id] = order
+
+        self.orders = orders
+        self.hours.clear()
+        for order in orders.values():
+            self._apply(order, 1)
+        for restaurant_id in {order.restaurant_id for order in orders.values()} | set(self.versions):
+            self.versions[restaurant_id] += 1
+        self.stats["seeds"] += 1
+        logger.info(f"Live KPIs seeded from {len(rows)} orders")
+        return len(rows)
+
+    async def start(self):
+        try:
+            await self.seed()
+        except Exception as e:
+            logger.error(f"Live KPIs not seeded: {e}")
+        if self.reseed_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reseed_interval)
+            started = time.monotonic()
+            try:
+                await self.seed()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Live KPI re-seed failed: {e}")
+            logger.debug(f"Live KPI re-seed took {time.monotonic() - started:.2f}s")
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "day": self.day.isoformat(),
+            "orders": len(self.orders),
+            "restaurants": len(self.hours)
+        }
+
+
+# Global aggregator
+live_kpis = LiveKpiAggregator()
@@ -136,7 +136,7 @@ async def validate_historical_data(
         FROM orders
         WHERE restaurant_id = :restaurant_id
             AND status NOT IN ('CANCELLED')
-            AND created_at >= NOW() - INTERVAL ':lookback days'
+            AND created_at >= NOW() - make_interval(days => :lookback)
     """)
 
     result = await db.execute(query, {
@@ -199,7 +199,7 @@ async def load_historical_order_data(
         FROM orders o
         JOIN order_items oi ON o.id = oi.order_id
         WHERE o.restaurant_id = :restaurant_id
-            AND o.created_at >= NOW() - INTERVAL ':days days'
+            AND o.created_at >= NOW() - make_interval(days => :days)
             AND o.status NOT IN ('CANCELLED')
         GROUP BY DATE(o.created_at), oi.menu_item_id, oi.item_name
         ORDER BY order_date ASC
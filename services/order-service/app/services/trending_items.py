@@ -0,0 +1,246 @@
+"""
+Real-time trending items for Order Service
+Keeps a decayed item count per restaurant in memory, fed by order events,
+so "trending right now" (menu badges, kitchen prep view) is answered
+without touching the database.
+
+Counts use forward decay: an item ordered at time t adds
+quantity * 2^((t - landmark) / half_life), so older orders fade without
+ever rewriting existing counters, and the ranking only changes when an
+order arrives. Each restaurant keeps at most TRENDING_CAPACITY items
+(Space-Saving): a new item replaces the lowest one and inherits its count
+as a known overestimate (error). On startup the tracker is seeded from the
+last few half-lives of orders.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("trending-items")
+
+# An order counts half as much after this many seconds
+TRENDING_HALF_LIFE_SECONDS = float(os.getenv("TRENDING_HALF_LIFE_SECONDS", "1200"))
+# Items tracked per restaurant; menus smaller than this are counted exactly
+TRENDING_CAPACITY = int(os.getenv("TRENDING_CAPACITY", "200"))
+
+# Orders older than this many half-lives weigh under 2% and are not seeded
+SEED_HALF_LIVES = 6
+# Recent orders remembered so a cancellation can be subtracted and a
+# duplicate order.created (local publish and RabbitMQ) counted once
+RECENT_ORDERS = 20000
+# Rebase counters before 2^exponent grows too large for a float
+MAX_EXPONENT = 60.0
+
+SEED_SQL = """
+    SELECT
+        o.id::text as order_id,
+        o.restaurant_id::text as restaurant_id,
+        o.created_at,
+        oi.menu_item_id::text as menu_item_id,
+        oi.item_name,
+        oi.quantity
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.id
+    WHERE o.created_at >= :since
+      AND o.status <> 'CANCELLED'
+    ORDER BY o.created_at
+"""
+
+
+class RestaurantTrend:
+    """Decayed item counts of one restaurant"""
+
+    def __init__(self, half_life: float, capacity: int, now: float):
+        self.half_life = half_life
+        self.capacity = capacity
+        self.landmark = now
+        self.counts: Dict[str, float] = {}
+        self.errors: Dict[str, float] = {}
+        self.names: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._ranking: Optional[List[str]] = None
+
+    def _weight(self, quantity: float, at: float) -> float:
+        exponent = (at - self.landmark) / self.half_life
+        if exponent > MAX_EXPONENT:
+            self._rebase(at)
+            exponent = 0.0
+        return quantity * 2.0 ** exponent
+
+    def _rebase(self, at: float):
+        scale = 2.0 ** ((self.landmark - at) / self.half_life)
+        self.counts = {item: count * scale for item, count in self.counts.items()}
+        self.errors = {item: error * scale for item, error in self.errors.items()}
+        self.landmark = at
+
+    def add(self, item_id: str, name: str, category: Optional[str], quantity: float, at: float):
+        weight = self._weight(quantity, at)
+        if item_id not in self.counts and len(self.counts) >= self.capacity:
+            evicted = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(evicted)
+            self.errors.pop(evicted, None)
+            self.names.pop(evicted, None)
+            self.counts[item_id] = floor
+            self.errors[item_id] = floor
+        self.counts[item_id] = self.counts.get(item_id, 0.0) + weight
+        # Seeded rows carry no category; keep one a live event supplied
+        known = self.names.get(item_id)
+        self.names[item_id] = (name, category or (known[1] if known else None))
+        self._ranking = None
+
+    def subtract(self, item_id: str, quantity: float, at: float):
+        if item_id not in self.counts:
+            return
+        self.counts[item_id] = max(self.counts[item_id] - self._weight(quantity, at), 0.0)
+        self._ranking = None
+
+    def top(self, limit: int, now: float) -> List[Dict[str, Any]]:
+        # Every counter decays by the same factor, so the order only changes on writes
+        if self._ranking is None:
+            self._ranking = sorted(self.counts, key=self.counts.get, reverse=True)
+        scale = 2.0 ** ((self.landmark - now) / self.half_life)
+        items = []
+        for item_id in self._ranking[:limit]:
+            score = round(self.counts[item_id] * scale, 3)
+            if score <= 0:
+                break
+            name, category = self.names[item_id]
+            items.append({
+                "menu_item_id": item_id,
+                "item_name": name,
+                "category": category,
+                "score": score,
+                "error": round(self.errors.get(item_id, 0.0) * scale, 3)
+            })
+        return items
+
+
+class TrendingTracker:
+    """Per-restaurant trending items, updated from order lifecycle events"""
+
+    def __init__(
+        self,
+        half_life: float = TRENDING_HALF_LIFE_SECONDS,
+        capacity: int = TRENDING_CAPACITY,
+        clock: Callable[[], float] = time.time
+    ):
+        self.half_life = half_life
+        self.capacity = capacity
+        self.clock = clock
+        self.restaurants: Dict[str, RestaurantTrend] = {}
+        # order_id -> (restaurant_id, created at, [(item_id, quantity)])
+        self.recent_orders: OrderedDict = OrderedDict()
+        self.stats = {"orders_added": 0, "orders_cancelled": 0, "duplicates": 0, "seeded_orders": 0}
+
+    def _trend(self, restaurant_id: str, now: float) -> RestaurantTrend:
+        trend = self.restaurants.get(restaurant_id)
+        if trend is None:
+            trend = self.restaurants[restaurant_id] = RestaurantTrend(self.half_life, self.capacity, now)
+        return trend
+
+    def _remember(self, order_id: str, restaurant_id: str, at: float, items: List[Tuple[str, float]]):
+        self.recent_orders[order_id] = (restaurant_id, at, items)
+        horizon = self.clock() - SEED_HALF_LIVES * self.half_life
+        while self.recent_orders and (
+            len(self.recent_orders) > RECENT_ORDERS
+            or next(iter(self.recent_orders.values()))[1] < horizon
+        ):
+            self.recent_orders.popitem(last=False)
+
+    def add_order(
+        self,
+        order_id: str,
+        restaurant_id: str,
+        items: List[Dict[str, Any]],
+        at: Optional[float] = None
+    ) -> bool:
+        """Count a new order's items; False if the order was already counted"""
+        if order_id in self.recent_orders:
+            self.stats["duplicates"] += 1
+            return False
+        at = self.clock() if at is None else at
+        trend = self._trend(restaurant_id, at)
+        counted = []
+        for item in items:
+            item_id = item.get("menu_item_id")
+            quantity = float(item.get("quantity") or 0)
+            if not item_id or quantity <= 0:
+                continue
+            trend.add(item_id, item.get("name") or "Unknown Item", item.get("category"), quantity, at)
+            counted.append((item_id, quantity))
+        self._remember(order_id, restaurant_id, at, counted)
+        self.stats["orders_added"] += 1
+        return True
+
+    def cancel_order(self, order_id: str) -> bool:
+        """Take back a recent order's items; False if it is unknown or already cancelled"""
+        entry = self.recent_orders.get(order_id)
+        if entry is None or entry[2] is None:
+            return False
+        restaurant_id, at, items = entry
+        trend = self.restaurants.get(restaurant_id)
+        if trend is not None:
+            for item_id, quantity in items:
+                trend.subtract(item_id, quantity, at)
+        # Kept (without items) so a late duplicate order.created is still ignored
+        self.recent_orders[order_id] = (restaurant_id, at, None)
+        self.stats["orders_cancelled"] += 1
+        return True
+
+    def handle_event(self, event: Dict[str, Any]):
+        """Apply an order lifecycle event (local publish or RabbitMQ)"""
+        name = event.get("event")
+        if name == "order.created" and event.get("items") is not None:
+            self.add_order(event["order_id"], event["restaurant_id"], event["items"])
+        elif name == "order.cancelled":
+            self.cancel_order(event["order_id"])
+
+    def top(self, restaurant_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Highest decayed counts right now, highest first"""
+        trend = self.restaurants.get(restaurant_id)
+        if trend is None:
+            return []
+        return trend.top(limit, self.clock())
+
+    async def seed(self, session_factory: Callable[[], AsyncSession] = None) -> int:
+        """
+        Count recent orders from the database
+        Orders that already arrived as events are skipped. Returns orders added.
+        """
+        if session_factory is None:
+            from ..database import analytics_session_maker
+            session_factory = analytics_session_maker
+        since = datetime.utcnow() - timedelta(seconds=SEED_HALF_LIVES * self.half_life)
+
+        async with session_factory() as db:
+            rows = (await db.execute(text(SEED_SQL), {"since": since})).fetchall()
+
+        orders: OrderedDict = OrderedDict()
+        for row in rows:
+            order = orders.setdefault(row.order_id, (row.restaurant_id, row.created_at, []))
+            order[2].append({"menu_item_id": row.menu_item_id, "name": row.item_name, "quantity": row.quantity})
+
+        added = 0
+        for order_id, (restaurant_id, created_at, items) in orders.items():
+            at = created_at.replace(tzinfo=timezone.utc).timestamp()
+            added += self.add_order(order_id, restaurant_id, items, at)
+        self.stats["seeded_orders"] += added
+        logger.info(f"Trending items seeded from {added} recent orders")
+        return added
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "half_life_seconds": self.half_life,
+            "restaurants": len(self.restaurants),
+            "items": sum(len(trend.counts) for trend in self.restaurants.values()),
+            "recent_orders": len(self.recent_orders)
+        }
+
+
+# Global tracker
+trending_tracker = TrendingTracker()
@@ -0,0 +1,52 @@
+"""
+Cancel long-running requests whose client has gone away
+Cancelling the handler task makes asyncpg cancel the running statement on
+the server, so an abandoned dashboard stops holding a connection.
+"""
+import asyncio
+from typing import Iterable
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    ASGI middleware cancelling HTTP handlers once the client disconnects
+
+    Only applies to bodiless requests (GET) whose path contains one of
+    path_fragments; the middleware reads the request messages itself and
+    hands them to the application.
+    """
+
+    def __init__(self, app, path_fragments: Iterable[str]):
+        self.app = app
+        self.path_fragments = tuple(path_fragments)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope.get("method") != "GET"
+            or not any(fragment in scope["path"] for fragment in self.path_fragments)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue = asyncio.Queue()
+        handler = asyncio.ensure_future(self.app(scope, messages.get, send))
+
+        async def watch():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not handler.done():
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not watcher.done():
+                # Cancelled from outside (server shutdown), not by a disconnect
+                raise
+        finally:
+            watcher.cancel()
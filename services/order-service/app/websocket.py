@@ -2,44 +2,473 @@
 WebSocket server for real-time order notifications
 """
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from typing import Dict, Optional, Any, Iterable, List, Set
+from collections import OrderedDict, deque
 import json
 import asyncio
+import os
+import uuid
 from shared.utils.logger import setup_logger
 
 logger = setup_logger("websocket")
 
+# Outbound messages buffered per connection before it counts as a slow consumer
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# Seconds a single send may take before the connection is considered dead
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+# What to do with a slow consumer: "downgrade" (discard backlog, ask client to resync) or "drop"
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "downgrade")
+
+# Close code sent to dropped slow consumers (1013 = try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Orders per connection whose last sent payload is kept for computing compact
+# deltas (and, with a category filter, remembered as matching)
+DELTA_CACHE_SIZE = int(os.getenv("WS_DELTA_CACHE_SIZE", "1000"))
+
+# Fields always present in a compact delta so clients can apply it
+DELTA_KEY_FIELDS = ("event", "type", "order_id", "seq")
+
+# Recent events kept per restaurant for replay to reconnecting clients
+REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "500"))
+
+
+def _as_set(values: Optional[Iterable[Any]], normalize) -> Set[str]:
+    """Normalize a filter value list, accepting a comma-separated string"""
+    if not values:
+        return set()
+    if isinstance(values, str):
+        values = values.split(",")
+    return {normalize(str(v)) for v in values if str(v).strip()}
+
+
+class SubscriptionFilter:
+    """
+    Topic filter for a WebSocket connection
+
+    Each non-empty field must match for a message to be delivered; an empty
+    filter receives every event for the restaurant. Only order.created carries
+    item categories, so the category filter is applied to it and the orders it
+    matched are remembered, letting their later events through.
+    """
+
+    def __init__(
+        self,
+        event_types: Optional[Iterable[str]] = None,
+        order_types: Optional[Iterable[str]] = None,
+        categories: Optional[Iterable[str]] = None,
+        table_ids: Optional[Iterable[str]] = None
+    ):
+        self.event_types = _as_set(event_types, lambda v: v.strip().lower())
+        self.order_types = _as_set(order_types, lambda v: v.strip().upper())
+        self.categories = _as_set(categories, lambda v: v.strip().lower())
+        self.table_ids = _as_set(table_ids, lambda v: v.strip().lower())
+        self.matched_orders: "OrderedDict[str, None]" = OrderedDict()
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "SubscriptionFilter":
+        """Build a filter from query parameters or a subscribe message"""
+        data = data or {}
+        return cls(
+            event_types=data.get("events") or data.get("event_types"),
+            order_types=data.get("order_types"),
+            categories=data.get("categories"),
+            table_ids=data.get("tables") or data.get("table_ids")
+        )
+
+    def is_empty(self) -> bool:
+        return not (self.event_types or self.order_types or self.categories or self.table_ids)
+
+    def _matches_categories(self, message: Dict[str, Any]) -> bool:
+        order_id = message.get("order_id")
+        if (message.get("event") or message.get("type")) != "order.created":
+            return order_id is not None and str(order_id) in self.matched_orders
+
+        categories = message.get("categories") or []
+        if not any(str(c).lower() in self.categories for c in categories):
+            return False
+        if order_id is not None:
+            self.matched_orders[str(order_id)] = None
+            while len(self.matched_orders) > DELTA_CACHE_SIZE:
+                self.matched_orders.popitem(last=False)
+        return True
+
+    def matches(self, message: Dict[str, Any]) -> bool:
+        """Check whether a message passes every configured filter"""
+        # Checked first so an order is remembered even if its order.created
+        # event itself is filtered out by event type
+        if self.categories and not self._matches_categories(message):
+            return False
+
+        if self.event_types:
+            event = message.get("event") or message.get("type")
+            if not event or str(event).lower() not in self.event_types:
+                return False
+
+        if self.order_types:
+            order_type = message.get("order_type")
+            if not order_type or str(order_type).upper() not in self.order_types:
+                return False
+
+        if self.table_ids:
+            table_id = message.get("table_id")
+            if not table_id or str(table_id).lower() not in self.table_ids:
+                return False
+
+        return True
+
+    def to_dict(self) -> Dict[str, list]:
+        return {
+            "events": sorted(self.event_types),
+            "order_types": sorted(self.order_types),
+            "categories": sorted(self.categories),
+            "tables": sorted(self.table_ids)
+        }
+
+
+class RestaurantStream:
+    """
+    Sequenced event stream for one restaurant on this replica
+
+    Sequence numbers only make sense within a stream_id; a new stream_id means
+    events may have been missed and clients must resync.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.buffer: deque = deque(maxlen=buffer_size)
+
+    def append(self, message: dict) -> dict:
+        """Assign the next sequence number and keep the event for replay"""
+        self.seq += 1
+        sequenced = {**message, "seq": self.seq}
+        self.buffer.append(sequenced)
+        return sequenced
+
+    def since(self, last_seq: int) -> Optional[List[dict]]:
+        """Events after last_seq, or None if some of them were already evicted"""
+        if last_seq >= self.seq:
+            return []
+
+        oldest_seq = self.buffer[0]["seq"] if self.buffer else self.seq + 1
+        if last_seq + 1 < oldest_seq:
+            return None
+
+        return [message for message in self.buffer if message["seq"] > last_seq]
+
+
+class ClientConnection:
+    """A WebSocket connection with its own bounded outbound queue"""
+
+    def __init__(self, websocket: WebSocket, restaurant_id: str, queue_size: int):
+        self.websocket = websocket
+        self.restaurant_id = restaurant_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer_task: Optional[asyncio.Task] = None
+        self.downgraded = False
+        self.dropped_messages = 0
+        self.filter: Optional[SubscriptionFilter] = None
+        self.compact = False
+        # Last payload this connection was sent per order, for compact deltas
+        self.sent_payloads: "OrderedDict[str, dict]" = OrderedDict()
+
+    def enqueue(self, text: str) -> bool:
+        """Queue an already-serialized message, returning False if the queue is full"""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def clear(self) -> int:
+        """Discard every queued message and return how many were dropped"""
+        dropped = 0
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            dropped += 1
+        return dropped
+
 
 class ConnectionManager:
     """Manages WebSocket connections for real-time order notifications"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT,
+        slow_consumer_policy: str = WS_SLOW_CONSUMER_POLICY
+    ):
         # Store connections by restaurant_id
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self.active_connections: Dict[str, Dict[WebSocket, ClientConnection]] = {}
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.slow_consumer_policy = slow_consumer_policy
+        self.slow_consumers_dropped = 0
+        self.slow_consumers_downgraded = 0
+        self.messages_filtered = 0
+        self.messages_replayed = 0
+        self.resyncs_requested = 0
+
+        # Sequenced replay streams per restaurant
+        self.streams: Dict[str, RestaurantStream] = {}
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        restaurant_id: str,
+        subscription: Optional[SubscriptionFilter] = None,
+        compact: bool = False,
+        last_seq: Optional[int] = None,
+        stream_id: Optional[str] = None
+    ):
+        """
+        Accept and register a new WebSocket connection
 
-    async def connect(self, websocket: WebSocket, restaurant_id: str):
-        """Accept and register a new WebSocket connection"""
+        Queues the welcome message and, for a client resuming from last_seq,
+        every missed event before any live event can be broadcast to it.
+        """
         await websocket.accept()
 
+        connection = ClientConnection(websocket, restaurant_id, self.queue_size)
+        self._apply_subscription(connection, subscription, compact)
+        connection.writer_task = asyncio.create_task(self._writer(connection))
+
         if restaurant_id not in self.active_connections:
-            self.active_connections[restaurant_id] = set()
+            self.active_connections[restaurant_id] = {}
 
-        self.active_connections[restaurant_id].add(websocket)
+        self.active_connections[restaurant_id][websocket] = connection
         logger.info(f"Client connected to restaurant {restaurant_id}. Total connections: {len(self.active_connections[restaurant_id])}")
 
+        stream = self.streams.get(restaurant_id)
+        if stream is None:
+            stream = self.streams[restaurant_id] = RestaurantStream(REPLAY_BUFFER_SIZE)
+
+        self._enqueue(connection, {
+            "type": "connection",
+            "message": f"Connected to order notifications for restaurant {restaurant_id}",
+            "restaurant_id": restaurant_id,
+            "filters": (connection.filter or SubscriptionFilter()).to_dict(),
+            "compact": connection.compact,
+            "stream": stream.stream_id,
+            "seq": stream.seq
+        })
+
+        if last_seq is not None:
+            self._replay(connection, stream, last_seq, stream_id)
+
     def disconnect(self, websocket: WebSocket, restaurant_id: str):
-        """Remove a WebSocket connection"""
+        """Remove a WebSocket connection and stop its writer"""
         if restaurant_id in self.active_connections:
-            self.active_connections[restaurant_id].discard(websocket)
+            connection = self.active_connections[restaurant_id].pop(websocket, None)
 
-            # Clean up empty sets
+            # Clean up empty restaurants
             if not self.active_connections[restaurant_id]:
                 del self.active_connections[restaurant_id]
 
+            if connection is None:
+                return
+
+            task = connection.writer_task
+            if task and task is not asyncio.current_task() and not task.done():
+                task.cancel()
+
             logger.info(f"Client disconnected from restaurant {restaurant_id}")
 
+    def _replay(
+        self,
+        connection: ClientConnection,
+        stream: RestaurantStream,
+        last_seq: int,
+        stream_id: Optional[str]
+    ):
+        """Queue the events a reconnecting client missed, or ask it to resync"""
+        if (stream_id and stream_id != stream.stream_id) or last_seq > stream.seq:
+            self._request_resync(connection, "stream_changed", stream)
+            return
+
+        missed = stream.since(last_seq)
+        if missed is None:
+            self._request_resync(connection, "gap_too_old", stream)
+            return
+
+        if connection.filter:
+            missed = [message for message in missed if connection.filter.matches(message)]
+
+        # Replay is queued in one go; a gap that does not fit the queue would
+        # overflow it halfway, so the client reloads instead
+        free = connection.queue.maxsize - connection.queue.qsize()
+        if len(missed) >= free:
+            self._request_resync(connection, "gap_too_large", stream)
+            return
+
+        for message in missed:
+            if not self._enqueue(connection, message):
+                return
+            self.messages_replayed += 1
+
+        logger.info(f"Replayed {len(missed)} events after seq {last_seq} for restaurant {connection.restaurant_id}")
+
+    def _request_resync(self, connection: ClientConnection, reason: str, stream: Optional[RestaurantStream] = None):
+        """Tell a client its view is stale and it must reload full order lists"""
+        self.resyncs_requested += 1
+        # The client reloads every order, so later events start from full payloads
+        connection.sent_payloads.clear()
+        message = {"type": "resync_required", "reason": reason}
+        if stream is not None:
+            message["stream"] = stream.stream_id
+            message["seq"] = stream.seq
+            message["oldest_seq"] = stream.buffer[0]["seq"] if stream.buffer else stream.seq
+        self._enqueue(connection, message)
+
+    def reset_stream(self, restaurant_id: str):
+        """
+        Start a new stream for a restaurant after events may have been missed
+        (for example while this replica was not subscribed to it)
+        """
+        self.streams.pop(restaurant_id, None)
+
+        connections = self.active_connections.get(restaurant_id)
+        if not connections:
+            return
+
+        stream = self.streams[restaurant_id] = RestaurantStream(REPLAY_BUFFER_SIZE)
+        for connection in list(connections.values()):
+            self._request_resync(connection, "stream_changed", stream)
+
+        logger.warning(f"Reset notification stream for restaurant {restaurant_id}")
+
+    def reset_all_streams(self):
+        """Reset every restaurant stream, e.g. after the broker connection was lost"""
+        for restaurant_id in set(self.streams) | set(self.active_connections):
+            self.reset_stream(restaurant_id)
+
+    def _apply_subscription(
+        self,
+        connection: ClientConnection,
+        subscription: Optional[SubscriptionFilter],
+        compact: bool
+    ):
+        """Set a connection's filter, treating an empty filter as the full feed"""
+        connection.filter = subscription if subscription and not subscription.is_empty() else None
+        connection.compact = compact
+
+    def update_subscription(
+        self,
+        websocket: WebSocket,
+        restaurant_id: str,
+        subscription: Optional[SubscriptionFilter],
+        compact: Optional[bool] = None
+    ) -> bool:
+        """Change the filter of an existing connection"""
+        connection = self.active_connections.get(restaurant_id, {}).get(websocket)
+        if not connection:
+            return False
+
+        self._apply_subscription(
+            connection,
+            subscription,
+            connection.compact if compact is None else compact
+        )
+        return True
+
+    def _compute_delta(self, message: dict, previous: dict) -> dict:
+        """Strip a message down to the fields that changed since the previous payload"""
+        delta = {
+            k: v for k, v in message.items()
+            if k in DELTA_KEY_FIELDS or (v is not None and previous.get(k) != v)
+        }
+
+        # Timestamps change on every event and are not useful in a delta
+        if previous:
+            delta.pop("timestamp", None)
+
+        return delta
+
+    def _compact_text(self, connection: ClientConnection, message: dict, shared: dict) -> str:
+        """
+        Serialized delta of a message against what this connection was last sent
+        for the order; the full payload if it has not seen the order yet.
+        Connections that were sent the same previous payload share one delta.
+        """
+        order_id = message.get("order_id")
+        previous = connection.sent_payloads.pop(str(order_id), None) if order_id else None
+
+        # The previous payload is kept in the entry, so its id stays unique
+        entry = shared.get(id(previous))
+        if entry is None:
+            delta = self._compute_delta(message, previous or {})
+            entry = shared[id(previous)] = (
+                previous,
+                {**(previous or {}), **message},
+                json.dumps(delta, default=str, separators=(",", ":"))
+            )
+
+        if order_id:
+            connection.sent_payloads[str(order_id)] = entry[1]
+            while len(connection.sent_payloads) > DELTA_CACHE_SIZE:
+                connection.sent_payloads.popitem(last=False)
+
+        return entry[2]
+
+    async def _writer(self, connection: ClientConnection):
+        """Drain a connection's queue so a slow socket never delays the others"""
+        websocket = connection.websocket
+        try:
+            while True:
+                text = await connection.queue.get()
+                async with asyncio.timeout(self.send_timeout):
+                    await websocket.send_text(text)
+
+                if connection.downgraded and connection.queue.empty():
+                    connection.downgraded = False
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error writing to WebSocket for restaurant {connection.restaurant_id}: {e}")
+            self.disconnect(websocket, connection.restaurant_id)
+
+    def _handle_slow_consumer(self, connection: ClientConnection):
+        """Downgrade or drop a connection whose outbound queue overflowed"""
+        connection.dropped_messages += 1
+
+        # A downgraded client that still cannot drain its resync notice is dropped
+        if self.slow_consumer_policy == "drop" or connection.downgraded:
+            self.slow_consumers_dropped += 1
+            logger.warning(f"Dropping slow WebSocket consumer for restaurant {connection.restaurant_id}")
+            self.disconnect(connection.websocket, connection.restaurant_id)
+            asyncio.create_task(self._close(connection.websocket))
+            return
+
+        # Discard the backlog and tell the client to reload current state instead
+        connection.dropped_messages += connection.clear()
+        connection.downgraded = True
+        self._request_resync(connection, "slow_consumer", self.streams.get(connection.restaurant_id))
+        self.slow_consumers_downgraded += 1
+        logger.warning(f"Downgraded slow WebSocket consumer for restaurant {connection.restaurant_id}")
+
+    async def _close(self, websocket: WebSocket):
+        """Close a WebSocket, ignoring errors from already-closed sockets"""
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    def _enqueue(self, connection: ClientConnection, message: dict) -> bool:
+        """Serialize and queue a message for one connection, False if it overflowed"""
+        if connection.enqueue(json.dumps(message, default=str)):
+            return True
+        self._handle_slow_consumer(connection)
+        return False
+
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """Send a message to a specific WebSocket"""
+        for connections in self.active_connections.values():
+            connection = connections.get(websocket)
+            if connection:
+                self._enqueue(connection, message)
+                return
+
         try:
             await websocket.send_json(message)
         except Exception as e:
@@ -47,31 +476,63 @@ class ConnectionManager:
 
     async def broadcast_to_restaurant(self, message: dict, restaurant_id: str):
         """Broadcast a message to all connections for a specific restaurant"""
+        # Sequence and buffer the event even with no connections, so clients
+        # reconnecting after a blip can still replay it
+        stream = self.streams.get(restaurant_id)
+        if stream is not None:
+            message = stream.append(message)
+
         if restaurant_id not in self.active_connections:
             logger.debug(f"No active connections for restaurant {restaurant_id}")
             return
 
-        disconnected = []
-        connections = list(self.active_connections[restaurant_id])
+        # Serialize each representation once and share it across connections
+        connections = list(self.active_connections[restaurant_id].values())
+        full_text = None
+        deltas: Dict[int, tuple] = {}
+        sent = 0
 
         for connection in connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to connection: {e}")
-                disconnected.append(connection)
+            if connection.filter and not connection.filter.matches(message):
+                self.messages_filtered += 1
+                continue
 
-        # Clean up disconnected clients
-        for conn in disconnected:
-            self.disconnect(conn, restaurant_id)
+            if connection.compact:
+                text = self._compact_text(connection, message, deltas)
+            else:
+                if full_text is None:
+                    full_text = json.dumps(message, default=str)
+                text = full_text
 
-        logger.info(f"Broadcasted message to {len(connections) - len(disconnected)} clients for restaurant {restaurant_id}")
+            if connection.enqueue(text):
+                sent += 1
+            else:
+                self._handle_slow_consumer(connection)
+
+        logger.info(f"Broadcasted message to {sent} of {len(connections)} clients for restaurant {restaurant_id}")
 
     async def broadcast_to_all(self, message: dict):
         """Broadcast a message to all connected clients"""
         for restaurant_id in list(self.active_connections.keys()):
             await self.broadcast_to_restaurant(message, restaurant_id)
 
+    def get_stats(self) -> dict:
+        """Connection and slow-consumer counters"""
+        return {
+            "restaurants": len(self.active_connections),
+            "connections": sum(len(c) for c in self.active_connections.values()),
+            "queued_messages": sum(
+                conn.queue.qsize()
+                for connections in self.active_connections.values()
+                for conn in connections.values()
+            ),
+            "slow_consumers_downgraded": self.slow_consumers_downgraded,
+            "slow_consumers_dropped": self.slow_consumers_dropped,
+            "messages_filtered": self.messages_filtered,
+            "messages_replayed": self.messages_replayed,
+            "resyncs_requested": self.resyncs_requested
+        }
+
 
 # Global connection manager instance
 manager = ConnectionManager()
@@ -1,13 +1,24 @@
 """
 Database configuration for Restaurant Service
+Writes go to the primary; read-only routes (menus, listings) use replicas,
+or a separate read pool on the primary when none are configured
 """
+import os
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from shared.config.settings import settings
+from shared.utils.db_routing import ReadRouter, parse_database_urls
 
-# Create async engine
+# Read pool per replica (or on the primary when there are no replicas)
+READ_DB_POOL_SIZE = int(os.getenv("READ_DB_POOL_SIZE", "10"))
+READ_DB_MAX_OVERFLOW = int(os.getenv("READ_DB_MAX_OVERFLOW", "20"))
+
+DATABASE_URL = settings.database_url.replace("postgresql://", "postgresql+asyncpg://")
+REPLICA_URLS = parse_database_urls(settings.database_replica_urls)
+
+# Create async engine (writes)
 engine = create_async_engine(
-    settings.database_url.replace("postgresql://", "postgresql+asyncpg://"),
+    DATABASE_URL,
     echo=True if settings.environment == "development" else False,
     future=True,
     pool_pre_ping=True,
@@ -15,6 +26,21 @@ engine = create_async_engine(
     max_overflow=20,
 )
 
+# Read-only routes: one engine per replica, or a read pool on the primary.
+# Read-only transactions make a misrouted write fail loudly.
+read_engines = [
+    create_async_engine(
+        url,
+        echo=True if settings.environment == "development" else False,
+        future=True,
+        pool_pre_ping=True,
+        pool_size=READ_DB_POOL_SIZE,
+        max_overflow=READ_DB_MAX_OVERFLOW,
+        connect_args={"server_settings": {"default_transaction_read_only": "on"}},
+    )
+    for url in (REPLICA_URLS or [DATABASE_URL])
+]
+
 # Create async session factory
 async_session_maker = async_sessionmaker(
     engine,
@@ -24,18 +50,35 @@ async_session_maker = async_sessionmaker(
     autoflush=False,
 )
 
+read_session_makers = [
+    async_sessionmaker(
+        read_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+    for read_engine in read_engines
+]
+
+read_router = ReadRouter(
+    read_session_makers if REPLICA_URLS else [],
+    read_session_makers[0]
+)
+
 # Base class for models
 Base = declarative_base()
 
 
 async def get_db() -> AsyncSession:
     """
-    Dependency for getting database session
+    Dependency for getting database session (write routes, primary)
     """
     async with async_session_maker() as session:
         try:
             yield session
             await session.commit()
+            await read_router.record_write_lsn(session)
         except Exception:
             await session.rollback()
             raise
@@ -43,6 +86,17 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+async def get_read_db() -> AsyncSession:
+    """
+    Dependency for getting a read-only session (replica, never commits)
+    """
+    session = await read_router.open_session()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
 async def init_db():
     """
     Initialize database tables
@@ -59,3 +113,5 @@ async def close_db():
     Close database connections
     """
     await engine.dispose()
+    for read_engine in read_engines:
+        await read_engine.dispose()
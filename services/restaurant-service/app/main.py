@@ -8,6 +8,7 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 from shared.config.settings import settings
 from shared.utils.logger import setup_logger
+from shared.utils.db_routing import ReadYourWritesMiddleware
 from .database import init_db, close_db
 from .routes import restaurants, menu_items, tables, feedback, orders
 
@@ -48,6 +49,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reads after a client's own write wait for replicas to catch up
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Mount static files for uploaded images
 UPLOAD_DIR = Path("/app/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
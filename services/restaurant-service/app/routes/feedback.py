@@ -7,7 +7,7 @@ from sqlalchemy import select, func
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime, timedelta
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models import Feedback, Restaurant
 from ..schemas import FeedbackCreate, FeedbackResponse, MessageResponse
 from shared.utils.logger import setup_logger
@@ -64,7 +64,7 @@ async def list_feedback(
     days: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     List all feedback for a restaurant with optional filters
@@ -92,7 +92,7 @@ async def list_feedback(
 async def get_feedback(
     restaurant_id: UUID,
     feedback_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get specific feedback
@@ -149,7 +149,7 @@ async def delete_feedback(
 async def get_feedback_summary(
     restaurant_id: UUID,
     days: Optional[int] = 30,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get feedback summary statistics
@@ -9,8 +9,8 @@ from uuid import UUID
 import os
 import shutil
 from pathlib import Path
-from datetime import datetime
-from ..database import get_db
+from datetime import datetime, timezone
+from ..database import get_db, get_read_db
 from ..models import MenuItem, Restaurant
 from ..schemas import (
     MenuItemCreate,
@@ -87,12 +87,14 @@ async def list_menu_items(
     is_vegetarian: Optional[bool] = Query(None),
     is_vegan: Optional[bool] = Query(None),
     is_gluten_free: Optional[bool] = Query(None),
+    updated_since: Optional[datetime] = Query(None, description="Only items changed after this time (UTC)"),
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     List all menu items for a restaurant with optional filters
+    updated_since lets consumers that cache the menu fetch only what changed
     """
     query = select(MenuItem).where(MenuItem.restaurant_id == restaurant_id)
 
@@ -107,6 +109,11 @@ async def list_menu_items(
         query = query.where(MenuItem.is_vegan == is_vegan)
     if is_gluten_free is not None:
         query = query.where(MenuItem.is_gluten_free == is_gluten_free)
+    if updated_since is not None:
+        # updated_at is stored as naive UTC
+        if updated_since.tzinfo:
+            updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+        query = query.where(MenuItem.updated_at > updated_since)
 
     query = query.order_by(MenuItem.display_order, MenuItem.name).offset(skip).limit(limit)
 
@@ -120,7 +127,7 @@ async def list_menu_items(
 async def get_menu_item(
     restaurant_id: UUID,
     item_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get a specific menu item
@@ -247,7 +254,7 @@ async def toggle_menu_item_availability(
 async def get_menu_items_by_category(
     restaurant_id: UUID,
     category: MenuItemCategory,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get all menu items in a specific category
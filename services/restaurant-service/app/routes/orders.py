@@ -9,7 +9,7 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 import secrets
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models import Order, OrderItem, MenuItem, Table, Restaurant
 from ..schemas import (
     OrderCreate,
@@ -137,7 +137,7 @@ async def list_orders(
     status_filter: Optional[OrderStatus] = Query(None, alias="status"),
     table_id: Optional[UUID] = Query(None),
     limit: int = Query(100, ge=1, le=500),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     List all orders for a restaurant (CHEF/ADMIN)
@@ -166,7 +166,7 @@ async def list_orders(
 @router.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get a specific order by ID (PUBLIC - for order tracking)
@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from typing import List
 from uuid import UUID
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models import Restaurant, MenuItem, Table, Feedback, Invoice, Order
 from ..schemas import (
     RestaurantCreate,
@@ -74,7 +74,7 @@ async def list_restaurants(
     skip: int = 0,
     limit: int = 100,
     is_active: bool = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     List all restaurants (Master Admin only)
@@ -95,7 +95,7 @@ async def list_restaurants(
 @router.get("/slug/{slug}", response_model=RestaurantResponse)
 async def get_restaurant_by_slug(
     slug: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get restaurant by slug (for tenant resolution)
@@ -121,7 +121,7 @@ async def get_restaurant_by_slug(
 @router.get("/{restaurant_id}", response_model=RestaurantResponse)
 async def get_restaurant(
     restaurant_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get restaurant by ID
@@ -275,7 +275,7 @@ async def toggle_restaurant_status(
 @router.get("/{restaurant_id}/analytics", response_model=RestaurantAnalytics)
 async def get_restaurant_analytics(
     restaurant_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get restaurant analytics
@@ -339,7 +339,7 @@ async def get_restaurant_analytics(
 @router.get("/{restaurant_id}/billing", response_model=RestaurantBilling)
 async def get_restaurant_billing(
     restaurant_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get restaurant billing information and revenue from booking fees
@@ -489,7 +489,7 @@ async def list_invoices(
     restaurant_id: UUID,
     skip: int = 0,
     limit: int = 50,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     List all invoices for a restaurant
@@ -520,7 +520,7 @@ async def list_invoices(
 async def get_invoice(
     restaurant_id: UUID,
     invoice_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get a specific invoice by ID
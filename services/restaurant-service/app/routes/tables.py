@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
 from uuid import UUID
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..models import Table, Restaurant
 from ..schemas import (
     TableCreate,
@@ -106,7 +106,7 @@ async def list_tables(
     section: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     List all tables for a restaurant with optional filters
@@ -133,7 +133,7 @@ async def list_tables(
 async def get_table(
     restaurant_id: UUID,
     table_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get a specific table
@@ -17,6 +17,8 @@ class Settings(BaseSettings):
     postgres_user: str = Field(..., alias="POSTGRES_USER")
     postgres_password: str = Field(..., alias="POSTGRES_PASSWORD")
     postgres_db: str = Field(..., alias="POSTGRES_DB")
+    # Comma-separated read replica DSNs; reads use the primary when empty
+    database_replica_urls: str = Field(default="", alias="DATABASE_REPLICA_URLS")
 
     # Redis
     redis_host: str = Field(default="localhost", alias="REDIS_HOST")
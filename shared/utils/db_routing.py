@@ -0,0 +1,185 @@
+"""
+Read/write routing for service databases
+
+Write routes use the primary; read-only routes use replica sessions that
+never commit. After a write, the primary's WAL position (LSN) is handed back
+to the client as a short-lived cookie and header. A later read carrying it
+only uses a replica that has replayed past that position and otherwise falls
+back to the primary, so customers always see their own orders.
+"""
+import os
+import re
+import itertools
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from typing import Callable, List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared.utils.logger import setup_logger
+
+logger = setup_logger("db-routing")
+
+# Seconds a client keeps its write position; replicas lag far less than this
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "30"))
+
+LSN_COOKIE = "db_lsn"
+LSN_HEADER = "x-db-lsn"
+
+_LSN_PATTERN = re.compile(r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$")
+
+
+class RequestConsistency:
+    """Write position a request must observe, and the one it produced"""
+
+    def __init__(self, min_lsn: Optional[str] = None):
+        self.min_lsn = min_lsn
+        self.written_lsn: Optional[str] = None
+
+
+_consistency: ContextVar[Optional[RequestConsistency]] = ContextVar("db_consistency", default=None)
+
+
+def parse_database_urls(value: str) -> List[str]:
+    """Comma-separated DSNs in asyncpg form"""
+    return [
+        url.strip().replace("postgresql://", "postgresql+asyncpg://")
+        for url in value.split(",")
+        if url.strip()
+    ]
+
+
+def _valid_lsn(value: Optional[str]) -> Optional[str]:
+    if value and _LSN_PATTERN.match(value.strip()):
+        return value.strip()
+    return None
+
+
+def _request_lsn(scope) -> Optional[str]:
+    """Write position sent by the client, as header or cookie"""
+    for name, value in scope.get("headers", []):
+        if name == LSN_HEADER.encode():
+            return _valid_lsn(value.decode("latin-1"))
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            morsel = SimpleCookie(value.decode("latin-1")).get(LSN_COOKIE)
+            if morsel:
+                return _valid_lsn(morsel.value)
+    return None
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware carrying the client's write position between requests
+
+    Reads the LSN token from the request and, when the request wrote,
+    returns the new token as a cookie (browsers) and a header (API clients).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = RequestConsistency(_request_lsn(scope))
+        token = _consistency.set(state)
+
+        async def send_with_token(message):
+            if message["type"] == "http.response.start" and state.written_lsn:
+                cookie = (
+                    f"{LSN_COOKIE}={state.written_lsn}; Max-Age={READ_YOUR_WRITES_SECONDS}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode("latin-1")),
+                    (LSN_HEADER.encode(), state.written_lsn.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_token)
+        finally:
+            _consistency.reset(token)
+
+
+async def record_write_lsn(session: AsyncSession):
+    """
+    Remember the primary's WAL position after a committed write
+    No-op outside a request handled by ReadYourWritesMiddleware
+    """
+    state = _consistency.get()
+    if state is None:
+        return
+    try:
+        result = await session.execute(text("SELECT pg_current_wal_lsn()::text"))
+        state.written_lsn = result.scalar()
+    except Exception as e:
+        # The write is committed; only the consistency hint is lost
+        logger.warning(f"Could not read WAL position after commit: {e}")
+
+
+class ReadRouter:
+    """
+    Hands out read-only sessions, round-robin across replicas
+
+    Without replicas every read uses primary_maker, which should be bound to
+    a read pool on the primary so the write pool carries only writes.
+    """
+
+    def __init__(
+        self,
+        replica_makers: List[Callable[[], AsyncSession]],
+        primary_maker: Callable[[], AsyncSession]
+    ):
+        self.replica_makers = replica_makers
+        self.primary_maker = primary_maker
+        self._next = itertools.cycle(range(len(replica_makers))) if replica_makers else None
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "lagging_replicas": 0}
+
+    async def record_write_lsn(self, session: AsyncSession):
+        """
+        Remember the write position for later reads
+        Without replicas every read already uses the primary, so the extra
+        round trip and cookie are skipped.
+        """
+        if not self.replica_makers:
+            return
+        await record_write_lsn(session)
+
+    async def _caught_up(self, session: AsyncSession, lsn: str) -> bool:
+        # COALESCE keeps a replica URL pointing at the primary usable (dev setups)
+        result = await session.execute(
+            text(
+                "SELECT COALESCE(pg_last_wal_replay_lsn(), pg_current_wal_lsn()) "
+                ">= CAST(:lsn AS pg_lsn)"
+            ),
+            {"lsn": lsn}
+        )
+        return bool(result.scalar())
+
+    async def open_session(self) -> AsyncSession:
+        """Session on a replica that satisfies the request's write position"""
+        state = _consistency.get()
+        min_lsn = state.min_lsn if state else None
+
+        if self.replica_makers:
+            start = next(self._next)
+            for offset in range(len(self.replica_makers)):
+                maker = self.replica_makers[(start + offset) % len(self.replica_makers)]
+                session = maker()
+                if min_lsn is None:
+                    self.stats["replica_reads"] += 1
+                    return session
+                try:
+                    if await self._caught_up(session, min_lsn):
+                        self.stats["replica_reads"] += 1
+                        return session
+                    self.stats["lagging_replicas"] += 1
+                except Exception as e:
+                    logger.warning(f"Replica check failed, trying next: {e}")
+                await session.close()
+
+        self.stats["primary_reads"] += 1
+        return self.primary_maker()